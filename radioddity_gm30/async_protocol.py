@@ -0,0 +1,204 @@
+import os
+import asyncio
+import typing as t
+from pathlib import Path
+from datetime import timedelta
+
+import serial
+
+from .protocol import ProtocolCore, Steps
+
+
+class AsyncSerialPort:
+    """
+    Non-blocking serial port driven by the asyncio event loop.
+
+    Incoming data is collected into a buffer by a reader callback registered
+    on the port file descriptor so any number of ports can be serviced from
+    one thread. Works with anything that exposes a file descriptor like a
+    serial.Serial instance or one end of a pty pair.
+    """
+
+    def __init__(self, port: t.Union[serial.Serial, int]):
+        self.port = port
+        self._fd = port if isinstance(port, int) else port.fileno()
+        os.set_blocking(self._fd, False)
+
+        self._loop = asyncio.get_running_loop()
+        self._buffer = bytearray()
+        self._waiter: t.Optional[asyncio.Future] = None
+        self._closed = False
+
+        self._loop.add_reader(self._fd, self._on_readable)
+
+    async def __aenter__(self) -> 'AsyncSerialPort':
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 0x1000)
+
+        except BlockingIOError:
+            return
+
+        except OSError:
+            # pty closed on the other end
+            data = b''
+
+        if not data:
+            self._loop.remove_reader(self._fd)
+
+        self._buffer += data
+        if self._waiter and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def read(self, max_count: int, timeout: float) -> bytes:
+        """
+        Read up to `max_count` bytes waiting at most `timeout` seconds for
+        them to arrive, same as serial.Serial.read() with a timeout set.
+        """
+
+        deadline = self._loop.time() + timeout
+        while len(self._buffer) < max_count:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+
+            self._waiter = self._loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, remaining)
+
+            except asyncio.TimeoutError:
+                break
+
+            finally:
+                self._waiter = None
+
+        data = bytes(self._buffer[:max_count])
+        del self._buffer[:max_count]
+        return data
+
+    async def write(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[os.write(self._fd, view):]
+
+            except BlockingIOError:
+                writable = self._loop.create_future()
+                self._loop.add_writer(self._fd, writable.set_result, None)
+                try:
+                    await writable
+
+                finally:
+                    self._loop.remove_writer(self._fd)
+
+    def reset_input_buffer(self):
+        self._buffer.clear()
+        if isinstance(self.port, serial.Serial):
+            self.port.reset_input_buffer()
+
+    def reset_output_buffer(self):
+        if isinstance(self.port, serial.Serial):
+            self.port.reset_output_buffer()
+
+    def close(self):
+        if self._closed:
+            return
+
+        self._closed = True
+        self._loop.remove_reader(self._fd)
+        if isinstance(self.port, serial.Serial):
+            self.port.close()
+
+
+def _awaitable(steps: t.Callable[..., Steps]) -> t.Callable:
+    # run a command of the protocol core to completion on the event loop
+    async def command(self, *args, **kwargs):
+        return await self._run(steps(self, *args, **kwargs))
+
+    command.__doc__ = steps.__doc__
+    return command
+
+
+class AsyncProtocol(ProtocolCore):
+    """
+    Serial programming protocol (see ProtocolCore) on an asyncio event
+    loop.
+
+    Runs the same commands as Protocol but never blocks the event loop which
+    allows one process to program many radios concurrently, for example
+    with asyncio.gather(). Timeouts are enforced with futures instead of
+    changing port timeouts.
+    """
+
+    @staticmethod
+    def open_port(device_path: Path) -> AsyncSerialPort:
+        """
+        Open a serial port for use with the running event loop. Use the
+        result as an asynchronous context manager to close it again.
+        """
+
+        return AsyncSerialPort(ProtocolCore.open_port(device_path))
+
+    def __init__(
+        self,
+        port: AsyncSerialPort,
+        timeout: timedelta = timedelta(seconds=1),
+        max_retries: int = ProtocolCore.MAX_RETRIES
+    ):
+        super().__init__(timeout, max_retries)
+        self.port = port
+
+    async def _perform(self, request: t.Tuple) -> t.Optional[bytes]:
+        if request[0] == 'write':
+            await self.port.write(request[1])
+
+        elif request[0] == 'read':
+            return await self.port.read(request[1], self.timeout.total_seconds())
+
+        elif request[0] == 'reset':
+            self.port.reset_input_buffer()
+            self.port.reset_output_buffer()
+
+        elif request[0] == 'sleep':
+            await asyncio.sleep(request[1])
+
+        else:
+            raise RuntimeError(f"Unknown I/O request: {request[0]}")
+
+        return None
+
+    async def _run(self, steps: Steps) -> t.Any:
+        # see Protocol._run()
+        send, value = steps.send, None
+        while True:
+            try:
+                request = send(value)
+
+            except StopIteration as stop:
+                return stop.value
+
+            try:
+                send, value = steps.send, await self._perform(request)
+
+            except Exception as error:
+                send, value = steps.throw, error
+
+    send_ack = _awaitable(ProtocolCore.send_ack_steps)
+    receive_ack = _awaitable(ProtocolCore.receive_ack_steps)
+    keepalive = _awaitable(ProtocolCore.keepalive_steps)
+    read_memory = _awaitable(ProtocolCore.read_memory_steps)
+    write_memory = _awaitable(ProtocolCore.write_memory_steps)
+    read_memory_chunks = _awaitable(ProtocolCore.read_memory_chunks_steps)
+    read_memory_range = _awaitable(ProtocolCore.read_memory_range_steps)
+    write_memory_range = _awaitable(ProtocolCore.write_memory_range_steps)
+    write_memory_range_diff = _awaitable(ProtocolCore.write_memory_range_diff_steps)
+    query_firmware_variant = _awaitable(ProtocolCore.query_firmware_variant_steps)
+    probe_chunk_sizes = _awaitable(ProtocolCore.probe_chunk_sizes_steps)
+    unknown_passsta = _awaitable(ProtocolCore.unknown_passsta_steps)
+    unknown_sysinfo = _awaitable(ProtocolCore.unknown_sysinfo_steps)
+    unknown_init = _awaitable(ProtocolCore.unknown_init_steps)
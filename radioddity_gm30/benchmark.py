@@ -0,0 +1,479 @@
+import io
+import sys
+import json
+import time
+import argparse
+import contextlib
+import statistics
+import subprocess
+import typing as t
+from pathlib import Path
+
+from mrcrowbar import models as mrc
+
+from .protocol import Protocol
+from .metrics import ProtocolMetrics
+from .emulator import RadioEmulator
+from .radio_config import RadioConfig, RadioMemoryState
+from .memory import (
+    get_block_size,
+    get_codec,
+    compare_codec,
+    LazyEntriesBlock)
+
+
+# memory segment index -> state used by the sample image
+SAMPLE_SEGMENTS = {
+    0x0: RadioMemoryState.UNKNOWN_DATA,
+    0x2: RadioMemoryState.FREQUENCY_DATA,
+    0x3: RadioMemoryState.CHANNEL_DATA,
+    0x4: RadioMemoryState.GENERAL_DATA,
+    0x5: RadioMemoryState.PHONE_DATA}
+
+CODEC_REPEAT = 200
+BENCHMARK_REPEAT = 3
+
+STARTUP_REPEAT = 5
+STARTUP_MODULE = 'radioddity_gm30.cli'
+STARTUP_BUDGET = 0.05
+
+# modules the CLI entry point must only import once a command needs them
+STARTUP_DEFERRED_MODULES = (
+    'serial',
+    'mrcrowbar',
+    'radioddity_gm30.protocol',
+    'radioddity_gm30.radio_config',
+    'radioddity_gm30.memory')
+
+CHUNK_SIZES = (0x40, 0x80, 0xFF)
+RANGE_ADDRESS = 0x5000
+RANGE_SIZE = 0x1000
+
+
+def build_sample_image() -> bytes:
+    """
+    Build a 0xF000 byte memory image with a plausible stock configuration
+    that RadioConfig can read.
+    """
+
+    image = bytearray(RadioEmulator.MEMORY_SIZE)
+    empty_frequency = bytes([0xFF] * 8) + bytes([
+        0x00, 0xFF, 0xFF, 0xFF, 0xFF, 0x06, 0x11, 0x00])
+
+    segments = {
+        RadioMemoryState.UNKNOWN_DATA: bytes(range(0x100)) * 2,
+        RadioMemoryState.FREQUENCY_DATA: b''.join([
+            bytes([0xFA, 0x00, 0x01, 0x00, 0x01, 0x00]),
+            bytes(0xA),
+            bytes.fromhex('00255043ffffffff00ffffffff061100'),
+            bytes.fromhex('00255015ffffffff00ffffffff061100'),
+            empty_frequency * 249]),
+        RadioMemoryState.CHANNEL_DATA: b''.join([
+            bytes([0xFF] * 0xABE),
+            b'GMRS1\x00' + bytes(5),
+            bytes([0xFF] * 11)]),
+        RadioMemoryState.GENERAL_DATA: b''.join([
+            bytes(0x10),
+            b'WELCOME'.ljust(0x10, b'\x00'),
+            b'Radioddity'.ljust(0x10, b'\x00'),
+            bytes([
+                0x00, 0x00, 0x00, 0x40, 0x00, 0x00, 0x00, 0x52,
+                0x00, 0x00, 0x60, 0x13, 0x00, 0x00, 0x40, 0x17]),
+            bytes([0x07, 0x03, 0x00, 0x27, 0x05, 0x94, 0x26, 0x02, 0x02, 0x02]),
+            bytes(0x16),
+            bytes([0x00] + [0xFF] * 8 + [0x00] * 2 + [0xFF] * 16 + [0x00] * 5)]),
+        RadioMemoryState.PHONE_DATA: b''.join([
+            bytes([0xFF] * 0x50),
+            bytes([0x01, 0x02, 0x03, 0x04, 0x05])])}
+
+    for index in range(RadioConfig.MEMORY_SEGMENT_COUNT):
+        base = index * 0x1000
+        state = SAMPLE_SEGMENTS.get(index, RadioMemoryState.AVAILABLE)
+
+        if state == RadioMemoryState.AVAILABLE and index >= 8:
+            state = RadioMemoryState.UNAVAILABLE
+            image[base:base + 0x1000] = bytes([0xFF] * 0x1000)
+
+        elif state in segments:
+            data = segments[state]
+            image[base:base + len(data)] = data
+
+        image[base + 0xFFF] = state
+
+    return bytes(image)
+
+
+def _get_segment_data(
+    image: bytes,
+    state: RadioMemoryState
+) -> t.Optional[bytes]:
+    for index in range(RadioConfig.MEMORY_SEGMENT_COUNT):
+        base = index * 0x1000
+        if image[base + 0xFFF] == state:
+            return image[base:base + 0x1000]
+
+    return None
+
+
+def check_codecs(image: bytes) -> t.List[str]:
+    """
+    Compare the compiled block codecs with mrcrowbar on the memory segments
+    and used entries of an image and describe every difference.
+    """
+
+    differences = []
+    for state, block_klass in RadioConfig.MEMORY_BLOCKS.items():
+        data = _get_segment_data(image, state)
+        if data is None:
+            continue
+
+        data = data[:get_block_size(block_klass)]
+        if get_codec(block_klass) is not None:
+            differences += compare_codec(block_klass, data)
+
+        if not issubclass(block_klass, LazyEntriesBlock):
+            continue
+
+        block = block_klass(source_data=data)
+        for lazy_entries in block._lazy_entries():
+            entries = lazy_entries.get_list(block)
+            for index in range(len(entries)):
+                if entries[index] is not None:
+                    differences += compare_codec(
+                        entries.block_klass, entries._raw(index))
+
+    return differences
+
+
+def _roundtrip_segments(image: bytes, generic: bool) -> float:
+    segments = [
+        (block_klass, _get_segment_data(image, state))
+        for state, block_klass in RadioConfig.MEMORY_BLOCKS.items()]
+
+    def roundtrip():
+        for block_klass, data in segments:
+            if data is None:
+                continue
+
+            block = block_klass()
+            if generic:
+                mrc.Block.import_data(block, data)
+                mrc.Block.export_data(block)
+
+            else:
+                block.import_data(data)
+                block.export_data()
+
+    # compile the codecs outside of the measurement
+    roundtrip()
+
+    # the fastest round trip is the least disturbed by other processes
+    best = None
+    for _ in range(CODEC_REPEAT):
+        start = time.perf_counter()
+        roundtrip()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    return best
+
+
+def _timed(function: t.Callable, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function(*args, **kwargs)
+
+    return time.perf_counter() - start
+
+
+def measure_startup() -> t.Tuple[float, t.List[str]]:
+    """
+    Import the CLI entry point in fresh interpreters with `-X importtime`
+    and return the fastest import time in seconds and the names of all
+    modules it imported.
+    """
+
+    best = None
+    modules = []
+    for _ in range(STARTUP_REPEAT):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {STARTUP_MODULE}'],
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True)
+
+        # import time: self [us] | cumulative | imported package
+        modules = []
+        for line in process.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+
+            _, cumulative, name = line.split('|')
+            modules.append(name.strip())
+            if name.strip() == STARTUP_MODULE:
+                seconds = int(cumulative) / 1000000
+                best = seconds if best is None else min(best, seconds)
+
+    return best, modules
+
+
+def check_startup(budget: float) -> t.Tuple[float, t.List[str]]:
+    """
+    Measure the CLI startup time and describe every way it exceeds the
+    `budget` in seconds or imports modules that should be deferred.
+    """
+
+    seconds, modules = measure_startup()
+
+    problems = []
+    if seconds > budget:
+        problems.append(f"{STARTUP_MODULE}: {seconds:.3f}s > {budget:.3f}s")
+
+    for name in STARTUP_DEFERRED_MODULES:
+        if name in modules:
+            problems.append(f"{STARTUP_MODULE}: imports {name}")
+
+    return seconds, problems
+
+
+def _measured(function: t.Callable, *args, **kwargs) -> t.Dict[str, float]:
+    # count the requests sent to and the bytes exchanged with the radio as
+    # well, which unlike the time taken do not depend on the machine
+    metrics = ProtocolMetrics()
+    previous_metrics, Protocol.metrics = Protocol.metrics, metrics
+    try:
+        seconds = _timed(function, *args, **kwargs)
+
+    finally:
+        Protocol.metrics = previous_metrics
+
+    commands = metrics.as_dict()
+    writes = commands.get('fixed_write', {'count': 0, 'bytes': 0})
+    reads = commands.get('variable_read', {'count': 0, 'bytes': 0})
+
+    return {
+        'seconds': seconds,
+        'requests': writes['count'],
+        'bytes': writes['bytes'] + reads['bytes']}
+
+
+def run_benchmarks(
+    image: bytes,
+    baudrate: t.Optional[int] = 57600,
+    latency: float = 0.002
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Run the protocol benchmarks against an emulated radio and return the
+    results keyed by benchmark name. Each result has the elapsed `seconds`
+    and, for protocol benchmarks, the number of `requests` and `bytes`
+    sent and received and for transfers the `bytes_per_second`.
+    """
+
+    # every run probes the chunk sizes to send the same requests
+    Protocol._chunk_size_cache.clear()
+
+    results = {
+        'codec_roundtrip': {
+            'seconds': _roundtrip_segments(image, generic=False)},
+        'generic_roundtrip': {
+            'seconds': _roundtrip_segments(image, generic=True)}}
+
+    def transfer_result(result: t.Dict[str, float], size: int) -> t.Dict[str, float]:
+        return {**result, 'bytes_per_second': size / result['seconds']}
+
+    with RadioEmulator(image, baudrate=baudrate) as emulator:
+        with Protocol.open_port(emulator.device_path) as serial_port:
+            protocol = Protocol(serial_port)
+
+            results['handshake'] = _measured(protocol.unknown_init)
+
+            results['detect_segments'] = _measured(
+                RadioConfig().detect_memory_segments, protocol)
+
+            for chunk_size in CHUNK_SIZES:
+                results[f'read_range_{chunk_size:#04x}'] = transfer_result(
+                    _measured(
+                        protocol.read_memory_range,
+                        RANGE_ADDRESS, RANGE_SIZE, chunk_size=chunk_size),
+                    RANGE_SIZE)
+
+            data = protocol.read_memory_range(RANGE_ADDRESS, RANGE_SIZE)
+            for chunk_size in CHUNK_SIZES:
+                results[f'write_range_{chunk_size:#04x}'] = transfer_result(
+                    _measured(
+                        protocol.write_memory_range,
+                        RANGE_ADDRESS, data, chunk_size=chunk_size),
+                    RANGE_SIZE)
+
+        radio_config = RadioConfig()
+        results['read_radio'] = _measured(
+            radio_config.read_radio, emulator.device_path)
+
+        results['write_radio'] = _measured(
+            radio_config.write_radio, emulator.device_path)
+
+    with RadioEmulator(image, baudrate=baudrate, latency=latency) as emulator:
+        with Protocol.open_port(emulator.device_path) as serial_port:
+            protocol = Protocol(serial_port)
+            with contextlib.redirect_stdout(io.StringIO()):
+                protocol.unknown_init()
+
+            results['read_range_latency'] = transfer_result(
+                _measured(
+                    protocol.read_memory_range,
+                    RANGE_ADDRESS, RANGE_SIZE),
+                RANGE_SIZE)
+
+    return results
+
+
+def median_results(
+    runs: t.List[t.Dict[str, t.Dict[str, float]]]
+) -> t.Dict[str, t.Dict[str, float]]:
+    """
+    Combine the results of several benchmark runs into the median of each
+    value, which single slow runs do not skew.
+    """
+
+    return {
+        name: {
+            key: statistics.median(run[name][key] for run in runs)
+            for key in result}
+        for name, result in runs[0].items()}
+
+
+def compare_results(
+    results: t.Dict[str, t.Dict[str, float]],
+    baseline: t.Dict[str, t.Dict[str, float]],
+    tolerance: float,
+    counts_only: bool = False
+) -> t.List[str]:
+    """
+    Compare results against a baseline and describe every benchmark that
+    got slower (or lost throughput) by more than `tolerance` (0.1 = 10%) or
+    sends more requests or bytes at all. Those counts do not depend on the
+    machine so `counts_only` compares just them, e.g. with a baseline saved
+    on another machine.
+    """
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        expected = baseline[name]
+        for key in ('requests', 'bytes'):
+            if key in result and key in expected and result[key] > expected[key]:
+                regressions.append(
+                    f"{name}: {result[key]:.0f} {key} > {expected[key]:.0f} {key}")
+
+        if counts_only:
+            continue
+
+        if 'bytes_per_second' in result and 'bytes_per_second' in expected:
+            minimum = expected['bytes_per_second'] * (1 - tolerance)
+            if result['bytes_per_second'] < minimum:
+                regressions.append(
+                    f"{name}: {result['bytes_per_second']:.0f} B/s < "
+                    f"{minimum:.0f} B/s")
+
+        else:
+            maximum = expected['seconds'] * (1 + tolerance)
+            if result['seconds'] > maximum:
+                regressions.append(
+                    f"{name}: {result['seconds']:.3f}s > {maximum:.3f}s")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="benchmark the programming protocol against an emulated radio")
+    parser.add_argument(
+        '-i', '--image-file',
+        type=Path,
+        help="memory image as saved by the mr command")
+    parser.add_argument(
+        '-o', '--output-file',
+        type=Path,
+        help="save results as JSON")
+    parser.add_argument(
+        '-b', '--baseline-file',
+        type=Path,
+        help="fail if results regress compared to these saved results")
+    parser.add_argument(
+        '-n', '--repeat',
+        type=int,
+        default=BENCHMARK_REPEAT,
+        help="number of runs to take the median results of")
+    parser.add_argument(
+        '--counts-only',
+        action='store_true',
+        help="only compare request and byte counts with the baseline, not timings")
+    parser.add_argument(
+        '-t', '--tolerance',
+        type=float,
+        default=0.25,
+        help="allowed regression as a fraction of the baseline")
+    parser.add_argument(
+        '-s', '--startup-budget',
+        type=float,
+        default=STARTUP_BUDGET,
+        help="maximum CLI import time in seconds")
+    parser.add_argument('--baudrate', type=int, default=57600)
+    parser.add_argument('--latency', type=float, default=0.002)
+
+    args = parser.parse_args()
+
+    image = args.image_file.read_bytes() if args.image_file \
+        else build_sample_image()
+
+    differences = check_codecs(image)
+    for difference in differences:
+        print(f"Codec mismatch: {difference}")
+
+    if differences:
+        sys.exit(1)
+
+    startup_seconds, startup_problems = check_startup(args.startup_budget)
+    for problem in startup_problems:
+        print(f"Startup: {problem}")
+
+    if startup_problems:
+        sys.exit(1)
+
+    results = median_results([
+        run_benchmarks(image, args.baudrate, args.latency)
+        for _ in range(args.repeat)])
+
+    results['cli_startup'] = {'seconds': startup_seconds}
+
+    for name, result in results.items():
+        throughput = result.get('bytes_per_second')
+        throughput = f"{throughput:>10.0f} B/s" if throughput else ''
+        counts = f"{result['requests']:>6.0f} req {result['bytes']:>8.0f} B" \
+            if 'requests' in result else ''
+        print(f"{name:<24} {result['seconds']:>8.3f}s {counts:>19} {throughput}")
+
+    if args.output_file:
+        args.output_file.write_text(
+            json.dumps({'results': results}, indent=2))
+
+    if args.baseline_file:
+        baseline = json.loads(args.baseline_file.read_text())['results']
+        # the startup time is already checked against its budget above and
+        # varies too much between interpreter launches to compare
+        regressions = compare_results(
+            {name: result for name, result in results.items() if name != 'cli_startup'},
+            baseline,
+            args.tolerance,
+            counts_only=args.counts_only)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+import json
+import typing as t
+from pathlib import Path
+
+from mrcrowbar import models as mrc
+
+from .protocol import Protocol
+from .progress import ProgressCallback
+from .image_cache import ImageCache
+from .memory.lazy import LazyEntries
+from .radio_config import RadioConfig, RadioMemoryState
+
+
+def _convert_value(field: t.Any, current: t.Any, value: t.Any) -> t.Any:
+    # enum members by name, raw bytes as hex strings and nested blocks from
+    # an object of their field values or a single value for blocks with one
+    # field (e.g. frequencies)
+    enum = getattr(field, 'enum', None) or getattr(field, 'enum_t', None)
+    if enum is not None and isinstance(value, str):
+        try:
+            return enum[value]
+
+        except KeyError:
+            raise RuntimeError(f"Unknown {enum.__name__} value: {value}") from None
+
+    if isinstance(field, mrc.Bytes) and isinstance(value, str):
+        return bytes.fromhex(value)
+
+    if isinstance(field, mrc.BlockField) and value is not None:
+        block = current if current is not None else field.block_klass()
+        if not isinstance(value, dict):
+            if len(block._fields) != 1:
+                raise RuntimeError(
+                    f"Expecting an object of fields for {field.block_klass.__name__}")
+
+            value = {next(iter(block._fields)): value}
+
+        _apply_fields(block, value)
+        return block
+
+    return value
+
+
+def _apply_fields(block: mrc.Block, values: t.Mapping[str, t.Any]):
+    for name, value in values.items():
+        field = type(block)._fields.get(name)
+        if field is None:
+            raise RuntimeError(f"{type(block).__name__} has no field: {name}")
+
+        setattr(block, name, _convert_value(field, getattr(block, name), value))
+
+
+class ChangeSet:
+    """
+    Declarative set of config changes, made up of field assignments by
+    name (see RadioConfig.get_field_registry()) and edits of the fields of
+    single entries of entry lists:
+
+        {
+          "fields": {"squelch_level": 5, "voice_alert": "ON"},
+          "entries": {
+            "channel_entries": {"3": {"name": "HOME"}},
+            "frequency_entries": {
+              "3": {"receive_frequency": 462562500, "power": "LOW"}},
+            "vfo_a": {"power": "LOW"}}
+        }
+
+    Entries are addressed by their list index, single entries like the VFOs
+    directly. Empty entries are created with default values and a null
+    entry clears it. Enum values are given by name, raw bytes as hex.
+    """
+
+    def __init__(
+        self,
+        fields: t.Optional[t.Mapping[str, t.Any]] = None,
+        entries: t.Optional[t.Mapping[str, t.Any]] = None
+    ):
+        self.fields = dict(fields or {})
+        self.entries = dict(entries or {})
+
+    @classmethod
+    def from_dict(cls, data: t.Mapping[str, t.Any]) -> 'ChangeSet':
+        unknown_keys = set(data) - {'fields', 'entries'}
+        if unknown_keys:
+            raise RuntimeError(
+                f"Unknown change set keys: {', '.join(sorted(unknown_keys))}")
+
+        return cls(data.get('fields'), data.get('entries'))
+
+    @classmethod
+    def load(cls, path: Path) -> 'ChangeSet':
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+    def as_dict(self) -> t.Dict[str, t.Any]:
+        return {'fields': self.fields, 'entries': self.entries}
+
+    def get_states(self) -> t.Set[RadioMemoryState]:
+        """
+        Determine the memory segments touched by the changes, failing on
+        unknown field names.
+        """
+
+        registry = RadioConfig.get_field_registry()
+
+        states = set()
+        for name in [*self.fields, *self.entries]:
+            config_field = registry.get(name)
+            if config_field is None:
+                raise RuntimeError(f"Unknown config field: {name}")
+
+            holds_entries = isinstance(config_field.field, LazyEntries)
+            if name in self.entries and not holds_entries:
+                raise RuntimeError(f"Config field does not hold entries: {name}")
+
+            if name in self.fields and holds_entries:
+                raise RuntimeError(f"Config field holds entries, edit them instead: {name}")
+
+            states.add(config_field.state)
+
+        return states
+
+    def apply(self, radio_config: RadioConfig):
+        """
+        Apply the changes to a config. All names are checked before anything
+        is changed.
+        """
+
+        self.get_states()
+        registry = RadioConfig.get_field_registry()
+
+        radio_config.set_many({
+            name: _convert_value(
+                registry[name].field, getattr(radio_config, name), value)
+            for name, value in self.fields.items()})
+
+        for name, entry_values in self.entries.items():
+            lazy_entries = registry[name].field
+            if lazy_entries.count is None:
+                setattr(radio_config, name, self._apply_entry(
+                    lazy_entries, getattr(radio_config, name), entry_values))
+
+                continue
+
+            entries = getattr(radio_config, name)
+            for index, values in entry_values.items():
+                index = int(index)
+                entries[index] = self._apply_entry(
+                    lazy_entries, entries[index], values)
+
+    @staticmethod
+    def _apply_entry(
+        lazy_entries: LazyEntries,
+        entry: t.Optional[mrc.Block],
+        values: t.Optional[t.Mapping[str, t.Any]]
+    ) -> t.Optional[mrc.Block]:
+        if values is None:
+            return None
+
+        if entry is None:
+            entry = lazy_entries.block_klass()
+
+            # nested blocks have no default value
+            for name, field in type(entry)._fields.items():
+                if isinstance(field, mrc.BlockField) and getattr(entry, name) is None:
+                    setattr(entry, name, field.block_klass())
+
+        _apply_fields(entry, values)
+        return entry
+
+    def apply_session(
+        self,
+        protocol: Protocol,
+        dry_run: bool = False,
+        cache: t.Optional[ImageCache] = None,
+        progress: t.Optional[ProgressCallback] = None,
+        detect_window: int = RadioConfig.MEMORY_SEGMENT_DETECT_WINDOW
+    ) -> t.Dict[RadioMemoryState, t.List[t.Tuple[int, int]]]:
+        """
+        Apply the changes to a radio in a single programming session
+        through a protocol that already entered programming mode. Only the
+        memory segments touched by the changes are read, the ranges that
+        changed are written back and read again to verify them. Nothing is
+        written in dry run mode. Memory segments are detected with up to
+        `detect_window` state reads in flight.
+
+        Returns the changed (offset, size) ranges of each memory segment.
+        """
+
+        states = self.get_states()
+        if RadioMemoryState.UNKNOWN_DATA in states and not dry_run:
+            raise RuntimeError("Changes to unknown memory are not written to radios")
+
+        radio_config = RadioConfig()
+        radio_config.read_session(
+            protocol,
+            cache=cache,
+            progress=progress,
+            states=states,
+            detect_window=detect_window)
+
+        self.apply(radio_config)
+        changes = {
+            state: radio_config.get_dirty_ranges(state) for state in states}
+
+        if not dry_run:
+            radio_config.write_session(
+                protocol, patch=True, progress=progress, verify=True, states=states,
+                cache=cache, detect_window=detect_window)
+
+        return changes
+
+
+def describe_changes(
+    changes: t.Mapping[RadioMemoryState, t.List[t.Tuple[int, int]]]
+) -> str:
+    lines = []
+    for state, ranges in changes.items():
+        memory_name = state.name.lower().rstrip('_data')
+        changed = sum(size for _, size in ranges)
+        lines.append(
+            f"Changed {hex(changed)} bytes of {memory_name} memory in "
+            f"{len(ranges)} ranges")
+
+    return '\n'.join(lines) or "No changes"
@@ -1,13 +1,18 @@
 import io
+import sys
 import argparse
+import contextlib
 import typing as t
 from pathlib import Path
 
-import serial
-import serial.tools.list_ports
-
-from .protocol import Protocol
-from .radio_config import RadioConfig
+# keep startup fast for --help and argument errors, modules that pull in
+# pyserial or mrcrowbar are only imported by the commands that use them
+if t.TYPE_CHECKING:
+    from .protocol import Protocol
+    from .metrics import ProtocolMetrics
+    from .progress import ProgressCallback
+    from .journal import TransferJournal
+    from .image_cache import ImageCache
 
 
 CABLE_USB_VID_PID: t.List[t.Tuple[int, int]] = [
@@ -15,6 +20,20 @@ CABLE_USB_VID_PID: t.List[t.Tuple[int, int]] = [
 ]
 
 
+def detect_serial_ports() -> t.List[str]:
+    """
+    Detect all serial ports with a known radio programming cable attached by
+    checking their USB vendor and product IDs.
+    """
+
+    import serial.tools.list_ports
+
+    return sorted(
+        port_info.device
+        for port_info in serial.tools.list_ports.comports()
+        if (port_info.vid, port_info.pid) in CABLE_USB_VID_PID)
+
+
 def detect_serial_port() -> t.Optional[str]:
     """
     Detect the default serial port by checking the USB vendor and product IDs
@@ -23,33 +42,187 @@ def detect_serial_port() -> t.Optional[str]:
     right one.
     """
 
-    for port_info in serial.tools.list_ports.comports():
-        if (port_info.vid, port_info.pid) in CABLE_USB_VID_PID:
-            return port_info.device
+    device_paths = detect_serial_ports()
+    return device_paths[0] if device_paths else None
 
-    return None
 
+def get_journal_path(path: str) -> Path:
+    return Path(f"{path}.journal.json")
 
-def read_memory(device_path: Path, data_file: t.BinaryIO):
-    # truncate and initialize the data file with zeroes
-    data_file.truncate(0)
-    data_file.write(bytes([0x00] * 0xF000))
-    data_file.seek(0)
 
-    # initialize serial port and protocol
-    with Protocol.open_port(device_path) as serial_port:
-        protocol = Protocol(serial_port)
-        protocol.unknown_init()
+def read_memory_segments(
+    protocol: 'Protocol',
+    data_file: t.BinaryIO,
+    journal: 'TransferJournal',
+    base_addresses: t.List[int],
+    window: int = 1,
+    progress: t.Optional['ProgressCallback'] = None
+):
+    """
+    Read memory segments into the data file, confirming the data read so
+    far in the journal every few chunks. Segments the journal confirmed
+    partially are resumed if the data file still holds the confirmed data.
+    """
+
+    from .progress import ProgressTracker
+
+    resumed_data = {}
+    for base_address in base_addresses:
+        data_file.seek(base_address - 0x1000)
+        data = data_file.read(journal.get_confirmed(base_address) - base_address)
+        resumed_data[base_address] = data \
+            if journal.check_digest(base_address, data) else b''
 
-        # read all memory
-        data_file.write(protocol.read_memory_range(0x1000, 0xF000))
+    progress = ProgressTracker.for_transfer(progress, sum(
+        0x1000 - len(data) for data in resumed_data.values()))
 
+    # keep the read window filled between checkpoints
+    block_size = max(journal.CHECKPOINT_SIZE, protocol.read_chunk_size * window)
 
-def write_memory(device_path: Path, data_file: t.BinaryIO):
+    for base_address, data in resumed_data.items():
+        data_file.seek(base_address - 0x1000 + len(data))
+
+        while len(data) < 0x1000:
+            block = protocol.read_memory_range(
+                base_address + len(data),
+                min(block_size, 0x1000 - len(data)),
+                window=window,
+                progress=progress)
+
+            # the data has to be in the file before it is confirmed
+            data_file.write(block)
+            data_file.flush()
+
+            data += block
+            journal.confirm(base_address, base_address + len(data), data)
+
+
+def read_memory_sparse(
+    protocol: 'Protocol',
+    data_file: t.BinaryIO,
+    journal: 'TransferJournal',
+    window: int = 1,
+    progress: t.Optional['ProgressCallback'] = None
+):
+    import json
+
+    from .radio_config import RadioConfig, RadioMemoryState
+
+    # truncate and size the data file without writing anything so unread
+    # segments become holes (zeroes) in the file, keep what was read
+    # already when resuming
+    if not journal.segments:
+        data_file.truncate(0)
+
+    data_file.truncate(0xF000)
+
+    radio_config = RadioConfig()
+    memory_states = radio_config.detect_memory_segments(protocol)
+
+    # segment contents are implied by the state byte
+    implied_states = (
+        RadioMemoryState.AVAILABLE,
+        RadioMemoryState.UNAVAILABLE)
+
+    read_memory_segments(
+        protocol,
+        data_file,
+        journal,
+        [
+            (index + 1) * 0x1000
+            for index, state in enumerate(memory_states)
+            if state not in implied_states],
+        window=window,
+        progress=progress)
+
+    manifest = []
+    for index, state in enumerate(memory_states):
+        base_address = (index + 1) * 0x1000
+        skipped = state in implied_states
+
+        if state == RadioMemoryState.UNAVAILABLE:
+            data_file.seek(index * 0x1000)
+            data_file.write(bytes([0xFF] * 0x1000))
+
+        manifest.append({
+            'index': index,
+            'address': base_address,
+            'state': state.name,
+            'skipped': skipped})
+
+    manifest_path = Path(f"{data_file.name}.manifest.json")
+    manifest_path.write_text(json.dumps({'segments': manifest}, indent=2))
+
+
+def read_memory(
+    device_path: Path,
+    data_file: t.BinaryIO,
+    window: int = 1,
+    sparse: bool = False,
+    progress: t.Optional['ProgressCallback'] = None,
+    resume: bool = False
+):
+    from .protocol import Protocol
+    from .profiling import phase
+    from .journal import TransferJournal
+
+    # initialize serial port and protocol
+    with phase('open_port'):
+        serial_port = Protocol.open_port(device_path)
+
+    with serial_port:
+        protocol = Protocol(serial_port)
+        with phase('unknown_init'):
+            fingerprint = protocol.unknown_init()
+
+        with phase('probe_chunk_sizes'):
+            protocol.probe_chunk_sizes()
+
+        # only resume reading the same radio memory, which the fingerprint
+        # changes with
+        journal = TransferJournal.open(
+            get_journal_path(data_file.name),
+            key=f"read_memory:{protocol.firmware_variant}:{fingerprint.hex() if fingerprint else ''}",
+            resume=resume and fingerprint is not None)
+
+        if sparse:
+            with phase('read_memory_sparse'):
+                read_memory_sparse(
+                    protocol, data_file, journal, window=window, progress=progress)
+
+        else:
+            # truncate and initialize the data file with zeroes, keep what
+            # was read already when resuming
+            if not journal.segments:
+                data_file.truncate(0)
+                data_file.write(bytes([0x00] * 0xF000))
+
+            data_file.truncate(0xF000)
+
+            # read all memory
+            with phase('read_memory'):
+                read_memory_segments(
+                    protocol,
+                    data_file,
+                    journal,
+                    list(range(0x1000, 0x10000, 0x1000)),
+                    window=window,
+                    progress=progress)
+
+        journal.remove()
+
+
+def write_memory(
+    device_path: Path,
+    data_file: t.BinaryIO,
+    diff: bool = False
+):
     # TODO: confirm with user they want to proceed
     print("Not safe to write to radio yet")
     import sys; sys.exit(1)  # noqa
 
+    from .protocol import Protocol
+
     # sanity check data file size
     data_file_size = data_file.seek(0, io.SEEK_END)
     data_file.seek(0)
@@ -69,45 +242,269 @@ def write_memory(device_path: Path, data_file: t.BinaryIO):
         # write data portion of each memory segment
         for i in range(15):
             data_file.seek(i * 0x1000)
-            protocol.write_memory_range(
-                (i + 1) * 0x1000,
-                data_file.read(0xFFE))  # avoid overwriting the segment state byte
+            data = data_file.read(0xFFE)  # avoid overwriting the segment state byte
 
+            if diff:
+                protocol.write_memory_range_diff((i + 1) * 0x1000, data)
+
+            else:
+                protocol.write_memory_range((i + 1) * 0x1000, data)
+
+
+def read_config(
+    device_path: Path,
+    config_file: t.BinaryIO,
+    minimal: bool = False,
+    cache: t.Optional['ImageCache'] = None,
+    progress: t.Optional['ProgressCallback'] = None,
+    detect_window: int = 1
+):
+    from .profiling import phase
+    from .radio_config import RadioConfig
 
-def read_config(device_path: Path, config_file: t.BinaryIO):
     # read config from radio
     radio_config = RadioConfig()
-    radio_config.read_radio(device_path)
+    with phase('read_radio'):
+        radio_config.read_radio(
+            device_path,
+            minimal=minimal,
+            cache=cache,
+            progress=progress,
+            detect_window=detect_window)
 
     # XXX dump memory
     print('\n')
-    radio_config.hexdump()
+    with phase('hexdump'):
+        radio_config.hexdump()
 
     # save config to file
-    radio_config.write_file(config_file)
-
+    with phase('write_file'):
+        radio_config.write_file(config_file)
+
+
+def write_config(
+    device_path: Path,
+    config_file: t.BinaryIO,
+    diff: bool = False,
+    progress: t.Optional['ProgressCallback'] = None,
+    resume: bool = False,
+    cache: t.Optional['ImageCache'] = None,
+    detect_window: int = 1
+):
+    from .profiling import phase
+    from .journal import TransferJournal
+    from .radio_config import RadioConfig
 
-def write_config(device_path: Path, config_file: t.BinaryIO):
     # TODO: read config from config file
     radio_config = RadioConfig()
-    radio_config.read_file(config_file)
+    with phase('read_file'):
+        radio_config.read_file(config_file)
 
     # XXX dump memory
-    radio_config.hexdump()
+    with phase('hexdump'):
+        radio_config.hexdump()
+
     print('\n')
 
     # TODO: confirm with user they want to proceed
     print("Not safe to write to radio yet")
     import sys; sys.exit(1)  # noqa
 
-    # write config to radio
-    radio_config.write_radio(device_path)
+    # write config to radio, the journal digests tie it to the config data
+    journal = TransferJournal.open(
+        get_journal_path(config_file.name),
+        key='write_config',
+        resume=resume)
+
+    with phase('write_radio'):
+        radio_config.write_radio(
+            device_path,
+            diff=diff,
+            progress=progress,
+            journal=journal,
+            cache=cache,
+            detect_window=detect_window)
+
+
+def verify_config(
+    device_path: Path,
+    config_file: t.BinaryIO,
+    detect_window: int = 1
+):
+    from .fleet import verify_job
+
+    print(verify_job(device_path, config_file.read(), detect_window=detect_window))
+
+
+def apply_changes(
+    device_path: Path,
+    changes_path: Path,
+    dry_run: bool = False,
+    cache: t.Optional['ImageCache'] = None,
+    progress: t.Optional['ProgressCallback'] = None,
+    detect_window: int = 1
+):
+    from .protocol import Protocol
+    from .profiling import phase
+    from .changeset import ChangeSet, describe_changes
+
+    change_set = ChangeSet.load(changes_path)
+
+    # check field names before touching the radio
+    change_set.get_states()
+
+    if not dry_run:
+        # TODO: confirm with user they want to proceed
+        print("Not safe to write to radio yet")
+        sys.exit(1)
+
+    with phase('open_port'):
+        serial_port = Protocol.open_port(device_path)
+
+    with serial_port:
+        protocol = Protocol(serial_port)
+
+        print("Entering programming mode")
+        with phase('unknown_init'):
+            protocol.unknown_init()
+
+        with phase('apply_changes'):
+            changes = change_set.apply_session(
+                protocol,
+                dry_run=dry_run,
+                cache=cache,
+                progress=progress,
+                detect_window=detect_window)
+
+    print(describe_changes(changes))
+
+
+def run_fleet(
+    device_paths: t.List[str],
+    job_name: str,
+    config_file: t.Optional[t.BinaryIO],
+    output_dir: t.Optional[Path],
+    max_workers: int,
+    diff: bool = False,
+    cache: t.Optional['ImageCache'] = None,
+    detect_window: int = 1
+):
+    import functools
+
+    from . import fleet
+
+    if not device_paths:
+        raise RuntimeError("No radio programming cables detected")
+
+    print(f"Using serial devices: {', '.join(device_paths)}")
+
+    if job_name == 'read':
+        if not output_dir:
+            raise RuntimeError("Fleet read requires an output directory")
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+        job = functools.partial(
+            fleet.read_job,
+            output_dir=output_dir,
+            cache=cache,
+            detect_window=detect_window)
+
+    else:
+        if not config_file:
+            raise RuntimeError(f"Fleet {job_name} requires a config file")
+
+        config_data = config_file.read()
+
+        if job_name == 'write':
+            # TODO: confirm with user they want to proceed
+            print("Not safe to write to radio yet")
+            sys.exit(1)
+
+            job = functools.partial(
+                fleet.write_job,
+                config_data=config_data,
+                diff=diff,
+                detect_window=detect_window)
+
+        else:
+            job = functools.partial(
+                fleet.verify_job,
+                config_data=config_data,
+                detect_window=detect_window)
+
+    results = fleet.run_fleet(device_paths, job, max_workers=max_workers)
+    fleet.print_fleet_results(results)
+
+    if not all(result.success for result in results):
+        sys.exit(1)
+
+
+def add_cache_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help="skip reading radios whose memory matches a cached image and reuse detected chunk sizes")
+    parser.add_argument(
+        '--cache-dir',
+        type=Path,
+        help="image cache directory (implies --cache, default: ~/.cache/radioddity_gm30/images)")
+
+
+def get_image_cache(args: argparse.Namespace) -> t.Optional['ImageCache']:
+    if not getattr(args, 'cache', False) and not getattr(args, 'cache_dir', None):
+        return None
+
+    from .image_cache import ImageCache
+
+    return ImageCache(args.cache_dir)
+
+
+def write_metrics(metrics: 'ProtocolMetrics', metrics_path: Path, metrics_format: str):
+    if metrics_format == 'prometheus':
+        metrics_path.write_text(metrics.to_prometheus())
+
+    else:
+        metrics_path.write_text(metrics.to_json())
 
 
 def main():
     # parse command line arguments
     parser = argparse.ArgumentParser()
     parser.add_argument('-d', '--device', type=Path)
+    parser.add_argument(
+        '--metrics-file',
+        type=Path,
+        help="save protocol command metrics to this file when done")
+    parser.add_argument(
+        '--no-progress',
+        dest='progress',
+        action='store_false',
+        help="do not show a progress bar for memory transfers")
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="print the time spent in each phase of the command when done")
+    parser.add_argument(
+        '--profile-file',
+        type=Path,
+        help="also run cProfile and save its stats to this .prof file (implies --profile)")
+    parser.add_argument(
+        '--metrics-format',
+        choices=['json', 'prometheus'],
+        default='json')
+    parser.add_argument(
+        '--detect-window',
+        type=int,
+        default=1,
+        help="number of memory segment state reads to keep in flight (default: 1, experimental)")
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help="run read, write and verify through a running gm30d")
+    parser.add_argument(
+        '--daemon-socket',
+        type=Path,
+        help="Unix socket of gm30d (implies --daemon)")
 
     subparsers = parser.add_subparsers()
 
@@ -115,8 +512,21 @@ def main():
     parser_read_memory.set_defaults(command='read_memory')
     parser_read_memory.add_argument(
         '-f', '--data-file',
-        type=argparse.FileType('wb'),
+        type=Path,
         required=True)
+    parser_read_memory.add_argument(
+        '-w', '--window',
+        type=int,
+        default=1,
+        help="number of read requests to keep in flight")
+    parser_read_memory.add_argument(
+        '-s', '--sparse',
+        action='store_true',
+        help="skip segments whose contents are implied by their state")
+    parser_read_memory.add_argument(
+        '--resume',
+        action='store_true',
+        help="continue an interrupted read of the same radio into the data file")
 
     parser_write_memory = subparsers.add_parser('mw', help="write to radio memory")
     parser_write_memory.set_defaults(command='write_memory')
@@ -124,6 +534,10 @@ def main():
         '-f', '--data-file',
         type=argparse.FileType('rb'),
         required=True)
+    parser_write_memory.add_argument(
+        '--diff',
+        action='store_true',
+        help="only write chunks that differ from radio memory")
 
     parser_read_config = subparsers.add_parser('read', help="read config from radio")
     parser_read_config.set_defaults(command='read_config')
@@ -131,6 +545,11 @@ def main():
         '-c', '--config-file',
         type=argparse.FileType('wb'),
         required=True)
+    parser_read_config.add_argument(
+        '-m', '--minimal',
+        action='store_true',
+        help="only read modeled memory and skip trailing space")
+    add_cache_arguments(parser_read_config)
 
     parser_write_config = subparsers.add_parser('write', help="write config to radio")
     parser_write_config.set_defaults(command='write_config')
@@ -138,9 +557,184 @@ def main():
         '-c', '--config-file',
         type=argparse.FileType('rb'),
         required=True)
+    parser_write_config.add_argument(
+        '--diff',
+        action='store_true',
+        help="only write chunks that differ from radio memory")
+    parser_write_config.add_argument(
+        '--resume',
+        action='store_true',
+        help="continue an interrupted write of the same config file")
+    add_cache_arguments(parser_write_config)
+
+    parser_verify_config = subparsers.add_parser(
+        'verify', help="compare radio config with a config file")
+    parser_verify_config.set_defaults(command='verify_config')
+    parser_verify_config.add_argument(
+        '-c', '--config-file',
+        type=argparse.FileType('rb'),
+        required=True)
+
+    parser_apply = subparsers.add_parser(
+        'apply', help="apply a change set to the radio in one programming session")
+    parser_apply.set_defaults(command='apply_changes')
+    parser_apply.add_argument(
+        'changes_file',
+        type=Path,
+        help="JSON change set of field assignments and entry edits")
+    parser_apply.add_argument(
+        '-n', '--dry-run',
+        action='store_true',
+        help="only read the radio and report what would change")
+    add_cache_arguments(parser_apply)
+
+    parser_fleet = subparsers.add_parser('fleet', help="run a job on every connected radio")
+    parser_fleet.set_defaults(command='fleet')
+    parser_fleet.add_argument(
+        'job',
+        choices=['read', 'write', 'verify'])
+    parser_fleet.add_argument(
+        '-p', '--port',
+        dest='ports',
+        metavar='DEVICE',
+        action='append',
+        help="serial device to use instead of detecting all of them")
+    parser_fleet.add_argument(
+        '-c', '--config-file',
+        type=argparse.FileType('rb'),
+        help="config file to write or verify against")
+    parser_fleet.add_argument(
+        '-o', '--output-dir',
+        type=Path,
+        help="directory to save read configs to")
+    parser_fleet.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=8,
+        help="maximum number of radios to program at once")
+    add_cache_arguments(parser_fleet)
+    parser_fleet.add_argument(
+        '--diff',
+        action='store_true',
+        help="only write chunks that differ from radio memory")
 
     args = parser.parse_args()
 
+    metrics = None
+    if args.metrics_file:
+        from .metrics import ProtocolMetrics
+        from .protocol import Protocol
+
+        # collect metrics of every protocol used by the command
+        metrics = Protocol.metrics = ProtocolMetrics()
+
+    try:
+        if args.profile or args.profile_file:
+            run_profiled(args)
+
+        else:
+            run_command(args)
+
+    finally:
+        if metrics is not None:
+            write_metrics(metrics, args.metrics_file, args.metrics_format)
+
+
+def run_profiled(args: argparse.Namespace):
+    """
+    Run a command recording the time spent in each of its phases and print
+    them as a table when done. Also runs cProfile if a profile file is
+    given.
+    """
+
+    import cProfile
+
+    from .profiling import PhaseTimer, profile_phases
+
+    profiler = cProfile.Profile() if args.profile_file else None
+    timer = PhaseTimer()
+
+    try:
+        with profile_phases(timer):
+            if profiler is not None:
+                profiler.enable()
+
+            try:
+                run_command(args)
+
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+    finally:
+        print(f"\n{timer.format_table()}")
+
+        if profiler is not None:
+            profiler.dump_stats(args.profile_file)
+            print(f"Saved cProfile stats to {args.profile_file}")
+
+
+def run_daemon_command(args: argparse.Namespace):
+    """
+    Run a command through gm30d, which already holds the radio in
+    programming mode.
+    """
+
+    from .daemon_client import DaemonClient
+
+    client = DaemonClient(args.daemon_socket)
+    device = str(args.device) if args.device else None
+
+    if args.command == 'read_config':
+        args.config_file.write(client.read(device, minimal=args.minimal))
+        print(f"Saved config to {args.config_file.name}")
+
+    elif args.command == 'write_config':
+        # TODO: confirm with user they want to proceed
+        print("Not safe to write to radio yet")
+        sys.exit(1)
+
+        print(client.write(args.config_file.read(), device, diff=args.diff))
+
+    elif args.command == 'verify_config':
+        print(client.verify(args.config_file.read(), device))
+
+    elif args.command == 'apply_changes':
+        import json
+
+        changes = json.loads(args.changes_file.read_text())
+        if not args.dry_run:
+            # TODO: confirm with user they want to proceed
+            print("Not safe to write to radio yet")
+            sys.exit(1)
+
+        print(client.apply(changes, device, dry_run=args.dry_run))
+
+    else:
+        raise RuntimeError(f"Command is not supported through gm30d: {args.command}")
+
+
+def run_command(args: argparse.Namespace):
+    if args.daemon or args.daemon_socket:
+        run_daemon_command(args)
+        return
+
+    cache = get_image_cache(args)
+
+    # fleet jobs use every detected serial port
+    if args.command == 'fleet':
+        run_fleet(
+            device_paths=args.ports or detect_serial_ports(),
+            job_name=args.job,
+            config_file=args.config_file,
+            output_dir=args.output_dir,
+            max_workers=args.jobs,
+            diff=args.diff,
+            cache=cache,
+            detect_window=args.detect_window)
+
+        return
+
     # determine serial port device path
     device_path = args.device or detect_serial_port()
     if not device_path:
@@ -149,15 +743,72 @@ def main():
     else:
         print(f"Using serial device: {device_path}")
 
-    # run the requested command
+    if not args.progress or not sys.stderr.isatty():
+        run_device_command(args, device_path, cache)
+        return
+
+    from .progress import ProgressBar
+
+    # keep regular output from ending up on the progress bar line
+    progress_bar = ProgressBar(sys.stderr)
+    with contextlib.redirect_stdout(progress_bar.wrap_output(sys.stdout)):
+        run_device_command(args, device_path, cache, progress_bar)
+
+
+def run_device_command(
+    args: argparse.Namespace,
+    device_path: Path,
+    cache: t.Optional['ImageCache'] = None,
+    progress: t.Optional['ProgressCallback'] = None
+):
     if args.command == 'read_memory':
-        read_memory(device_path=device_path, data_file=args.data_file)
+        # keep the data read so far when resuming
+        data_file_mode = 'r+b' if args.resume and args.data_file.exists() else 'w+b'
+        with args.data_file.open(data_file_mode) as data_file:
+            read_memory(
+                device_path=device_path,
+                data_file=data_file,
+                window=args.window,
+                sparse=args.sparse,
+                progress=progress,
+                resume=args.resume)
 
     elif args.command == 'write_memory':
-        write_memory(device_path=device_path, data_file=args.data_file)
+        write_memory(
+            device_path=device_path,
+            data_file=args.data_file,
+            diff=args.diff)
 
     elif args.command == 'read_config':
-        read_config(device_path=device_path, config_file=args.config_file)
+        read_config(
+            device_path=device_path,
+            config_file=args.config_file,
+            minimal=args.minimal,
+            cache=cache,
+            progress=progress,
+            detect_window=args.detect_window)
 
     elif args.command == 'write_config':
-        write_config(device_path=device_path, config_file=args.config_file)
+        write_config(
+            device_path=device_path,
+            config_file=args.config_file,
+            diff=args.diff,
+            progress=progress,
+            resume=args.resume,
+            cache=cache,
+            detect_window=args.detect_window)
+
+    elif args.command == 'verify_config':
+        verify_config(
+            device_path=device_path,
+            config_file=args.config_file,
+            detect_window=args.detect_window)
+
+    elif args.command == 'apply_changes':
+        apply_changes(
+            device_path=device_path,
+            changes_path=args.changes_file,
+            dry_run=args.dry_run,
+            cache=cache,
+            progress=progress,
+            detect_window=args.detect_window)
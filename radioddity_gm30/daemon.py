@@ -0,0 +1,337 @@
+import io
+import time
+import argparse
+import threading
+import traceback
+import contextlib
+import socketserver
+import typing as t
+from pathlib import Path
+from datetime import timedelta
+
+from .protocol import Protocol
+from .image_cache import ImageCache
+from .changeset import ChangeSet, describe_changes
+from .radio_config import RadioConfig
+from .daemon_client import (
+    get_default_socket_path,
+    send_message,
+    receive_message,
+    encode_data,
+    decode_data,
+    DaemonClient)
+
+
+class RadioSession:
+    """
+    Serial port of a programming cable kept open with the radio held in
+    programming mode between transfers.
+
+    Programming mode is entered on first use and kept with keepalives while
+    the session is idle. If a transfer fails the session is closed since the
+    state of the radio is unknown, the next use enters programming mode
+    again.
+    """
+
+    KEEPALIVE_INTERVAL = timedelta(seconds=2)
+
+    def __init__(self, device_path: str):
+        self.device_path = device_path
+        self.lock = threading.Lock()
+
+        self.protocol: t.Optional[Protocol] = None
+        self.last_used = 0.0
+        self.handshakes = 0
+        self.requests = 0
+
+    def _open(self):
+        serial_port = Protocol.open_port(self.device_path)
+        try:
+            protocol = Protocol(serial_port)
+            protocol.unknown_init()
+
+        except BaseException:
+            serial_port.close()
+            raise
+
+        self.protocol = protocol
+        self.handshakes += 1
+
+    def _close(self):
+        if self.protocol is not None:
+            self.protocol.port.close()
+            self.protocol = None
+
+    def close(self):
+        with self.lock:
+            self._close()
+
+    @contextlib.contextmanager
+    def use(self) -> t.Iterator[Protocol]:
+        """
+        Use the protocol of the session for a transfer, entering programming
+        mode if needed.
+        """
+
+        with self.lock:
+            self.requests += 1
+            if self.protocol is None:
+                self._open()
+
+            try:
+                yield self.protocol
+
+            except BaseException:
+                self._close()
+                raise
+
+            finally:
+                self.last_used = time.monotonic()
+
+    def keepalive(self, interval: timedelta = KEEPALIVE_INTERVAL):
+        """
+        Send a keepalive if the session was idle for `interval`. Sessions in
+        use are skipped since their transfer keeps the radio busy.
+        """
+
+        if not self.lock.acquire(blocking=False):
+            return
+
+        try:
+            idle_seconds = time.monotonic() - self.last_used
+            if self.protocol is None or idle_seconds < interval.total_seconds():
+                return
+
+            try:
+                if self.protocol.keepalive():
+                    self.handshakes += 1
+
+            except Exception:
+                traceback.print_exc()
+                self._close()
+
+            self.last_used = time.monotonic()
+
+        finally:
+            self.lock.release()
+
+    def get_status(self) -> t.Dict[str, t.Any]:
+        return {
+            'device': self.device_path,
+            'open': self.protocol is not None,
+            'handshakes': self.handshakes,
+            'requests': self.requests}
+
+
+def _export_config(radio_config: RadioConfig) -> bytes:
+    config_file = io.BytesIO()
+    radio_config.write_file(config_file)
+    return config_file.getvalue()
+
+
+def _import_config(config_data: bytes) -> RadioConfig:
+    radio_config = RadioConfig()
+    radio_config.read_file(io.BytesIO(config_data))
+    return radio_config
+
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    server: 'ProgrammingDaemon'
+
+    def handle(self):
+        try:
+            response = self.server.run_job(receive_message(self.rfile))
+
+        except Exception as e:
+            traceback.print_exc()
+            response = {'success': False, 'message': f"{type(e).__name__}: {e}"}
+
+        send_message(self.wfile, response)
+
+
+class ProgrammingDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves read, write, verify and apply requests of DaemonClient over a
+    Unix socket with one RadioSession per programming cable, so repeated
+    requests for the same radio only enter programming mode once.
+
+    Requests for different cables run in parallel, requests for the same
+    cable one after another.
+    """
+
+    daemon_threads = True
+
+    # TODO: lift together with the guard of the gm30 write commands once
+    # writing to radios is safe, clients may bypass that one
+    WRITES_ENABLED = False
+
+    def __init__(
+        self,
+        socket_path: Path,
+        device_paths: t.List[str],
+        cache: t.Optional[ImageCache] = None,
+        keepalive_interval: timedelta = RadioSession.KEEPALIVE_INTERVAL
+    ):
+        self.socket_path = Path(socket_path)
+        self.sessions = {
+            str(device_path): RadioSession(str(device_path))
+            for device_path in device_paths}
+        self.cache = cache
+        self.keepalive_interval = keepalive_interval
+
+        self._stopped = threading.Event()
+        self._keepalive_thread = threading.Thread(
+            target=self._run_keepalive, daemon=True)
+
+        # replace the socket of a daemon that did not shut down cleanly
+        if self.socket_path.exists():
+            try:
+                DaemonClient(self.socket_path).status()
+
+            except RuntimeError:
+                self.socket_path.unlink()
+
+            else:
+                raise RuntimeError(f"gm30d is already running on {self.socket_path}")
+
+        super().__init__(str(self.socket_path), DaemonRequestHandler)
+
+    def _run_keepalive(self):
+        while not self._stopped.wait(self.keepalive_interval.total_seconds() / 4):
+            for session in self.sessions.values():
+                session.keepalive(self.keepalive_interval)
+
+    def get_session(self, device_path: t.Optional[str]) -> RadioSession:
+        if device_path is None:
+            if len(self.sessions) != 1:
+                raise RuntimeError(
+                    f"Request needs to name one of {len(self.sessions)} devices")
+
+            return next(iter(self.sessions.values()))
+
+        session = self.sessions.get(str(device_path))
+        if session is None:
+            raise RuntimeError(f"Unknown device: {device_path}")
+
+        return session
+
+    def run_job(self, request: t.Dict[str, t.Any]) -> t.Dict[str, t.Any]:
+        job = request['job']
+        if job == 'status':
+            return {
+                'success': True,
+                'message': f"Holding {len(self.sessions)} devices",
+                'sessions': [
+                    session.get_status() for session in self.sessions.values()]}
+
+        session = self.get_session(request.get('device'))
+
+        writes = job == 'write' or (job == 'apply' and not request.get('dry_run', False))
+        if writes and not self.WRITES_ENABLED:
+            raise RuntimeError("Not safe to write to radio yet")
+
+        if job == 'read':
+            radio_config = RadioConfig()
+            with session.use() as protocol:
+                radio_config.read_session(
+                    protocol, minimal=request.get('minimal', False), cache=self.cache)
+
+            return {
+                'success': True,
+                'message': "Read config",
+                'config': encode_data(_export_config(radio_config))}
+
+        elif job == 'write':
+            radio_config = _import_config(decode_data(request['config']))
+            with session.use() as protocol:
+                radio_config.write_session(
+                    protocol, diff=request.get('diff', False), cache=self.cache)
+
+            return {'success': True, 'message': "Wrote config"}
+
+        elif job == 'verify':
+            expected_config = _import_config(decode_data(request['config']))
+
+            radio_config = RadioConfig()
+            with session.use() as protocol:
+                radio_config.read_session(protocol, cache=self.cache)
+
+            if _export_config(radio_config) != _export_config(expected_config):
+                return {'success': False, 'message': "Radio config does not match config file"}
+
+            return {'success': True, 'message': "Radio config matches config file"}
+
+        elif job == 'apply':
+            change_set = ChangeSet.from_dict(request['changes'])
+            change_set.get_states()
+
+            with session.use() as protocol:
+                changes = change_set.apply_session(
+                    protocol, dry_run=request.get('dry_run', False), cache=self.cache)
+
+            return {'success': True, 'message': describe_changes(changes)}
+
+        raise RuntimeError(f"Unknown job: {job}")
+
+    def serve(self):
+        self._keepalive_thread.start()
+        self.serve_forever()
+
+    def server_close(self):
+        self._stopped.set()
+        super().server_close()
+
+        for session in self.sessions.values():
+            session.close()
+
+        with contextlib.suppress(FileNotFoundError):
+            self.socket_path.unlink()
+
+
+def main():
+    from .cli import add_cache_arguments, get_image_cache, detect_serial_ports
+
+    parser = argparse.ArgumentParser(
+        description="hold radios in programming mode and serve gm30 --daemon requests")
+    parser.add_argument(
+        '-p', '--port',
+        dest='ports',
+        metavar='DEVICE',
+        action='append',
+        help="serial device to use instead of detecting all of them")
+    parser.add_argument(
+        '-s', '--socket',
+        type=Path,
+        default=get_default_socket_path(),
+        help="Unix socket to listen on (default: %(default)s)")
+    parser.add_argument(
+        '--keepalive-interval',
+        type=float,
+        default=RadioSession.KEEPALIVE_INTERVAL.total_seconds(),
+        help="seconds of idle time before a keepalive is sent")
+    add_cache_arguments(parser)
+
+    args = parser.parse_args()
+
+    device_paths = args.ports or detect_serial_ports()
+    if not device_paths:
+        raise RuntimeError("No radio programming cables detected")
+
+    daemon = ProgrammingDaemon(
+        args.socket,
+        device_paths,
+        cache=get_image_cache(args),
+        keepalive_interval=timedelta(seconds=args.keepalive_interval))
+
+    with daemon:
+        print(f"Using serial devices: {', '.join(device_paths)}")
+        print(f"Listening on: {args.socket}")
+        try:
+            daemon.serve()
+
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import os
+import json
+import base64
+import socket
+import tempfile
+import typing as t
+from pathlib import Path
+
+
+def get_default_socket_path() -> Path:
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return Path(runtime_dir) / 'gm30d.sock'
+
+    return Path(tempfile.gettempdir()) / f'gm30d-{os.getuid()}.sock'
+
+
+def send_message(stream: t.BinaryIO, message: t.Dict[str, t.Any]):
+    """
+    Send a message as a single line of JSON, see receive_message().
+    """
+
+    stream.write(json.dumps(message).encode() + b'\n')
+    stream.flush()
+
+
+def receive_message(stream: t.BinaryIO) -> t.Dict[str, t.Any]:
+    line = stream.readline()
+    if not line:
+        raise RuntimeError("Connection closed before a message was received")
+
+    return json.loads(line)
+
+
+def encode_data(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+def decode_data(text: str) -> bytes:
+    return base64.b64decode(text)
+
+
+class DaemonClient:
+    """
+    Client of a gm30d daemon (see daemon.ProgrammingDaemon).
+
+    Every request is sent over a new connection to the daemon's Unix socket
+    and answered once the daemon ran it against the radio. The daemon keeps
+    the radio in programming mode between requests. A `device` is only
+    required if the daemon holds more than one cable.
+    """
+
+    def __init__(self, socket_path: t.Optional[Path] = None):
+        self.socket_path = Path(socket_path or get_default_socket_path())
+
+    def request(self, job: str, **parameters) -> t.Dict[str, t.Any]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            try:
+                connection.connect(str(self.socket_path))
+
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                raise RuntimeError(
+                    f"gm30d is not running on {self.socket_path}") from e
+
+            with connection.makefile('rwb') as stream:
+                send_message(stream, {'job': job, **parameters})
+                response = receive_message(stream)
+
+        if not response['success']:
+            raise RuntimeError(response['message'])
+
+        return response
+
+    def read(self, device: t.Optional[str] = None, minimal: bool = False) -> bytes:
+        """
+        Read the radio config, returned in the config file format.
+        """
+
+        response = self.request('read', device=device, minimal=minimal)
+        return decode_data(response['config'])
+
+    def write(
+        self,
+        config_data: bytes,
+        device: t.Optional[str] = None,
+        diff: bool = False
+    ) -> str:
+        response = self.request(
+            'write', device=device, config=encode_data(config_data), diff=diff)
+
+        return response['message']
+
+    def verify(self, config_data: bytes, device: t.Optional[str] = None) -> str:
+        response = self.request(
+            'verify', device=device, config=encode_data(config_data))
+
+        return response['message']
+
+    def apply(
+        self,
+        changes: t.Dict[str, t.Any],
+        device: t.Optional[str] = None,
+        dry_run: bool = False
+    ) -> str:
+        """
+        Apply a change set (see changeset.ChangeSet) to the radio.
+        """
+
+        response = self.request(
+            'apply', device=device, changes=changes, dry_run=dry_run)
+
+        return response['message']
+
+    def status(self) -> t.List[t.Dict[str, t.Any]]:
+        return self.request('status')['sessions']
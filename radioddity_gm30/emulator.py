@@ -0,0 +1,345 @@
+import os
+import pty
+import time
+import random
+import select
+import struct
+import hashlib
+import argparse
+import threading
+import collections
+import typing as t
+from pathlib import Path
+
+
+class RadioEmulator:
+    """
+    Software radio speaking the serial programming protocol over a pty.
+
+    The emulator serves the slave end of a pty pair (see `device_path`) which
+    can be opened with Protocol.open_port() like a real programming cable.
+    Radio memory from 0x1000 through 0xFFFF is backed by a 0xF000 byte image
+    in the same format as the `mr` command output.
+
+    Requests are processed in order like the radio does. While a read
+    response is waiting to be acknowledged further requests are queued and
+    processed after the ACK which allows pipelined reads.
+
+    Timing and faults:
+    - baudrate: requests and responses are delayed by the time they take on
+      the wire (10 bits per byte) unless set to None
+    - latency: seconds to wait before answering each command
+    - drop_rate: probability of dropping one byte from a response
+    - bad_header_rate: probability of corrupting a read response address
+    - missing_ack_rate: probability of not answering an ACK or write
+    """
+
+    MEMORY_BASE = 0x1000
+    MEMORY_SIZE = 0xF000
+    SYSINFO_QUERIES = [
+        bytes([0x56, 0x00, query, 0x0A, 0x0D])
+        for query in (0x00, 0x10, 0x20)]
+
+    def __init__(
+        self,
+        image: t.Optional[bytes] = None,
+        firmware_variant: str = 'P13GMRS',
+        baudrate: t.Optional[int] = None,
+        latency: float = 0.0,
+        drop_rate: float = 0.0,
+        bad_header_rate: float = 0.0,
+        missing_ack_rate: float = 0.0,
+        seed: t.Optional[int] = None
+    ):
+        if image is None:
+            image = bytes([0xFF] * self.MEMORY_SIZE)
+
+        if len(image) != self.MEMORY_SIZE:
+            raise RuntimeError(f"Invalid memory image size: {len(image)}")
+
+        self.memory = bytearray(image)
+        self.firmware_variant = firmware_variant
+        self.baudrate = baudrate
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.bad_header_rate = bad_header_rate
+        self.missing_ack_rate = missing_ack_rate
+
+        self.programming_mode = False
+        self.command_counts: t.Counter[str] = collections.Counter()
+
+        self._random = random.Random(seed)
+        self._buffer = bytearray()
+        self._queue: t.Deque[t.Tuple] = collections.deque()
+        self._awaiting_ack = False
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: t.Optional[threading.Thread] = None
+
+        self._master_fd, self._slave_fd = pty.openpty()
+        self.device_path = Path(os.ttyname(self._slave_fd))
+
+    @classmethod
+    def from_file(cls, image_path: Path, **kwargs) -> 'RadioEmulator':
+        return cls(Path(image_path).read_bytes(), **kwargs)
+
+    def __enter__(self) -> 'RadioEmulator':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+        os.close(self._slave_fd)
+        os.close(self._master_fd)
+
+    def read_memory(self, address: int, size: int) -> bytes:
+        data = bytearray([0xFF] * size)
+        for i in range(size):
+            offset = address + i - self.MEMORY_BASE
+            if 0 <= offset < self.MEMORY_SIZE:
+                data[i] = self.memory[offset]
+
+        return bytes(data)
+
+    def write_memory(self, address: int, data: bytes):
+        for i, value in enumerate(data):
+            offset = address + i - self.MEMORY_BASE
+            if 0 <= offset < self.MEMORY_SIZE:
+                self.memory[offset] = value
+
+    def sysinfo_value(self, query: int) -> bytes:
+        # the real values are not understood but seem to depend on the
+        # memory contents only so derive them from a hash of the memory
+        return hashlib.blake2b(
+            self.memory,
+            digest_size=8,
+            person=bytes([0x56, query])).digest()
+
+    # Serving
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            readable, _, _ = select.select([self._master_fd], [], [], 0.1)
+            if not readable:
+                continue
+
+            try:
+                data = os.read(self._master_fd, 0x1000)
+
+            except OSError:
+                return
+
+            if not data:
+                return
+
+            if self.baudrate:
+                time.sleep(len(data) * 10 / self.baudrate)
+
+            with self._lock:
+                self._buffer += data
+                for request in self._parse():
+                    self._handle(request)
+
+    def _send(self, data: bytes):
+        if not data:
+            return
+
+        if self.drop_rate and self._random.random() < self.drop_rate:
+            index = self._random.randrange(len(data))
+            data = data[:index] + data[index + 1:]
+
+        if self.baudrate:
+            time.sleep(len(data) * 10 / self.baudrate)
+
+        os.write(self._master_fd, data)
+
+    def _parse(self) -> t.Iterator[t.Tuple]:
+        fixed_requests = {
+            b'PSEARCH': ('psearch',),
+            b'PASSSTA': ('passsta',),
+            b'SYSINFO': ('sysinfo',)}
+
+        variant_request = bytes([0xFF, 0xFF, 0xFF, 0xFF, 0x0C]) + \
+            self.firmware_variant.encode()
+
+        while self._buffer:
+            command = self._buffer[0]
+
+            if command == 0x06:
+                del self._buffer[:1]
+                yield ('ack',)
+
+            elif command == 0x02:
+                del self._buffer[:1]
+                yield ('enter',)
+
+            elif command in b'PS':
+                prefix = bytes(self._buffer[:7])
+                if len(prefix) < 7:
+                    return
+
+                del self._buffer[:7]
+                yield fixed_requests.get(prefix, ('unknown', prefix))
+
+            elif command == 0xFF:
+                if len(self._buffer) < len(variant_request):
+                    return
+
+                request = bytes(self._buffer[:len(variant_request)])
+                del self._buffer[:len(variant_request)]
+                yield ('variant', request == variant_request)
+
+            elif command == 0x56:
+                if len(self._buffer) < 5:
+                    return
+
+                request = bytes(self._buffer[:5])
+                del self._buffer[:5]
+                yield ('query', request)
+
+            elif command == 0x52:
+                if len(self._buffer) < 5:
+                    return
+
+                address, size = struct.unpack_from('<HxB', self._buffer, 1)
+                del self._buffer[:5]
+                yield ('read', address, size)
+
+            elif command == 0x57:
+                if len(self._buffer) < 5:
+                    return
+
+                address, size = struct.unpack_from('<HxB', self._buffer, 1)
+                if len(self._buffer) < 5 + size:
+                    return
+
+                data = bytes(self._buffer[5:5 + size])
+                del self._buffer[:5 + size]
+                yield ('write', address, data)
+
+            else:
+                del self._buffer[:1]
+                yield ('unknown', bytes([command]))
+
+    def _handle(self, request: t.Tuple):
+        self.command_counts[request[0]] += 1
+
+        if request[0] == 'ack':
+            self._awaiting_ack = False
+            if not self._missing_ack():
+                self._send(bytes([0x06]))
+
+        else:
+            self._queue.append(request)
+
+        while self._queue and not self._awaiting_ack:
+            self._run(self._queue.popleft())
+
+    def _missing_ack(self) -> bool:
+        return bool(self.missing_ack_rate) \
+            and self._random.random() < self.missing_ack_rate
+
+    def _run(self, request: t.Tuple):
+        if self.latency:
+            time.sleep(self.latency)
+
+        name = request[0]
+
+        if name == 'psearch':
+            self._send(bytes([0x06]) + self.firmware_variant.encode())
+
+        elif name == 'passsta':
+            self._send(b'P' + bytes([0x00, 0x00]))
+
+        elif name == 'sysinfo':
+            self._send(bytes([0x06]))
+
+        elif name == 'query':
+            query = request[1]
+            if query in self.SYSINFO_QUERIES:
+                header = bytes([0x56, 0x0D, 0x0A, 0x0A, 0x0D])
+                self._send(header + self.sysinfo_value(query[2]))
+
+            elif query == bytes([0x56, 0x00, 0x00, 0x00, 0x0A]):
+                header = bytes([0x56, 0x0A, 0x08, 0x00, 0x10])
+                self._send(header + bytes([0x00, 0x00, 0xFF, 0xFF, 0x00, 0x00]))
+
+            else:
+                return
+
+            self._awaiting_ack = True
+
+        elif name == 'variant':
+            if request[1]:
+                self.programming_mode = True
+                self._send(bytes([0x06]))
+
+        elif name == 'enter':
+            self._send(bytes([0xFF] * 8))
+            self._awaiting_ack = True
+
+        elif name == 'read' and self.programming_mode:
+            _, address, size = request
+            header = bytearray(struct.pack('<BHxB', 0x57, address, size))
+            if self.bad_header_rate \
+                    and self._random.random() < self.bad_header_rate:
+                header[1] ^= 0xFF
+
+            self._send(bytes(header) + self.read_memory(address, size))
+            self._awaiting_ack = True
+
+        elif name == 'write' and self.programming_mode:
+            _, address, data = request
+            self.write_memory(address, data)
+            if not self._missing_ack():
+                self._send(bytes([0x06]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="emulate a radio on a pty for use with --device")
+    parser.add_argument(
+        'image_file',
+        type=Path,
+        nargs='?',
+        help="memory image as saved by the mr command")
+    parser.add_argument('--baudrate', type=int, default=57600)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--bad-header-rate', type=float, default=0.0)
+    parser.add_argument('--missing-ack-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+
+    args = parser.parse_args()
+
+    emulator = RadioEmulator(
+        image=args.image_file.read_bytes() if args.image_file else None,
+        baudrate=args.baudrate,
+        latency=args.latency,
+        drop_rate=args.drop_rate,
+        bad_header_rate=args.bad_header_rate,
+        missing_ack_rate=args.missing_ack_rate,
+        seed=args.seed)
+
+    with emulator:
+        print(f"Emulating radio on: {emulator.device_path}")
+        try:
+            while True:
+                time.sleep(1)
+
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+import io
+import time
+import traceback
+import typing as t
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from .image_cache import ImageCache
+from .radio_config import RadioConfig
+
+
+class FleetResult(t.NamedTuple):
+    device_path: str
+    success: bool
+    message: str
+    elapsed: float
+
+
+def _export_config(radio_config: RadioConfig) -> bytes:
+    config_file = io.BytesIO()
+    radio_config.write_file(config_file)
+    return config_file.getvalue()
+
+
+def read_job(
+    device_path: str,
+    output_dir: Path,
+    cache: t.Optional[ImageCache] = None,
+    detect_window: int = RadioConfig.MEMORY_SEGMENT_DETECT_WINDOW
+) -> str:
+    radio_config = RadioConfig()
+    radio_config.read_radio(device_path, cache=cache, detect_window=detect_window)
+
+    config_path = output_dir / f"{Path(device_path).name}.bin"
+    with config_path.open('wb') as config_file:
+        radio_config.write_file(config_file)
+
+    return f"Saved config to {config_path}"
+
+
+def write_job(
+    device_path: str,
+    config_data: bytes,
+    diff: bool = False,
+    detect_window: int = RadioConfig.MEMORY_SEGMENT_DETECT_WINDOW
+) -> str:
+    radio_config = RadioConfig()
+    radio_config.read_file(io.BytesIO(config_data))
+    radio_config.write_radio(device_path, diff=diff, detect_window=detect_window)
+
+    return "Wrote config"
+
+
+def verify_job(
+    device_path: str,
+    config_data: bytes,
+    detect_window: int = RadioConfig.MEMORY_SEGMENT_DETECT_WINDOW
+) -> str:
+    expected_config = RadioConfig()
+    expected_config.read_file(io.BytesIO(config_data))
+
+    radio_config = RadioConfig()
+    radio_config.read_radio(device_path, detect_window=detect_window)
+
+    if _export_config(radio_config) != _export_config(expected_config):
+        raise RuntimeError("Radio config does not match config file")
+
+    return "Radio config matches config file"
+
+
+def run_fleet(
+    device_paths: t.List[str],
+    job: t.Callable[[str], str],
+    max_workers: int = 8
+) -> t.List[FleetResult]:
+    """
+    Run a job against every device in parallel with at most `max_workers`
+    radios in progress at once. A failing radio is reported in its result
+    and does not stop the others.
+    """
+
+    def run_job(device_path: str) -> FleetResult:
+        start = time.monotonic()
+        try:
+            message = job(device_path)
+            success = True
+
+        except Exception as e:
+            traceback.print_exc()
+            message = f"{type(e).__name__}: {e}"
+            success = False
+
+        return FleetResult(
+            device_path=device_path,
+            success=success,
+            message=message,
+            elapsed=time.monotonic() - start)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_job, device_paths))
+
+
+def print_fleet_results(results: t.List[FleetResult]):
+    print(f"\n{'Device':<24} {'Result':<6} {'Time':>8}  Message")
+    print('-' * 86)
+    for result in results:
+        status = 'OK' if result.success else 'FAIL'
+        print(
+            f"{result.device_path:<24} {status:<6} "
+            f"{result.elapsed:>7.1f}s  {result.message}")
+
+    print('-' * 86)
+    failed = sum(1 for result in results if not result.success)
+    print(f"{len(results) - failed} succeeded, {failed} failed")
@@ -0,0 +1,144 @@
+import os
+import json
+import tempfile
+import typing as t
+from pathlib import Path
+
+
+class ImageCache:
+    """
+    On-disk cache of radio config images keyed by firmware variant and the
+    sysinfo fingerprint returned by Protocol.unknown_init().
+
+    The fingerprint changes with the radio memory contents, so an image
+    stored under the current fingerprint of a radio matches its memory and
+    does not need to be read again. Images are stored in the config file
+    format (see RadioConfig.write_file()) and replaced atomically so several
+    readers and writers can share one cache directory.
+
+    Every change to a radio adds a new image, so only the `max_entries` most
+    recently used images are kept.
+
+    The transfer chunk sizes detected for each firmware variant (see
+    Protocol.probe_chunk_sizes()) are kept alongside the images so they are
+    only probed once.
+    """
+
+    DEFAULT_MAX_ENTRIES = 256
+
+    def __init__(
+        self,
+        cache_dir: t.Optional[Path] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES
+    ):
+        self.cache_dir = Path(cache_dir or self.get_default_dir())
+        self.max_entries = max_entries
+
+    @staticmethod
+    def get_default_dir() -> Path:
+        cache_home = os.environ.get('XDG_CACHE_HOME')
+        if not cache_home:
+            cache_home = Path.home() / '.cache'
+
+        return Path(cache_home) / 'radioddity_gm30' / 'images'
+
+    def get_path(self, firmware_variant: str, fingerprint: bytes) -> Path:
+        # the variant name comes from the radio, keep it a plain file name
+        variant = ''.join(c if c.isalnum() else '_' for c in firmware_variant)
+        return self.cache_dir / f"{variant}-{fingerprint.hex()}.bin"
+
+    def get_chunk_sizes_path(self) -> Path:
+        return self.cache_dir / 'chunk_sizes.json'
+
+    def load_chunk_sizes(
+        self,
+        firmware_variant: str
+    ) -> t.Tuple[t.Optional[int], t.Optional[int]]:
+        """
+        Retrieve the (read, write) chunk sizes of a firmware variant, either
+        of which is None if it was not probed yet.
+        """
+
+        try:
+            chunk_sizes = json.loads(self.get_chunk_sizes_path().read_text())
+
+        except (FileNotFoundError, ValueError):
+            return None, None
+
+        read_size, write_size = chunk_sizes.get(firmware_variant, (None, None))
+        return read_size, write_size
+
+    def store_chunk_sizes(
+        self,
+        firmware_variant: str,
+        read_size: t.Optional[int],
+        write_size: t.Optional[int]
+    ):
+        path = self.get_chunk_sizes_path()
+        try:
+            chunk_sizes = json.loads(path.read_text())
+
+        except (FileNotFoundError, ValueError):
+            chunk_sizes = {}
+
+        chunk_sizes[firmware_variant] = [read_size, write_size]
+        self._replace(path, json.dumps(chunk_sizes, indent=2).encode())
+
+    def load(
+        self,
+        firmware_variant: str,
+        fingerprint: bytes,
+        size: int
+    ) -> t.Optional[bytes]:
+        """
+        Retrieve the cached image or None if there is none of the expected
+        size.
+        """
+
+        path = self.get_path(firmware_variant, fingerprint)
+        try:
+            data = path.read_bytes()
+
+            # mark the image as recently used
+            os.utime(path)
+
+        except FileNotFoundError:
+            return None
+
+        return data if len(data) == size else None
+
+    def store(self, firmware_variant: str, fingerprint: bytes, data: bytes):
+        self._replace(self.get_path(firmware_variant, fingerprint), data)
+        self._prune()
+
+    @staticmethod
+    def _replace(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+
+            os.replace(temp_path, path)
+
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _prune(self):
+        entries = []
+        for path in self.cache_dir.glob('*.bin'):
+            try:
+                entries.append((path.stat().st_mtime, path))
+
+            except FileNotFoundError:
+                continue
+
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            try:
+                path.unlink()
+
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import typing as t
+from pathlib import Path
+
+
+class TransferJournal:
+    """
+    Checkpoint journal of a memory transfer that allows resuming it after
+    an interruption.
+
+    For every memory segment the journal records the address up to which
+    the transfer was confirmed and a SHA-256 digest identifying the data,
+    which is checked before resuming. The whole journal is tied to a `key`
+    describing the transfer (e.g. the radio memory fingerprint) and ignored
+    if that changed. The file is replaced atomically on every checkpoint
+    and removed once the transfer completed.
+    """
+
+    # bytes transferred between checkpoints
+    CHECKPOINT_SIZE = 0x100
+
+    def __init__(self, path: Path, key: str):
+        self.path = Path(path)
+        self.key = key
+
+        # segment base address -> (confirmed address, hex digest)
+        self.segments: t.Dict[int, t.Tuple[int, str]] = {}
+
+    @classmethod
+    def open(cls, path: Path, key: str, resume: bool = False) -> 'TransferJournal':
+        """
+        Start a journal, picking up the checkpoints of an earlier transfer
+        with the same key when resuming.
+        """
+
+        journal = cls(path, key)
+        if not resume:
+            return journal
+
+        try:
+            contents = json.loads(journal.path.read_text())
+
+        except (FileNotFoundError, ValueError):
+            return journal
+
+        if contents.get('key') == key:
+            journal.segments = {
+                segment['address']: (segment['confirmed'], segment['sha256'])
+                for segment in contents['segments']}
+
+        return journal
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def get_confirmed(self, address: int) -> int:
+        """
+        Retrieve the address up to which the segment at `address` was
+        confirmed, which is the segment address if nothing was.
+        """
+
+        return self.segments.get(address, (address, None))[0]
+
+    def check_digest(self, address: int, data: bytes) -> bool:
+        """
+        Check whether the data recorded for the segment at `address` has the
+        same digest as `data`.
+        """
+
+        return address in self.segments \
+            and self.segments[address][1] == self.digest(data)
+
+    def confirm(self, address: int, confirmed: int, data: bytes):
+        """
+        Record that the segment at `address` was transferred up to the
+        `confirmed` address for the data with the digest of `data`.
+        """
+
+        self.segments[address] = (confirmed, self.digest(data))
+        self.save()
+
+    def save(self):
+        contents = {
+            'key': self.key,
+            'segments': [
+                {'address': address, 'confirmed': confirmed, 'sha256': digest}
+                for address, (confirmed, digest) in sorted(self.segments.items())]}
+
+        temp_path = self.path.with_name(f'{self.path.name}.tmp')
+        temp_path.write_text(json.dumps(contents, indent=2))
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        self.segments = {}
+        try:
+            self.path.unlink()
+
+        except FileNotFoundError:
+            pass
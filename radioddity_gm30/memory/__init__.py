@@ -1,5 +1,25 @@
 # flake8: noqa
 
+from .layout import (
+    get_field_range,
+    get_block_size,
+    get_modeled_ranges,
+    merge_ranges,
+    import_view)
+
+from .codec import (
+    BlockCodec,
+    CompiledBlock,
+    compare_codec,
+    get_codec)
+
+from .tracking import TrackedBlock
+
+from .lazy import (
+    LazyEntryList,
+    LazyEntries,
+    LazyEntriesBlock)
+
 from .unknown import UnknownMemory
 from .frequency import FrequencyMemory
 from .channel import (
@@ -1,7 +1,10 @@
 from mrcrowbar import models as mrc
 
+from .codec import CompiledBlock
+from .lazy import LazyEntries, LazyEntriesBlock
 
-class ChannelEntry(mrc.Block):
+
+class ChannelEntry(CompiledBlock):
     name = mrc.CStringN(
         offset=0x00,
         element_length=6,
@@ -15,19 +18,29 @@ class ChannelEntry(mrc.Block):
         default=bytes([0x00] * 5))
 
 
-class ChannelMemory(mrc.Block):
-    # XXX: seems to break hexdump() when in initial state
-    channel_entries = mrc.BlockField(
-        ChannelEntry,
+class ChannelMemory(LazyEntriesBlock):
+    # entries are decoded on first access, see LazyEntries
+    channel_entries_data = mrc.Bytes(
         offset=0x00,
+        length=250 * 11,
+        default=bytes([0xFF] * 250 * 11))
+
+    channel_entries = LazyEntries(
+        'channel_entries_data',
+        ChannelEntry,
         count=250,
         fill=bytes([0xFF]))
 
     # XXX: 0x0ABE -> 10x UInt8 CString ("GMRS1")
     # XXX: this may be count=2 but second entry is empty in my memory dump
-    special_channel = mrc.BlockField(
-        ChannelEntry,
+    special_channel_data = mrc.Bytes(
         offset=0xABE,
+        length=2 * 11,
+        default=bytes([0xFF] * 2 * 11))
+
+    special_channel = LazyEntries(
+        'special_channel_data',
+        ChannelEntry,
         count=2,
         fill=bytes([0xFF]))
 
@@ -0,0 +1,495 @@
+import struct
+import typing as t
+
+from mrcrowbar import models as mrc
+from mrcrowbar import common
+
+from .layout import get_block_size, get_field_range
+
+
+# struct format characters of little endian number fields by signedness
+# and size, mrcrowbar uses no endianness for single byte fields
+NUMBER_FORMATS = {
+    ('unsigned', 1): 'B',
+    ('signed', 1): 'b',
+    ('unsigned', 2): 'H',
+    ('signed', 2): 'h',
+    ('unsigned', 4): 'I',
+    ('signed', 4): 'i',
+    ('unsigned', 8): 'Q',
+    ('signed', 8): 'q'}
+
+
+class _Fallback(Exception):
+    # raised while exporting values the compiled codec does not handle the
+    # same way as mrcrowbar, the generic export is used for those instead
+    pass
+
+
+class _Slot(t.NamedTuple):
+    offset: int
+    size: int
+    format: str
+
+
+class BlockCodec:
+    """
+    Compiled import and export of a statically sized mrc.Block.
+
+    All fields are packed into a single precomputed struct.Struct layout so
+    a block is parsed with one unpack and built with one pack. Bits fields
+    sharing a byte share one struct slot and are (de)compressed with lookup
+    tables instead of being parsed once per field. Nested blocks are handled
+    by the codec of their own class.
+
+    Results are the same as the mrcrowbar import_data() and export_data()
+    methods (see compare_codec()). Values the codec can not export exactly
+    like mrcrowbar, such as strings overflowing their element length, are
+    left to mrcrowbar which also reports validation errors.
+    """
+
+    def __init__(self, block_klass: t.Type[mrc.Block]):
+        self.block_klass = block_klass
+        self.size = get_block_size(block_klass)
+
+        self._slots: t.Dict[int, _Slot] = {}
+        self._decoders: t.List[t.Tuple[str, int, t.Callable]] = []
+        self._encoders: t.List[t.Tuple[str, int, t.Callable]] = []
+        self._unused_after: t.Dict[int, bool] = {}
+        self._const_checks: t.Dict[str, mrc.Const] = {
+            name: check
+            for check in block_klass._checks.values()
+            if isinstance(check, mrc.Const)
+            for name, field in block_klass._fields.items()
+            if field is check.field}
+
+        for name, field in block_klass._fields.items():
+            self._compile_field(name, field)
+
+        self._compile_struct()
+
+    # Compiling
+
+    def _add_slot(self, offset: int, size: int, format: str) -> int:
+        slot = self._slots.get(offset)
+        if slot is not None:
+            if slot != (offset, size, format):
+                raise RuntimeError(
+                    f"Overlapping fields at {hex(offset)} in "
+                    f"{self.block_klass.__name__}")
+
+        else:
+            self._slots[offset] = _Slot(offset, size, format)
+
+        return offset
+
+    def _compile_field(self, name: str, field: mrc.Field):
+        if isinstance(field, mrc.Bits):
+            self._compile_bits(name, field)
+
+        elif isinstance(field, mrc.NumberField):
+            self._compile_number(name, field)
+
+        elif isinstance(field, mrc.StringField):
+            self._compile_string(name, field)
+
+        elif isinstance(field, mrc.BlockField):
+            self._compile_block(name, field)
+
+        else:
+            raise RuntimeError(f"Unsupported field type: {field}")
+
+    def _compile_number(self, name: str, field: mrc.NumberField):
+        if field.count is not None or field.bitmask \
+                or (field.field_size > 1 and field.endian != 'little'):
+            raise RuntimeError(f"Unsupported number field: {field}")
+
+        slot = self._add_slot(
+            field.offset,
+            field.field_size,
+            NUMBER_FORMATS[(field.signedness, field.field_size)])
+
+        enum_values = {member.value: member for member in field.enum or []}
+        valid_range = field.range
+        format_range = field.format_range
+
+        def decode(value, block):
+            return enum_values.get(value, value)
+
+        def encode(value):
+            if enum_values:
+                if value not in enum_values:
+                    raise _Fallback()
+
+                value = enum_values[value].value
+
+            if type(value) is not int or value not in format_range:
+                raise _Fallback()
+
+            if valid_range is not None and value not in valid_range:
+                raise _Fallback()
+
+            return value
+
+        self._decoders.append((name, slot, decode))
+        self._encoders.append((name, slot, encode))
+
+    def _compile_bits(self, name: str, field: mrc.Bits):
+        if field.count is not None or field.field_size != 1:
+            raise RuntimeError(f"Unsupported bits field: {field}")
+
+        slot = self._add_slot(field.offset, 1, 'B')
+
+        # mrcrowbar compresses the masked bits into consecutive value bits
+        decode_table = [
+            sum(1 << i for i, bit in enumerate(field.bits) if byte & bit)
+            for byte in range(0x100)]
+
+        encode_table = [
+            sum(bit for i, bit in enumerate(field.bits) if value & (1 << i))
+            for value in field.check_range]
+
+        enum_values = {member.value: member for member in field.enum_t or []}
+
+        def decode(value, block):
+            value = decode_table[value]
+            return enum_values.get(value, value)
+
+        def encode(value):
+            if enum_values:
+                if value not in enum_values:
+                    raise _Fallback()
+
+                value = enum_values[value].value
+
+            if type(value) is not int or not 0 <= value < len(encode_table):
+                raise _Fallback()
+
+            return encode_table[value]
+
+        self._decoders.append((name, slot, decode))
+        self._encoders.append((name, slot, encode))
+
+    def _compile_string(self, name: str, field: mrc.StringField):
+        if field.count is not None or field.stream or field.transform \
+                or field.fill or field.length_field:
+            raise RuntimeError(f"Unsupported string field: {field}")
+
+        offset, size = get_field_range(field)
+        slot = self._add_slot(offset, size, f'{size}s')
+
+        element_end = field.element_end
+        zero_pad = field.zero_pad
+        encoding = field.encoding
+
+        def decode(value, block):
+            if element_end:
+                index = value.find(element_end)
+                if index >= 0:
+                    value = value[:index]
+
+            if zero_pad:
+                index = value.find(b'\x00')
+                if index >= 0:
+                    value = value[:index]
+
+            if encoding:
+                value = value.decode(encoding)
+
+            return value
+
+        def encode(value):
+            if encoding:
+                if not isinstance(value, str):
+                    raise _Fallback()
+
+                value = value.encode(encoding)
+
+            elif common.is_bytes(value):
+                value = bytes(value)
+
+            else:
+                raise _Fallback()
+
+            if element_end:
+                value += element_end
+
+                # a terminator written past the field by mrcrowbar does not
+                # change anything when it lands on unused zero bytes
+                if len(value) == size + len(element_end) \
+                        and not any(element_end) \
+                        and self._unused_after.get(offset):
+                    value = value[:size]
+
+            # shorter values are only zero padded by mrcrowbar with zero_pad
+            # and longer ones are written past the field
+            if len(value) > size or (len(value) < size and not zero_pad):
+                raise _Fallback()
+
+            return value
+
+        self._decoders.append((name, slot, decode))
+        self._encoders.append((name, slot, encode))
+
+    def _compile_block(self, name: str, field: mrc.BlockField):
+        if field.stream or field.block_kwargs:
+            raise RuntimeError(f"Unsupported block field: {field}")
+
+        offset, size = get_field_range(field)
+        slot = self._add_slot(offset, size, f'{size}s')
+
+        klass = field.block_klass
+        element_size = get_block_size(klass)
+        count = field.count
+        fill = field.fill
+        transform = field.transform
+
+        # mrcrowbar skips the fill length for empty entries so only entries
+        # with a fill of their own size stay aligned
+        if fill and count is not None and len(fill) != element_size:
+            raise RuntimeError(f"Unsupported block field fill: {field}")
+
+        def decode_element(data, block):
+            if fill and data.startswith(fill):
+                return None
+
+            if transform:
+                data = transform.import_data(data, parent=block).payload
+
+            return klass(source_data=data, parent=block)
+
+        def encode_element(element):
+            if element is None:
+                if not fill:
+                    raise _Fallback()
+
+                data = fill
+
+            else:
+                if not isinstance(element, klass):
+                    raise _Fallback()
+
+                data = element.export_data()
+                if transform:
+                    data = transform.export_data(data, parent=None).payload
+
+            if len(data) != element_size:
+                raise _Fallback()
+
+            return data
+
+        if count is None:
+            def decode(value, block):
+                return decode_element(value, block)
+
+            encode = encode_element
+
+        else:
+            def decode(value, block):
+                return [
+                    decode_element(value[i:i + element_size], block)
+                    for i in range(0, count * element_size, element_size)]
+
+            def encode(value):
+                if len(value) != count:
+                    raise _Fallback()
+
+                return b''.join([encode_element(element) for element in value])
+
+        self._decoders.append((name, slot, decode))
+        self._encoders.append((name, slot, encode))
+
+    def _compile_struct(self):
+        format = ['<']
+        position = 0
+
+        for offset in sorted(self._slots):
+            slot = self._slots[offset]
+            if offset < position:
+                raise RuntimeError(
+                    f"Overlapping fields at {hex(offset)} in "
+                    f"{self.block_klass.__name__}")
+
+            if offset > position:
+                format.append(f'{offset - position}x')
+
+            format.append(slot.format)
+            position = offset + slot.size
+
+        if position < self.size:
+            format.append(f'{self.size - position}x')
+
+        # slots followed by at least one byte not covered by any field
+        self._unused_after = {}
+        for offset, slot in self._slots.items():
+            end = slot.offset + slot.size
+            self._unused_after[offset] = end < self.size \
+                and end not in self._slots
+
+        self.struct = struct.Struct(''.join(format))
+
+        # struct values are in slot offset order
+        slot_index = {offset: i for i, offset in enumerate(sorted(self._slots))}
+        self._decoders = [
+            (name, slot_index[offset], decode)
+            for name, offset, decode in self._decoders]
+
+        self._encoders = [
+            (name, slot_index[offset], encode, self._slots[offset].format == 'B')
+            for name, offset, encode in self._encoders]
+
+        self._slot_defaults = [
+            0 if self._slots[offset].format in 'bBhHiIqQ' else b''
+            for offset in sorted(self._slots)]
+
+    # Import and export
+
+    def import_data(self, block: mrc.Block, buffer: bytes):
+        """
+        Import a buffer of at least `size` bytes into a block instance.
+        """
+
+        values = self.struct.unpack_from(buffer)
+        block._field_data = field_data = {
+            name: decode(values[index], block)
+            for name, index, decode in self._decoders}
+
+        for name, check in self._const_checks.items():
+            if field_data[name] != check.target:
+                # let mrcrowbar report the mismatch like it would
+                check.check_buffer(buffer, parent=block)
+
+    def export_data(self, block: mrc.Block) -> t.Optional[bytearray]:
+        """
+        Export a block instance or return None if its values need to be
+        exported by mrcrowbar.
+        """
+
+        field_data = block._field_data
+
+        # constant fields are always exported with their target value
+        for name, check in self._const_checks.items():
+            field_data[name] = check.target
+
+        values = list(self._slot_defaults)
+        try:
+            for name, index, encode, is_number in self._encoders:
+                value = encode(field_data[name])
+                if is_number:
+                    # bits fields sharing a byte are combined
+                    values[index] |= value
+
+                else:
+                    values[index] = value
+
+        except _Fallback:
+            return None
+
+        return bytearray(self.struct.pack(*values))
+
+
+_codecs: t.Dict[t.Type[mrc.Block], t.Optional[BlockCodec]] = {}
+
+
+def get_codec(block_klass: t.Type[mrc.Block]) -> t.Optional[BlockCodec]:
+    """
+    Retrieve the compiled codec of a block class, compiling it on first use.
+    Returns None for blocks that can not be compiled, for example because
+    their fields overlap.
+    """
+
+    if block_klass not in _codecs:
+        try:
+            _codecs[block_klass] = BlockCodec(block_klass)
+
+        except RuntimeError:
+            _codecs[block_klass] = None
+
+    return _codecs[block_klass]
+
+
+class CompiledBlock(mrc.Block):
+    """
+    Block that imports and exports through its compiled BlockCodec instead
+    of mrcrowbar's generic field by field parsing whenever possible.
+    """
+
+    def import_data(self, raw_buffer):
+        codec = get_codec(type(self))
+
+        # views and short buffers are handled by mrcrowbar like before
+        if codec is not None \
+                and isinstance(raw_buffer, (bytes, bytearray)) \
+                and len(raw_buffer) >= codec.size:
+            codec.import_data(self, raw_buffer)
+            return
+
+        return super().import_data(raw_buffer)
+
+    def export_data(self):
+        codec = get_codec(type(self))
+        data = codec.export_data(self) if codec is not None else None
+        if data is None:
+            return super().export_data()
+
+        return data
+
+
+def _field_values(value):
+    if isinstance(value, mrc.Block):
+        return {
+            name: _field_values(field_value)
+            for name, field_value in value._field_data.items()}
+
+    if isinstance(value, list):
+        return [_field_values(element) for element in value]
+
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+
+    return value
+
+
+def compare_codec(
+    block_klass: t.Type[mrc.Block],
+    data: bytes
+) -> t.List[str]:
+    """
+    Import and export data with both the compiled codec and mrcrowbar and
+    describe every difference between the results.
+
+    Nested blocks still use their own codec on both paths so compare their
+    classes separately to cover them.
+    """
+
+    codec = get_codec(block_klass)
+    if codec is None:
+        return [f"{block_klass.__name__}: no compiled codec"]
+
+    differences = []
+
+    compiled_block = block_klass()
+    codec.import_data(compiled_block, data)
+
+    generic_block = block_klass()
+    mrc.Block.import_data(generic_block, data)
+
+    compiled_values = _field_values(compiled_block)
+    generic_values = _field_values(generic_block)
+    for name in block_klass._fields:
+        if compiled_values[name] != generic_values[name]:
+            differences.append(f"{block_klass.__name__}.{name}: import differs")
+
+    # values the codec leaves to mrcrowbar do not need to be compared
+    compiled_data = codec.export_data(compiled_block)
+    if compiled_data is not None:
+        try:
+            generic_data = mrc.Block.export_data(generic_block)
+
+        except mrc.FieldValidationError as e:
+            generic_data = e
+
+        if compiled_data != generic_data:
+            differences.append(f"{block_klass.__name__}: export differs")
+
+    return differences
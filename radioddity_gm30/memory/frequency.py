@@ -1,8 +1,12 @@
 import enum
 import struct
+import typing as t
 
 from mrcrowbar import models as mrc
 
+from .codec import CompiledBlock
+from .lazy import LazyEntries, LazyEntriesBlock
+
 
 # 00003010: 0025 5043 ffff ffff 00ff ffff ff06 1100  .%PC............
 # VFO A: 435.02500, High, Wide, PTT Off, Busy Lock Off
@@ -30,77 +34,120 @@ from mrcrowbar import models as mrc
 # 46 25 50 00 | 46 75 50 00 | 00 ff ff ff ff | 06 | 11 00
 
 
+# frequency value used for the undefined (all 0xFF bytes) sentinel
+UNDEFINED_FREQUENCY = 0xFFFFFFFF
+UNDEFINED_FREQUENCY_DATA = bytes([0xFF] * 4)
+
+# each byte stores two BCD like digits, the upper nibble being the more
+# significant one, so lookup the two digit value of every possible byte and
+# the byte for every two digit value instead of converting digit by digit
+BCD_DECODE_TABLE = [((byte & 0xF0) >> 4) * 10 + (byte & 0x0F) for byte in range(0x100)]
+BCD_ENCODE_TABLE = [((value // 10) << 4) + (value % 10) for value in range(100)]
+
+# (receive, transmit) frequency pair at the start of every frequency entry
+FREQUENCY_PAIR = struct.Struct('<4s4s')
+
+
+def decode_frequency(data: bytes) -> int:
+    """
+    Decode 4x bytes storing 8x digits in little endian order into a
+    frequency value in Hz (the digits store it in 10 Hz steps).
+    """
+
+    data = bytes(data[:4])
+    if data == UNDEFINED_FREQUENCY_DATA:
+        return UNDEFINED_FREQUENCY
+
+    table = BCD_DECODE_TABLE
+    value = table[data[3]]
+    value = value * 100 + table[data[2]]
+    value = value * 100 + table[data[1]]
+    value = value * 100 + table[data[0]]
+    return value * 10
+
+
+def encode_frequency(value: int) -> bytes:
+    """
+    Encode a frequency value in Hz into 4x bytes storing 8x digits in little
+    endian order. Digits below 10 Hz are discarded.
+    """
+
+    if value == UNDEFINED_FREQUENCY:
+        return UNDEFINED_FREQUENCY_DATA
+
+    value //= 10
+    if not 0 <= value < 10 ** 8:
+        raise RuntimeError(f"Frequency value out of range: {value * 10}")
+
+    table = BCD_ENCODE_TABLE
+    return bytes([
+        table[value % 100],
+        table[value // 100 % 100],
+        table[value // 10000 % 100],
+        table[value // 1000000]])
+
+
+def decode_frequencies(
+    data: bytes,
+    offset: int = 0x10,
+    count: int = 2 + 249,
+    stride: int = 0x10
+) -> t.List[t.Tuple[int, int]]:
+    """
+    Decode the (receive, transmit) frequencies of `count` consecutive
+    frequency entries in one pass over a raw frequency memory buffer. By
+    default this covers both VFOs followed by all frequency entries.
+    """
+
+    view = memoryview(data)
+    return [
+        (decode_frequency(receive), decode_frequency(transmit))
+        for receive, transmit in (
+            FREQUENCY_PAIR.unpack_from(view, entry_offset)
+            for entry_offset in range(offset, offset + count * stride, stride))]
+
+
+def encode_frequencies(
+    data: bytearray,
+    frequencies: t.Sequence[t.Tuple[int, int]],
+    offset: int = 0x10,
+    stride: int = 0x10
+):
+    """
+    Encode (receive, transmit) frequencies into consecutive frequency
+    entries of a raw frequency memory buffer in place.
+    """
+
+    for index, (receive, transmit) in enumerate(frequencies):
+        FREQUENCY_PAIR.pack_into(
+            data, offset + index * stride,
+            encode_frequency(receive),
+            encode_frequency(transmit))
+
+
 class FrequencyTransform(mrc.Transform):
     def import_data(self, buffer, parent=None):
         # corner case: not enough input data
         assert len(buffer) >= 4
 
-        # extract relevant bytes
-        input_data = buffer[:4]
-
-        # corner case: undefined frequency
-        if set(input_data) == set([0xFF]):
-            return mrc.TransformResult(
-                payload=bytes([0xFF] * 4),
-                end_offset=4)
-
-        # decode individual digits in little endian order
-        digits = []
-        for byte in reversed(input_data):
-            digits.extend([
-                (byte & 0xF0) >> 4,
-                (byte & 0x0F) >> 0])
-
-        if len(digits) != 8:
-            raise RuntimeError("Failed to parse frequency value")
-
-        # convert digits to frequency value
-        value = sum([
-            v * pow(10, 2 + 3 + 3 - i)
-            for i, v in enumerate(digits)])
-
         # encode frequency as little endian 32-bit unsigned integer (Hz)
         return mrc.TransformResult(
-            payload=struct.pack('<L', value),
+            payload=struct.pack('<L', decode_frequency(buffer)),
             end_offset=4)
 
     def export_data(self, buffer, parent=None):
         # corner case: not enough input data
         assert len(buffer) >= 4
 
-        # retrieve input data
-        input_data = buffer[:4]
-
-        # corner case: undefined frequency
-        if set(input_data) == set([0xFF]):
-            return mrc.TransformResult(
-                payload=bytes([0xFF] * 4),
-                end_offset=4)
-
         # decode frequency as little endian 32-bit unsigned integer (Hz)
-        value = struct.unpack('<L', input_data)[0]
-
-        # extract digits from numeric value
-        digits = []
-        counter = value
-        while counter > 0:
-            digit = int(counter % 10)
-            digits.append(digit)
-            counter = int(counter // 10)
-
-        digits = digits[-8:]  # value in Hz but we want MHz, discard zeroes
+        value = struct.unpack('<L', buffer[:4])[0]
 
-        # pack digits into bytes
-        output = bytearray()
-        pairwise_iterator = zip(*([iter(digits)] * 2), strict=True)
-        for upper_digit, lower_digit in pairwise_iterator:
-            output.append(
-                ((lower_digit & 0x0F) << 4) + (upper_digit & 0x0F))
-
-        return mrc.TransformResult(payload=bytes(output), end_offset=4)
+        return mrc.TransformResult(
+            payload=encode_frequency(value),
+            end_offset=4)
 
 
-class Frequency(mrc.Block):
+class Frequency(CompiledBlock):
     # actually 4x bytes that store 2x digits each in BCD like format but this
     # is always used with the FrequencyTransform above to convert that value
     # to a more useful double field
@@ -153,7 +200,7 @@ class Scan(int, enum.Enum):
     YES = 1
 
 
-class FrequencyEntry(mrc.Block):
+class FrequencyEntry(CompiledBlock):
     receive_frequency = mrc.BlockField(
         Frequency,
         offset=0x0,
@@ -238,7 +285,14 @@ class FrequencyEntry(mrc.Block):
         default=bytes([0x00]))
 
 
-class FrequencyMemory(mrc.Block):
+# XXX: we really should only consider the frequency value bytes here
+# XXX: also the VFOs will never be unset
+FREQUENCY_ENTRY_FILL = bytes([
+    0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
+    0x00, 0xFF, 0xFF, 0xFF, 0xFF, 0x06, 0x11, 0x00])
+
+
+class FrequencyMemory(LazyEntriesBlock):
     # XXX: [0xFF, 0xFF] stock but often [0xFA, 0x00] after CPS write
     unknown_frequency_data1 = mrc.Bytes(
         offset=0x00,
@@ -271,42 +325,60 @@ class FrequencyMemory(mrc.Block):
         length=0xA,
         default=bytes([0x00] * 0xA))
 
-    vfo_a = mrc.BlockField(
-        FrequencyEntry,
+    # entries are decoded on first access, see LazyEntries
+    vfo_a_data = mrc.Bytes(
         offset=0x10,
-        # XXX: we really should only consider the frequency value bytes here
-        # XXX: also this will never be unset
-        fill=bytes([
-            0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
-            0x00, 0xFF, 0xFF, 0xFF, 0xFF, 0x06, 0x11, 0x00]))
+        length=0x10,
+        default=FREQUENCY_ENTRY_FILL)
 
-    vfo_b = mrc.BlockField(
+    vfo_a = LazyEntries(
+        'vfo_a_data',
         FrequencyEntry,
+        fill=FREQUENCY_ENTRY_FILL)
+
+    vfo_b_data = mrc.Bytes(
         offset=0x20,
-        # XXX: we really should only consider the frequency value bytes here
-        # XXX: also this will never be unset
-        fill=bytes([
-            0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
-            0x00, 0xFF, 0xFF, 0xFF, 0xFF, 0x06, 0x11, 0x00]))
+        length=0x10,
+        default=FREQUENCY_ENTRY_FILL)
 
-    frequency_entries = mrc.BlockField(
+    vfo_b = LazyEntries(
+        'vfo_b_data',
         FrequencyEntry,
+        fill=FREQUENCY_ENTRY_FILL)
+
+    frequency_entries_data = mrc.Bytes(
         offset=0x30,
+        length=249 * 0x10,
+        default=FREQUENCY_ENTRY_FILL * 249)
+
+    frequency_entries = LazyEntries(
+        'frequency_entries_data',
+        FrequencyEntry,
         count=249,
-        # XXX: we really should only consider the frequency value bytes here
-        fill=bytes([
-            0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF,
-            0x00, 0xFF, 0xFF, 0xFF, 0xFF, 0x06, 0x11, 0x00]))
-
-    # XXX: this is required otherwise memory.size() will return 0x30 because
-    # the frequency_entries field above is variable length and I guess by
-    # default the block uses the minimum array size when computing the length
+        fill=FREQUENCY_ENTRY_FILL)
+
     # XXX: content seems to vary based on what was written here before
     trailing_space_frequency = mrc.Bytes(
         offset=0xFC0,
         length=0x20,
         default=bytes([0x00] * 0x20))
 
+    def get_frequencies(self) -> t.List[t.Tuple[int, int]]:
+        """
+        Decode the (receive, transmit) frequencies of both VFOs followed by
+        all frequency entries in one pass over their raw data without
+        decoding the entries, e.g. to audit many configs. Undefined
+        frequencies are UNDEFINED_FREQUENCY.
+        """
+
+        self.sync_lazy_entries()
+        data = b''.join([
+            self.vfo_a_data,
+            self.vfo_b_data,
+            self.frequency_entries_data])
+
+        return decode_frequencies(data, offset=0)
+
     def hexdump(self, *args, **kwargs):
         # only show the non-empty part of the block
         kwargs['length'] = self.get_size() - len(self.trailing_space_frequency)
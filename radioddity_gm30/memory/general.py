@@ -2,6 +2,8 @@ import enum
 
 from mrcrowbar import models as mrc
 
+from .tracking import TrackedBlock
+
 
 class BootscreenMode(int, enum.Enum):
     LOGO = 0
@@ -93,7 +95,7 @@ class ChannelDisplay(int, enum.Enum):
     FREQUENCY_NUMBER = 1
 
 
-class GeneralMemory(mrc.Block):
+class GeneralMemory(TrackedBlock):
     bootscreen_mode = mrc.UInt8(
         offset=0x00,
         default=BootscreenMode.LOGO,
@@ -131,7 +133,7 @@ class GeneralMemory(mrc.Block):
 
     @transmit_timeout_seconds.setter
     def transmit_timeout_seconds(self, value):
-        self.transmit_timeout = value / 15
+        self.transmit_timeout = round(value / 15)
 
     squelch_level = mrc.UInt8(
         offset=0x41,
@@ -241,7 +243,7 @@ class GeneralMemory(mrc.Block):
 
     @repeat_tail_revert_seconds.setter
     def repeat_tail_revert_seconds(self, value):
-        self.repeat_tail_revert = value / 0.100
+        self.repeat_tail_revert = round(value / 0.100)
 
     repeat_tail_delay = mrc.UInt8(
         offset=0x48,
@@ -254,7 +256,7 @@ class GeneralMemory(mrc.Block):
 
     @repeat_tail_delay_seconds.setter
     def repeat_tail_delay_seconds(self, value):
-        self.repeat_tail_delay = value / 0.100
+        self.repeat_tail_delay = round(value / 0.100)
 
     tone_burst = mrc.UInt8(
         offset=0x49,
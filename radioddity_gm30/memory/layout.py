@@ -0,0 +1,138 @@
+import functools
+import typing as t
+
+from mrcrowbar import models as mrc
+
+
+# fields with this prefix cover space after the modeled data in a segment
+# whose content seems to vary based on what was written there before
+TRAILING_SPACE_PREFIX = 'trailing_space_'
+
+
+def get_field_range(field: mrc.Field) -> t.Tuple[int, int]:
+    """
+    Determine the (offset, size) of a statically sized block field without
+    needing an instance of the block.
+    """
+
+    count = field.count or 1
+
+    if isinstance(field, mrc.BlockField):
+        element_size = get_block_size(field.block_klass)
+
+    elif isinstance(field, mrc.NumberField):
+        element_size = field.field_size
+
+    elif isinstance(field, mrc.StringField):
+        element_size = field.length or field.element_length
+
+    else:
+        element_size = None
+
+    if not isinstance(field.offset, int) or not element_size:
+        raise RuntimeError(f"Field is not statically sized: {field}")
+
+    return field.offset, element_size * count
+
+
+def get_block_size(block_klass: t.Type[mrc.Block]) -> int:
+    return max(
+        sum(get_field_range(field))
+        for field in block_klass._fields.values())
+
+
+def get_modeled_ranges(
+    block_klass: t.Type[mrc.Block],
+    merge_gap: int = 0x40
+) -> t.List[t.Tuple[int, int]]:
+    """
+    Determine the (offset, size) byte ranges of a memory block that are
+    covered by modeled fields, skipping trailing space. Ranges separated by
+    no more than `merge_gap` bytes are merged to keep the number of
+    transfers low.
+    """
+
+    return merge_ranges(
+        [
+            get_field_range(field)
+            for name, field in block_klass._fields.items()
+            if not name.startswith(TRAILING_SPACE_PREFIX)],
+        merge_gap=merge_gap)
+
+
+@functools.lru_cache(maxsize=None)
+def get_modeled_mask(block_klass: t.Type[mrc.Block]) -> bytes:
+    """
+    Determine the bits of each byte of a statically sized block that are
+    covered by modeled fields. Bits fields only cover the bits of their
+    mask, all other fields every bit of their bytes.
+    """
+
+    mask = bytearray(get_block_size(block_klass))
+    for field in block_klass._fields.values():
+        offset, size = get_field_range(field)
+        bitmask = getattr(field, 'bitmask', None)
+        for index in range(size):
+            mask[offset + index] |= \
+                bitmask[index % len(bitmask)] if bitmask else 0xFF
+
+    return bytes(mask)
+
+
+def merge_ranges(
+    ranges: t.Iterable[t.Tuple[int, int]],
+    merge_gap: int = 0
+) -> t.List[t.Tuple[int, int]]:
+    """
+    Sort (offset, size) ranges and merge overlapping ones as well as those
+    separated by no more than `merge_gap` bytes.
+    """
+
+    merged: t.List[t.Tuple[int, int]] = []
+    for offset, size in sorted(ranges):
+        if merged:
+            last_offset, last_size = merged[-1]
+            if offset <= last_offset + last_size + merge_gap:
+                end = max(last_offset + last_size, offset + size)
+                merged[-1] = (last_offset, end - last_offset)
+                continue
+
+        merged.append((offset, size))
+
+    return merged
+
+
+def _is_raw_bytes_field(field: mrc.Field) -> bool:
+    # byte fields without decoding only slice the buffer and can keep
+    # referencing it instead of a copy
+    return type(field) is mrc.Bytes \
+        and not field.encoding \
+        and not field.zero_pad \
+        and not field.element_end \
+        and not field.transform \
+        and not field.fill
+
+
+def import_view(block: mrc.Block, view: memoryview):
+    """
+    Import a statically sized block from a memoryview without copying it.
+
+    Raw byte fields keep referencing the view so changes to them are shared
+    with the underlying buffer. Other fields are decoded from a copy of the
+    bytes up to their end since mrcrowbar can not decode them from a view.
+    """
+
+    klass = type(block)
+    block._field_data = {}
+
+    for name, field in klass._fields.items():
+        if _is_raw_bytes_field(field):
+            buffer = view
+
+        else:
+            buffer = bytes(view[:sum(get_field_range(field))])
+
+        block._field_data[name] = field.get_from_buffer(buffer, parent=block)
+
+    for check in klass._checks.values():
+        check.check_buffer(view, parent=block)
@@ -0,0 +1,266 @@
+import typing as t
+
+from mrcrowbar import models as mrc
+
+from .layout import get_block_size, get_field_range, get_modeled_mask
+from .tracking import TrackedBlock
+
+
+class LazyEntryList(t.Sequence):
+    """
+    Fixed size list of block entries decoded from a raw buffer on first
+    access.
+
+    Entries that start with the fill pattern are empty and read as None like
+    they do with a mrc.BlockField. Entries that were never accessed export
+    their original bytes. Decoded entries are only exported if their
+    encoding differs from that of the bytes they replace and then only
+    overwrite the modeled bits of the bytes that differ, so unmodeled bytes
+    and bits (e.g. next to Bits fields) are kept and entries that were only
+    read do not change anything.
+    """
+
+    def __init__(
+        self,
+        block_klass: t.Type[mrc.Block],
+        data: t.Union[bytes, memoryview],
+        count: int,
+        fill: t.Optional[bytes] = None
+    ):
+        self.block_klass = block_klass
+        self.stride = get_block_size(block_klass)
+        self.count = count
+        self.fill = fill
+
+        if len(data) != self.stride * count:
+            raise RuntimeError(
+                f"Unexpected entry data length for {block_klass.__name__}")
+
+        # views are kept as is to share the buffer they reference
+        self._data = data
+        self._entries: t.Dict[int, t.Optional[mrc.Block]] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _index(self, index: int) -> int:
+        if index < 0:
+            index += self.count
+
+        if not 0 <= index < self.count:
+            raise IndexError("Entry index out of range")
+
+        return index
+
+    def _raw(self, index: int) -> bytes:
+        offset = index * self.stride
+        return bytes(self._data[offset:offset + self.stride])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.count))]
+
+        index = self._index(index)
+        if index not in self._entries:
+            raw = self._raw(index)
+            if self.fill and raw.startswith(self.fill):
+                self._entries[index] = None
+
+            else:
+                self._entries[index] = self.block_klass(source_data=raw)
+
+        return self._entries[index]
+
+    def __setitem__(self, index: int, entry: t.Optional[mrc.Block]):
+        if entry is not None and not isinstance(entry, self.block_klass):
+            raise TypeError(
+                f"Expecting block class {self.block_klass.__name__}, "
+                f"not {type(entry).__name__}")
+
+        self._entries[self._index(index)] = entry
+
+    def is_decoded(self, index: int) -> bool:
+        return self._index(index) in self._entries
+
+    def export_data(self) -> bytes:
+        data = bytearray(self._data)
+        self.export_into(data)
+        return bytes(data)
+
+    def export_into(self, data: t.Union[bytearray, memoryview]):
+        """
+        Write decoded entries into a writable buffer holding raw entry data
+        in place, e.g. the original data or data the entries were last
+        written to.
+        """
+
+        mask = get_modeled_mask(self.block_klass)
+
+        for index, entry in self._entries.items():
+            offset = index * self.stride
+            current = bytes(data[offset:offset + self.stride])
+            is_empty = bool(self.fill) and current.startswith(self.fill)
+
+            if entry is None:
+                if not self.fill:
+                    raise RuntimeError(
+                        "A fill pattern is required for empty entries")
+
+                if not is_empty:
+                    repeats = -(-self.stride // len(self.fill))
+                    data[offset:offset + self.stride] = \
+                        (self.fill * repeats)[:self.stride]
+
+                continue
+
+            # compare with the encoding of the current bytes instead of the
+            # bytes themselves since decoding drops unmodeled bits
+            entry_data = entry.export_data()
+            current_data = None if is_empty \
+                else self.block_klass(source_data=current).export_data()
+
+            if entry_data == current_data:
+                continue
+
+            for position, bits in enumerate(mask):
+                value = entry_data[position]
+                if not bits or current_data is not None and value == current_data[position]:
+                    continue
+
+                data[offset + position] = (current[position] & ~bits) | (value & bits)
+
+
+class LazyEntries:
+    """
+    Block attribute exposing a LazyEntryList over a raw mrc.Bytes field of
+    the same block. Without a count the attribute is a single entry instead
+    of a list. Blocks using it must derive from LazyEntriesBlock.
+    """
+
+    def __init__(
+        self,
+        data_field: str,
+        block_klass: t.Type[mrc.Block],
+        count: t.Optional[int] = None,
+        fill: t.Optional[bytes] = None
+    ):
+        self.data_field = data_field
+        self.block_klass = block_klass
+        self.count = count
+        self.fill = fill
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        self.cache_name = f'_lazy_{name}'
+
+    def get_list(self, instance: mrc.Block) -> LazyEntryList:
+        data = getattr(instance, self.data_field)
+
+        # rebuild the list when the raw field was replaced
+        entries = instance.__dict__.get(self.cache_name)
+        if entries is None or entries._data is not data:
+            entries = LazyEntryList(
+                self.block_klass,
+                data,
+                self.count or 1,
+                self.fill)
+
+            instance.__dict__[self.cache_name] = entries
+
+        return entries
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        entries = self.get_list(instance)
+        return entries if self.count is not None else entries[0]
+
+    def __set__(self, instance, value):
+        entries = self.get_list(instance)
+        if self.count is None:
+            entries[0] = value
+            return
+
+        if len(value) != self.count:
+            raise RuntimeError(f"Expecting {self.count} entries for {self.name}")
+
+        for index, entry in enumerate(value):
+            entries[index] = entry
+
+    def sync(self, instance: mrc.Block):
+        # write decoded entries back to the raw field
+        entries = instance.__dict__.get(self.cache_name)
+        if entries is None:
+            return
+
+        data = entries._data
+        if isinstance(data, memoryview) and not data.readonly:
+            # update shared buffers in place
+            entries.export_into(data)
+            return
+
+        # bypass change tracking, changed entries are found by comparing
+        # them with the clean data instead
+        data = entries.export_data()
+        instance._field_data[self.data_field] = data
+        entries._data = data
+
+    def reset(self, instance: mrc.Block):
+        instance.__dict__.pop(self.cache_name, None)
+
+
+class LazyEntriesBlock(TrackedBlock):
+    """
+    Block with LazyEntries attributes that are kept in sync with their raw
+    fields on import and export.
+    """
+
+    @classmethod
+    def _lazy_entries(cls) -> t.List[LazyEntries]:
+        return [
+            value for klass in cls.__mro__
+            for value in vars(klass).values()
+            if isinstance(value, LazyEntries)]
+
+    def import_data(self, *args, **kwargs):
+        for lazy_entries in self._lazy_entries():
+            lazy_entries.reset(self)
+
+        return super().import_data(*args, **kwargs)
+
+    def _patch_nested(
+        self,
+        buffer: bytearray,
+        clean_data: bytes,
+        dirty_fields: t.FrozenSet[str]
+    ) -> t.List[t.Tuple[int, int]]:
+        ranges = super()._patch_nested(buffer, clean_data, dirty_fields)
+
+        for lazy_entries in self._lazy_entries():
+            entries = self.__dict__.get(lazy_entries.cache_name)
+            if entries is None or lazy_entries.data_field in dirty_fields:
+                continue
+
+            offset, size = get_field_range(self._fields[lazy_entries.data_field])
+            entries.export_into(memoryview(buffer)[offset:offset + size])
+
+            for index in entries._entries:
+                start = offset + index * entries.stride
+                end = start + entries.stride
+                if buffer[start:end] != clean_data[start:end]:
+                    ranges.append((start, entries.stride))
+
+        return ranges
+
+    def sync_lazy_entries(self):
+        """
+        Write decoded entries back to their raw fields.
+        """
+
+        for lazy_entries in self._lazy_entries():
+            lazy_entries.sync(self)
+
+    def export_data(self):
+        self.sync_lazy_entries()
+        return super().export_data()
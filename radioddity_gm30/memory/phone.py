@@ -2,8 +2,11 @@ import enum
 
 from mrcrowbar import models as mrc
 
+from .codec import CompiledBlock
+from .tracking import TrackedBlock
 
-class DtmfCode(mrc.Block):
+
+class DtmfCode(CompiledBlock):
     # XXX: 0x01 - 0x0D bytes for [0-9A-D] digits, 0xFF right padded to length
     value = mrc.Bytes(
         offset=0x0,
@@ -21,7 +24,7 @@ class PttPressSend(int, enum.Enum):
     ON = 1
 
 
-class PhoneMemory(mrc.Block):
+class PhoneMemory(TrackedBlock):
     dtmf_codes = mrc.BlockField(
         DtmfCode,
         offset=0x00,
@@ -64,7 +67,7 @@ class PhoneMemory(mrc.Block):
 
     @dtmf_delay_time_seconds.setter
     def dtmf_delay_time_seconds(self, value):
-        self.dtmf_delay_time = ((value - 0.1) / 0.05)
+        self.dtmf_delay_time = round((value - 0.1) / 0.05)
 
     dtmf_digit_duration = mrc.UInt8(
         offset=0x62,
@@ -77,7 +80,7 @@ class PhoneMemory(mrc.Block):
 
     @dtmf_digit_duration_seconds.setter
     def dtmf_digit_duration_seconds(self, value):
-        self.dtmf_digit_duration = ((value - 0.08) / 0.01)
+        self.dtmf_digit_duration = round((value - 0.08) / 0.01)
 
     dtmf_interval_duration = mrc.UInt8(
         offset=0x63,
@@ -90,7 +93,7 @@ class PhoneMemory(mrc.Block):
 
     @dtmf_interval_duration_seconds.setter
     def dtmf_interval_duration_seconds(self, value):
-        self.dtmf_interval_duration = ((value - 0.08) / 0.01)
+        self.dtmf_interval_duration = round((value - 0.08) / 0.01)
 
     # XXX: content seems to vary based on what was written here before
     trailing_space_phone = mrc.Bytes(
@@ -0,0 +1,135 @@
+import typing as t
+
+from mrcrowbar import models as mrc
+
+from .codec import CompiledBlock
+from .layout import get_block_size, get_field_range, merge_ranges
+
+
+class TrackedBlock(CompiledBlock):
+    """
+    Block that records which fields were assigned since it was last in
+    sync with each of its storage targets (see mark_clean()) so only the
+    changed byte ranges need to be exported and written.
+
+    The config file and the radio memory are tracked separately (see
+    STORAGE_TARGETS), saving a config file does not make the radio memory
+    clean. Importing data marks the block as clean for all targets.
+    Changes inside nested blocks are found by comparing their encoded bytes
+    with the clean data since they do not go through a field assignment of
+    this block.
+    """
+
+    STORAGE_TARGETS = ('file', 'radio')
+
+    # data each storage target was last imported from or exported to and
+    # the fields assigned since, missing when the target contents are
+    # unknown. Both are replaced instead of changed in place.
+    _clean_data: t.Mapping[str, bytes] = {}
+    _dirty_fields: t.Mapping[str, t.FrozenSet[str]] = {}
+
+    def __setattr__(self, key, value):
+        if key in self._fields and self._field_data.get(key) != value:
+            self._dirty_fields = {
+                target: dirty_fields | {key}
+                for target, dirty_fields in self._dirty_fields.items()}
+
+        super().__setattr__(key, value)
+
+    def import_data(self, raw_buffer):
+        super().import_data(raw_buffer)
+        self.mark_clean(raw_buffer)
+
+    def mark_clean(self, data: t.Optional[bytes], target: t.Optional[str] = None):
+        """
+        Record that the storage `target` (all targets if None) of this block
+        now holds `data` which has to match the current field values.
+        """
+
+        # copy views as well, the buffer they reference changes with the
+        # block once entries or fields are written back to it
+        if data is not None and not isinstance(data, bytes):
+            data = bytes(data)
+
+        targets = self.STORAGE_TARGETS if target is None else (target,)
+
+        clean_data = dict(self._clean_data)
+        dirty_fields = dict(self._dirty_fields)
+        for target in targets:
+            if data is None:
+                clean_data.pop(target, None)
+                dirty_fields.pop(target, None)
+
+            else:
+                clean_data[target] = data
+                dirty_fields[target] = frozenset()
+
+        self._clean_data = clean_data
+        self._dirty_fields = dirty_fields
+
+    def get_clean_data(self, target: str) -> t.Optional[bytes]:
+        return self._clean_data.get(target)
+
+    def _patch_nested(
+        self,
+        buffer: bytearray,
+        clean_data: bytes,
+        dirty_fields: t.FrozenSet[str]
+    ) -> t.List[t.Tuple[int, int]]:
+        # encode nested blocks into the buffer and return the ranges of the
+        # ones that changed
+        ranges = []
+        for name, field in self._fields.items():
+            if name in dirty_fields \
+                    or not isinstance(field, mrc.BlockField):
+                continue
+
+            offset, size = get_field_range(field)
+            field.update_buffer_with_value(
+                self._field_data[name], buffer, parent=self)
+
+            if buffer[offset:offset + size] != clean_data[offset:offset + size]:
+                ranges.append((offset, size))
+
+        return ranges
+
+    def export_patch(self, target: str) -> t.Tuple[bytes, t.List[t.Tuple[int, int]]]:
+        """
+        Export the block by patching only the fields changed since the
+        storage `target` was clean into its clean data. Returns the data and
+        the (offset, size) ranges that differ from the clean data. Without
+        clean data the whole block is exported and reported as changed.
+        """
+
+        clean_data = self._clean_data.get(target)
+        if clean_data is None:
+            data = bytes(self.export_data())
+            return data, [(0, len(data))]
+
+        size = get_block_size(type(self))
+        clean_data = clean_data[:size]
+        buffer = bytearray(clean_data)
+
+        dirty_fields = self._dirty_fields[target]
+
+        ranges = []
+        for name in dirty_fields:
+            field = self._fields[name]
+            self.scrub_field(name)
+            self.validate_field(name)
+            field.update_buffer_with_value(
+                self._field_data[name], buffer, parent=self)
+
+            ranges.append(get_field_range(field))
+
+        ranges += self._patch_nested(buffer, clean_data, dirty_fields)
+
+        return bytes(buffer), merge_ranges(ranges)
+
+    def get_dirty_ranges(self, target: str) -> t.List[t.Tuple[int, int]]:
+        """
+        Determine the (offset, size) ranges changed since the block was
+        last marked clean for the storage `target`.
+        """
+
+        return self.export_patch(target)[1]
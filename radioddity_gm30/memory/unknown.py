@@ -1,7 +1,9 @@
 from mrcrowbar import models as mrc
 
+from .tracking import TrackedBlock
 
-class UnknownMemory(mrc.Block):
+
+class UnknownMemory(TrackedBlock):
     # XXX educated guess this is calibration data of some sort because when
     # overwriting with garbage the radio becomes erratic and unresponsive
     # showing impossible frequencies on the VFOs and battery levels
@@ -0,0 +1,169 @@
+import json
+import time
+import bisect
+import functools
+import threading
+import typing as t
+
+
+class CommandMetrics:
+    """
+    Counters and latency histogram of a single protocol command.
+    """
+
+    def __init__(self, buckets: t.Sequence[float]):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+        # observations per bucket, the last one counts everything slower
+        # than the largest bucket
+        self.bucket_counts = [0] * (len(buckets) + 1)
+
+    def as_dict(self, buckets: t.Sequence[float]) -> t.Dict[str, t.Any]:
+        # cumulative counts like Prometheus histograms
+        cumulative = 0
+        histogram = {}
+        for bucket, count in zip([*map(str, buckets), '+Inf'], self.bucket_counts):
+            cumulative += count
+            histogram[bucket] = cumulative
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'histogram': histogram}
+
+
+class ProtocolMetrics:
+    """
+    Per-command call counts, transferred bytes, errors, retries and latency
+    histograms collected by a Protocol (see `Protocol.metrics`).
+
+    One instance may be shared by several protocols on different threads.
+    Results are exported with to_json() or to_prometheus().
+    """
+
+    # histogram bucket upper bounds in seconds
+    DEFAULT_BUCKETS = (
+        0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+        0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    PROMETHEUS_PREFIX = 'gm30_protocol'
+
+    def __init__(self, buckets: t.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.commands: t.Dict[str, CommandMetrics] = {}
+        self._lock = threading.Lock()
+
+    def _get_command(self, command: str) -> CommandMetrics:
+        metrics = self.commands.get(command)
+        if metrics is None:
+            metrics = self.commands[command] = CommandMetrics(self.buckets)
+
+        return metrics
+
+    def record(
+        self,
+        command: str,
+        seconds: float,
+        size: int = 0,
+        error: bool = False
+    ):
+        with self._lock:
+            metrics = self._get_command(command)
+            metrics.count += 1
+            metrics.errors += int(error)
+            metrics.bytes += size
+            metrics.seconds += seconds
+            metrics.bucket_counts[bisect.bisect_left(self.buckets, seconds)] += 1
+
+    def record_retry(self, command: str):
+        with self._lock:
+            self._get_command(command).retries += 1
+
+    def as_dict(self) -> t.Dict[str, t.Dict[str, t.Any]]:
+        with self._lock:
+            return {
+                command: metrics.as_dict(self.buckets)
+                for command, metrics in sorted(self.commands.items())}
+
+    def to_json(self) -> str:
+        return json.dumps({'commands': self.as_dict()}, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Format the metrics in the Prometheus text exposition format.
+        """
+
+        prefix = self.PROMETHEUS_PREFIX
+        commands = self.as_dict()
+
+        lines = []
+        for name, key, help_text in (
+                ('calls_total', 'count', "Protocol command calls"),
+                ('errors_total', 'errors', "Protocol command calls that raised"),
+                ('retries_total', 'retries', "Protocol command retries"),
+                ('bytes_total', 'bytes', "Bytes transferred by protocol commands")):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for command, metrics in commands.items():
+                lines.append(
+                    f'{prefix}_{name}{{command="{command}"}} {metrics[key]}')
+
+        name = f'{prefix}_duration_seconds'
+        lines.append(f"# HELP {name} Protocol command latency")
+        lines.append(f"# TYPE {name} histogram")
+        for command, metrics in commands.items():
+            for bucket, count in metrics['histogram'].items():
+                lines.append(
+                    f'{name}_bucket{{command="{command}",le="{bucket}"}} {count}')
+
+            lines.append(f'{name}_sum{{command="{command}"}} {metrics["seconds"]}')
+            lines.append(f'{name}_count{{command="{command}"}} {metrics["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def measured(
+    command: str,
+    get_size: t.Optional[t.Callable[[t.Tuple, t.Any], int]] = None
+):
+    """
+    Decorate a protocol step generator (see ProtocolCore) to record its
+    calls in the `metrics` of its instance. `get_size` receives the call
+    arguments and result and returns the number of bytes transferred. The
+    time is taken from the first to the last step so it covers the I/O of
+    either driver. Calls are passed through untouched when metrics are
+    disabled.
+    """
+
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None:
+                return (yield from method(self, *args, **kwargs))
+
+            start = time.perf_counter()
+            try:
+                result = yield from method(self, *args, **kwargs)
+
+            except Exception:
+                metrics.record(command, time.perf_counter() - start, error=True)
+                raise
+
+            metrics.record(
+                command,
+                time.perf_counter() - start,
+                get_size(args, result) if get_size else 0)
+
+            return result
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,111 @@
+import time
+import threading
+import contextlib
+import typing as t
+
+
+class PhaseTimer:
+    """
+    Collects the time spent in named phases of a command.
+
+    Phases nest, a phase started inside another one is recorded under the
+    path of both names (e.g. `read_radio/read_segment:general`). Repeated
+    phases are summed up. Phases of several threads are recorded together
+    but nest per thread.
+    """
+
+    def __init__(self):
+        # phase path -> [calls, seconds], in the order phases were started
+        self.phases: t.Dict[t.Tuple[str, ...], t.List] = {}
+        self.start_time = time.perf_counter()
+        self.end_time: t.Optional[float] = None
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(name)
+        path = tuple(stack)
+
+        with self._lock:
+            self.phases.setdefault(path, [0, 0.0])
+
+        start = time.perf_counter()
+        try:
+            yield
+
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+
+            with self._lock:
+                self.phases[path][0] += 1
+                self.phases[path][1] += elapsed
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    def get_total(self) -> float:
+        end_time = self.end_time if self.end_time is not None \
+            else time.perf_counter()
+
+        return end_time - self.start_time
+
+    def format_table(self) -> str:
+        total = self.get_total()
+
+        lines = [
+            f"{'Phase':<48} {'Calls':>6} {'Total':>10} {'Mean':>10} {'%':>6}",
+            '-' * 84]
+
+        with self._lock:
+            phases = list(self.phases.items())
+
+        for path, (calls, seconds) in phases:
+            name = '  ' * (len(path) - 1) + path[-1]
+            mean = seconds / calls if calls else 0.0
+            share = 100 * seconds / total if total else 0.0
+            lines.append(
+                f"{name:<48} {calls:>6} {seconds:>9.3f}s {mean:>9.4f}s "
+                f"{share:>5.1f}%")
+
+        lines.append('-' * 84)
+        lines.append(f"{'total':<48} {'':>6} {total:>9.3f}s")
+        return '\n'.join(lines)
+
+
+# timer recording phases, see profile_phases()
+_active_timer: t.Optional[PhaseTimer] = None
+_null_phase = contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def profile_phases(timer: PhaseTimer):
+    """
+    Record the phases of everything run within the context with `timer`.
+    """
+
+    global _active_timer
+
+    previous_timer = _active_timer
+    _active_timer = timer
+    try:
+        yield timer
+
+    finally:
+        timer.stop()
+        _active_timer = previous_timer
+
+
+def phase(name: str) -> t.ContextManager:
+    """
+    Time the code run within the context as a phase of the active timer.
+    Does nothing unless phases are being recorded (see profile_phases()).
+    """
+
+    if _active_timer is None:
+        return _null_phase
+
+    return _active_timer.phase(name)
@@ -0,0 +1,148 @@
+import sys
+import time
+import typing as t
+
+
+class TransferProgress(t.NamedTuple):
+    """
+    Progress of a memory transfer reported after each chunk.
+    """
+
+    bytes_done: int
+    bytes_total: int
+    address: int                      # address of the chunk just transferred
+    bytes_per_second: float           # rate of the chunk just transferred
+    average_bytes_per_second: float   # rate since the transfer started
+    eta: t.Optional[float]            # estimated seconds remaining
+
+
+ProgressCallback = t.Callable[[TransferProgress], None]
+
+
+class ProgressTracker:
+    """
+    Turn chunk completions of a transfer into TransferProgress reports.
+
+    Transfer methods take a callback or a tracker. A tracker can be passed
+    to several of them to report one transfer across all of them, e.g. all
+    memory segments written by RadioConfig.write_radio().
+    """
+
+    def __init__(self, bytes_total: int, callback: ProgressCallback):
+        self.bytes_total = bytes_total
+        self.bytes_done = 0
+        self.callback = callback
+
+        self.start_time = time.perf_counter()
+        self._chunk_time = self.start_time
+
+    @classmethod
+    def for_transfer(
+        cls,
+        progress: t.Union[ProgressCallback, 'ProgressTracker', None],
+        bytes_total: int
+    ) -> t.Optional['ProgressTracker']:
+        """
+        Use a given tracker as is or start tracking a transfer of
+        `bytes_total` bytes for a callback.
+        """
+
+        if progress is None or isinstance(progress, ProgressTracker):
+            return progress
+
+        return cls(bytes_total, progress)
+
+    def advance(self, address: int, size: int):
+        now = time.perf_counter()
+        chunk_seconds = now - self._chunk_time
+        total_seconds = now - self.start_time
+        self._chunk_time = now
+        self.bytes_done += size
+
+        average = self.bytes_done / total_seconds if total_seconds > 0 else 0.0
+        remaining = max(self.bytes_total - self.bytes_done, 0)
+
+        self.callback(TransferProgress(
+            bytes_done=self.bytes_done,
+            bytes_total=self.bytes_total,
+            address=address,
+            bytes_per_second=size / chunk_seconds if chunk_seconds > 0 else 0.0,
+            average_bytes_per_second=average,
+            eta=remaining / average if average > 0 else None))
+
+
+Progress = t.Union[ProgressCallback, ProgressTracker]
+
+
+class ProgressBar:
+    """
+    Progress callback drawing a single line progress bar on a terminal.
+
+    Redraws are limited to `interval` seconds apart. Output written through
+    wrap_output() clears the bar first so it does not end up on the same
+    line and the bar is drawn again with the next report.
+    """
+
+    WIDTH = 24
+
+    def __init__(
+        self,
+        stream: t.Optional[t.TextIO] = None,
+        interval: float = 0.1
+    ):
+        self.stream = stream or sys.stderr
+        self.interval = interval
+
+        self._drawn = False
+        self._draw_time = 0.0
+
+    def __call__(self, progress: TransferProgress):
+        done = progress.bytes_done >= progress.bytes_total
+
+        now = time.perf_counter()
+        if not done and self._drawn and now - self._draw_time < self.interval:
+            return
+
+        self._draw_time = now
+        self._drawn = not done
+
+        fraction = progress.bytes_done / progress.bytes_total \
+            if progress.bytes_total else 1.0
+        filled = int(fraction * self.WIDTH)
+        eta = f"{progress.eta:.0f}s" if progress.eta is not None else '?'
+        end = '\n' if done else ''
+
+        self.stream.write(
+            f"\r\x1b[K[{'#' * filled}{'.' * (self.WIDTH - filled)}] "
+            f"{fraction:>4.0%} {progress.bytes_done:#x}/{progress.bytes_total:#x} "
+            f"@ {progress.address:#06x} "
+            f"{progress.average_bytes_per_second / 1024:.1f} KiB/s ETA {eta}{end}")
+
+        self.stream.flush()
+
+    def clear(self):
+        if self._drawn:
+            self.stream.write('\r\x1b[K')
+            self.stream.flush()
+            self._drawn = False
+
+    def wrap_output(self, output: t.TextIO) -> t.TextIO:
+        """
+        Wrap an output stream to clear the bar before anything is written
+        to it, for use with contextlib.redirect_stdout().
+        """
+
+        return _ClearingOutput(self, output)
+
+
+class _ClearingOutput:
+    def __init__(self, bar: ProgressBar, output: t.TextIO):
+        self._bar = bar
+        self._output = output
+
+    def write(self, text: str) -> int:
+        self._bar.clear()
+        return self._output.write(text)
+
+    def __getattr__(self, key):
+        return getattr(self._output, key)
@@ -1,11 +1,23 @@
+import time
 import struct
+import collections
+import typing as t
 from pathlib import Path
 from datetime import timedelta
 
 import serial
 
+from .metrics import ProtocolMetrics, measured
+from .image_cache import ImageCache
+from .progress import Progress, ProgressTracker
 
-class Protocol:
+
+# generator of I/O requests returning the result of a command, see
+# ProtocolCore
+Steps = t.Generator[t.Tuple, t.Any, t.Any]
+
+
+class ProtocolCore:
     """
     Serial programming protocol.
 
@@ -25,6 +37,14 @@ class Protocol:
     - Read Variable Length Response: Firmware variant name as ASCII
       - Known Variant: P13GMRS (US region GMRS firmware)
 
+    SYSINFO Queries:
+    - Sent after the SYSINFO request, see unknown_init()
+    - Send Bytes: 0x56 0x00 QUERY 0x0A 0x0D (QUERY: 0x00, 0x10 or 0x20)
+    - Read Response Header: 0x56 0x0D 0x0A 0x0A 0x0D
+    - Read Response: 8x Bytes value that changes with the radio memory
+      contents but not over time on its own
+    - Requires Ack Request After
+
     Command Requests:
     - 1x Bytes: Request Type
     - 0x or 4x Bytes: Parameters
@@ -48,6 +68,8 @@ class Protocol:
       - 1x Byte: Read Size (Not Including 5x Byte Header)
       - Read Size x Bytes: Data
     - Requires Ack Request After
+    - Multiple requests may be kept in flight (see read_memory_range) as
+      long as each response is acknowledged in order
 
     Command Write Request:
     - Radio must be in programming mode first.
@@ -59,8 +81,63 @@ class Protocol:
       - Write Size x Bytes: Data
     - Response:
       - 1x Byte: 0x06
+
+    Chunk Sizes:
+    - The size field is a full byte so chunks of up to 0xFF bytes can be
+      requested but the CPS only ever uses 0x40. The largest size a firmware
+      variant accepts is discovered with probe_chunk_sizes().
+
+    Retries:
+    - A failed memory read or write of a single chunk is retried up to
+      `max_retries` times with exponential backoff after draining the link
+      (see _recover()). The handshake is only repeated if the radio stopped
+      answering read requests, i.e. it left programming mode.
+    - A failed handshake is started over from the firmware variant query
+      the same way.
+
+    Keepalive:
+    - The radio leaves programming mode if no commands arrive for a while
+      (see unknown_init()). A session kept open between transfers sends a
+      1x byte read request periodically with keepalive().
+
+    Implementation:
+    - The commands are written once as generators of I/O requests that
+      leave the actual port access to a driver (Protocol for blocking
+      serial ports, AsyncProtocol for asyncio) so framing, handshake,
+      resync and retries are shared by both.
+    - I/O requests are tuples: ('write', data), ('read', max_count) which
+      is answered with up to `max_count` bytes read within the timeout,
+      ('reset',) to discard buffered data and ('sleep', seconds).
+    - Public commands are the `*_steps` generators, exposed under their
+      plain names by the drivers.
     """
 
+    DEFAULT_CHUNK_SIZE = 0x40
+    CHUNK_SIZE_CANDIDATES = (0xFF, 0xC0, 0x80, DEFAULT_CHUNK_SIZE)
+
+    MAX_RETRIES = 3
+    KEEPALIVE_ADDRESS = 0x1000
+    RETRY_BACKOFF = timedelta(milliseconds=50)
+    RETRY_BACKOFF_MAX = timedelta(seconds=1)
+
+    # the most bytes drained by _resync() before giving up, several full
+    # size chunk responses in flight
+    RESYNC_MAX_BYTES = 0x1000
+
+    # sysinfo queries sent during unknown_init() whose 8 byte values seem to
+    # only depend on the radio memory contents
+    SYSINFO_QUERIES = tuple(
+        bytes([0x56, 0x00, query, 0x0A, 0x0D])
+        for query in (0x00, 0x10, 0x20))
+    SYSINFO_VALUE_SIZE = 8
+
+    # firmware variant -> (read chunk size, write chunk size)
+    _chunk_size_cache: t.Dict[str, t.Tuple[int, t.Optional[int]]] = {}
+
+    # collects command timings when set, either on an instance or on the
+    # class to cover every protocol of a session
+    metrics: t.Optional[ProtocolMetrics] = None
+
     @staticmethod
     def open_port(device_path: Path) -> serial.Serial:
         return serial.Serial(
@@ -76,166 +153,607 @@ class Protocol:
 
     def __init__(
         self,
-        port: serial.Serial,
-        timeout: timedelta = timedelta(seconds=1)
+        timeout: timedelta = timedelta(seconds=1),
+        max_retries: int = MAX_RETRIES
     ):
-        self.port = port
         self.timeout = timeout
+        self.max_retries = max_retries
+        self.retries = 0
 
-    def _reset(self):
+        self.firmware_variant: t.Optional[str] = None
+        self.sysinfo_fingerprint: t.Optional[bytes] = None
+        self.read_chunk_size = self.DEFAULT_CHUNK_SIZE
+        self.write_chunk_size = self.DEFAULT_CHUNK_SIZE
+
+    def _reset(self) -> Steps:
         # XXX: log warning if buffers are not empty
         # XXX: not sure if this is actually necessary or useful
-        self.port.reset_input_buffer()
-        self.port.reset_output_buffer()
-
-    def _fixed_write(self, data: bytes) -> int:
-        self.port.write(data)
-        self.port.flush()
-
-    def _variable_read(self, max_count: int) -> bytes:
-        self.port.timeout = self.timeout.total_seconds()
-        return self.port.read(max_count)
-
-    def _fixed_read(self, expected_count: int) -> bytes:
-        response = self._variable_read(expected_count)
+        yield ('reset',)
+
+    def _record_retry(self, command: str):
+        self.retries += 1
+        if self.metrics is not None:
+            self.metrics.record_retry(command)
+
+    def _resync(self) -> Steps:
+        # acknowledge and drain responses to requests that are still in
+        # flight until the radio only answers with a bare ACK again
+        drained = 0
+        while True:
+            yield from self.send_ack_steps()
+            response = yield from self._variable_read(0x200)
+            if response in (b'', bytes([0x06])):
+                break
+
+            drained += len(response)
+            if drained > self.RESYNC_MAX_BYTES:
+                yield from self._reset()
+                raise RuntimeError("Radio did not stop sending responses")
+
+        yield from self._reset()
+
+    @measured('fixed_write', lambda args, result: len(args[0]))
+    def _fixed_write(self, data: bytes) -> Steps:
+        yield ('write', data)
+
+    @measured('variable_read', lambda args, result: len(result))
+    def _variable_read(self, max_count: int) -> Steps:
+        return (yield ('read', max_count))
+
+    @measured('fixed_read', lambda args, result: len(result))
+    def _fixed_read(self, expected_count: int) -> Steps:
+        response = yield from self._variable_read(expected_count)
         if not response:
-            self._reset()
+            yield from self._reset()
             raise RuntimeError("No response received")
 
         if len(response) != expected_count:
-            self._reset()
+            yield from self._reset()
             raise RuntimeError("Unexpected read size")
 
         return response
 
-    def send_ack(self):
-        self._fixed_write(bytes([0x06]))
+    @measured('send_ack')
+    def send_ack_steps(self) -> Steps:
+        yield from self._fixed_write(bytes([0x06]))
 
-    def receive_ack(self):
-        response = self._fixed_read(1)
+    @measured('send_ack')
+    def _send_ack_with(self, request: bytes) -> Steps:
+        # acknowledge together with the next request so the radio does not
+        # wait on a separate write
+        yield from self._fixed_write(bytes([0x06]) + request)
+
+    @measured('receive_ack')
+    def receive_ack_steps(self) -> Steps:
+        response = yield from self._fixed_read(1)
         if response != bytes([0x06]):
             raise RuntimeError("Failed to receive ACK")
 
-    def read_memory(self, address: int, size: int) -> bytes:
+    @staticmethod
+    def _read_request(address: int, size: int) -> bytes:
+        # Request: 0x52 ADDRx2 0x00 SIZEx1
+        request = bytearray([0x52, 0x00, 0x00, 0x00, 0x00])
+        struct.pack_into('<HxB', request, 1, address, size)
+        return bytes(request)
+
+    @staticmethod
+    def _write_request(address: int, data: bytes) -> bytes:
+        # Request: 0x57 ADDRx2 0x00 SIZEx1 [DATAx1 .. DATAx2]
+        request = bytearray([0x57, 0x00, 0x00, 0x00, 0x00])
+        struct.pack_into('<HxB', request, 1, address, len(data))
+        return bytes(request + data)
+
+    def _in_programming_mode(self, address: int) -> Steps:
+        # the radio only answers read requests in programming mode
+        yield from self._fixed_write(self._read_request(address, 1))
+        response = yield from self._variable_read(6)
+        if not response:
+            yield from self._reset()
+            return False
+
+        if len(response) == 6:
+            yield from self.send_ack_steps()
+            yield from self.receive_ack_steps()
+
+        else:
+            yield from self._resync()
+
+        return True
+
+    @measured('keepalive')
+    def keepalive_steps(self) -> Steps:
+        """
+        Keep the radio in programming mode between transfers, entering it
+        again if the radio left it. Returns whether it had to be entered
+        again.
+        """
+
+        if (yield from self._in_programming_mode(self.KEEPALIVE_ADDRESS)):
+            return False
+
+        yield from self.unknown_init_steps()
+        return True
+
+    def _recover(self, command: str, address: t.Optional[int], attempt: int) -> Steps:
+        backoff = min(
+            self.RETRY_BACKOFF * 2 ** attempt,
+            self.RETRY_BACKOFF_MAX)
+
+        self._record_retry(command)
+        yield ('sleep', backoff.total_seconds())
+
+        # drain responses still in flight and acknowledge them
+        yield from self._resync()
+
+        # a handshake (without address) is started over anyway
+        if address is not None and not (yield from self._in_programming_mode(address)):
+            self._record_retry('handshake')
+            yield from self.unknown_init_steps()
+
+    def _retry(
+        self,
+        command: str,
+        address: t.Optional[int],
+        function: t.Callable[[], Steps],
+        errors: t.Tuple[t.Type[Exception], ...] = (RuntimeError,)
+    ) -> Steps:
+        """
+        Run a single chunk transfer (or the handshake without `address`) and
+        retry it after recovering the link if it fails with one of `errors`.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                # a failed recovery counts as a failed attempt as well
+                if attempt > 0:
+                    yield from self._recover(command, address, attempt - 1)
+
+                return (yield from function())
+
+            except errors:
+                if attempt >= self.max_retries:
+                    raise
+
+            attempt += 1
+
+    @measured('read_memory', lambda args, result: len(result))
+    def read_memory_steps(self, address: int, size: int) -> Steps:
         # sanity check
         if size <= 0:
             raise RuntimeError("Memory read with non-positive size")
 
-        # Request: 0x52 ADDRx2 0x00 SIZEx1
-        request = bytearray([0x52, 0x00, 0x00, 0x00, 0x00])
-        struct.pack_into('<HxB', request, 1, address, size)
-        self._fixed_write(request)
+        return (yield from self._retry(
+            'read_memory',
+            address,
+            lambda: self._read_memory(address, size)))
+
+    def _read_memory(self, address: int, size: int) -> Steps:
+        request = self._read_request(address, size)
+        yield from self._fixed_write(request)
 
         # Response: 0x57 ADDRx2 0x00 SIZEx1 [DATAx1 .. DATAx1]
-        response = self._fixed_read(5 + size)
+        response = yield from self._fixed_read(5 + size)
         if response[0] != 0x57 or response[1:5] != request[1:5]:
             raise RuntimeError("Read memory response invalid header")
 
         # Sync
-        self.send_ack()
-        self.receive_ack()
+        yield from self.send_ack_steps()
+        yield from self.receive_ack_steps()
 
         return response[5:]
 
-    def write_memory(self, address: int, data: bytes):
+    @measured('write_memory', lambda args, result: len(args[1]))
+    def write_memory_steps(self, address: int, data: bytes) -> Steps:
         # sanity check
         if not data:
             raise RuntimeError("Memory write with non-positive size")
 
-        # Request: 0x57 ADDRx2 0x00 SIZEx1 [DATAx1 .. DATAx2]
-        request = bytearray([0x57, 0x00, 0x00, 0x00, 0x00])
-        struct.pack_into('<HxB', request, 1, address, len(data))
-        self._fixed_write(request + data)
+        # rewriting a chunk is harmless so it can be retried as a whole
+        yield from self._retry(
+            'write_memory',
+            address,
+            lambda: self._write_memory(address, data))
+
+    def _write_memory(self, address: int, data: bytes) -> Steps:
+        yield from self._fixed_write(self._write_request(address, data))
 
         # Sync
-        self.receive_ack()
+        yield from self.receive_ack_steps()
+
+    @measured('read_memory_pipelined', lambda args, result: len(result[0]))
+    def _read_memory_pipelined(
+        self,
+        chunks: t.List[t.Tuple[int, int]],
+        window: int,
+        progress: t.Optional[ProgressTracker] = None
+    ) -> Steps:
+        """
+        Read the given (address, size) chunks keeping up to `window` read
+        requests in flight. Returns the data read and the number of chunks
+        that completed before the radio NAKed or the link desynced, in which
+        case the remaining chunks should be read in lock-step.
+        """
 
-    def read_memory_range(
+        data = bytearray()
+        pending = collections.deque()
+        next_chunk = 0
+
+        # fill the request window
+        while next_chunk < len(chunks) and len(pending) < window:
+            request = self._read_request(*chunks[next_chunk])
+            yield from self._fixed_write(request)
+            pending.append(request)
+            next_chunk += 1
+
+        completed = 0
+        while pending:
+            request = pending.popleft()
+            size = request[4]
+
+            # Response: 0x57 ADDRx2 0x00 SIZEx1 [DATAx1 .. DATAx1]
+            response = yield from self._variable_read(5 + size)
+            if len(response) != 5 + size \
+                    or response[0] != 0x57 or response[1:5] != request[1:5]:
+                self._record_retry('read_memory_pipelined')
+                yield from self._resync()
+                break
+
+            # Sync
+            if next_chunk < len(chunks):
+                next_request = self._read_request(*chunks[next_chunk])
+                yield from self._send_ack_with(next_request)
+                pending.append(next_request)
+                next_chunk += 1
+
+            else:
+                yield from self.send_ack_steps()
+
+            try:
+                yield from self.receive_ack_steps()
+
+            except RuntimeError:
+                self._record_retry('read_memory_pipelined')
+                yield from self._resync()
+                break
+
+            data += response[5:]
+            completed += 1
+
+            if progress is not None:
+                progress.advance(*chunks[completed - 1])
+
+        return bytes(data), completed
+
+    def read_memory_chunks_steps(
+        self,
+        chunks: t.List[t.Tuple[int, int]],
+        window: int = 1,
+        progress: t.Optional[Progress] = None
+    ) -> Steps:
+        """
+        Read a list of (address, size) chunks that do not need to be
+        contiguous, keeping up to `window` read requests in flight and
+        falling back to lock-step like read_memory_range(). Progress is
+        reported to a callback or tracker after every chunk.
+        """
+
+        if window < 1:
+            raise RuntimeError("Memory read with non-positive window")
+
+        progress = ProgressTracker.for_transfer(
+            progress, sum(size for _, size in chunks))
+
+        data = []
+        completed = 0
+
+        if window > 1:
+            pipelined_data, completed = yield from self._read_memory_pipelined(
+                chunks, window, progress)
+
+            offset = 0
+            for _, read_size in chunks[:completed]:
+                data.append(pipelined_data[offset:offset + read_size])
+                offset += read_size
+
+        # lock-step (or fallback after a failed pipelined read)
+        for read_address, read_size in chunks[completed:]:
+            data.append((yield from self.read_memory_steps(read_address, read_size)))
+
+            if progress is not None:
+                progress.advance(read_address, read_size)
+
+        return data
+
+    def read_memory_range_steps(
         self,
         address: int,
         size: int,
-        chunk_size: int = 0x40
-    ) -> bytes:
+        chunk_size: t.Optional[int] = None,
+        window: int = 1,
+        progress: t.Optional[Progress] = None
+    ) -> Steps:
+        """
+        Read a memory range in chunks. With a `window` larger than one up to
+        that many read requests are kept in flight at once which avoids
+        stalling the link between chunks. If the radio NAKs or a response
+        does not match its request the remaining chunks are read in
+        lock-step instead. Progress is reported to a callback or tracker
+        after every chunk.
+        """
+
         # sanity check
         if size <= 0:
             raise RuntimeError("Memory read with non-positive size")
 
-        data = bytearray()
+        chunk_size = chunk_size or self.read_chunk_size
+        chunks = []
         read_address = address
         read_bytes_remaining = size
 
         while read_bytes_remaining > 0:
             read_size = min(chunk_size, read_bytes_remaining)
-            data += self.read_memory(read_address, read_size)
+            chunks.append((read_address, read_size))
 
             read_bytes_remaining -= read_size
             read_address += read_size
 
-        return bytes(data)
+        return b''.join((yield from self.read_memory_chunks_steps(
+            chunks, window=window, progress=progress)))
 
-    def write_memory_range(
+    def write_memory_range_steps(
         self,
         address: int,
         data: bytes,
-        chunk_size: int = 0x40
-    ):
+        chunk_size: t.Optional[int] = None,
+        progress: t.Optional[Progress] = None
+    ) -> Steps:
         # sanity check
         if not data:
             raise RuntimeError("Memory write with non-positive size")
 
+        progress = ProgressTracker.for_transfer(progress, len(data))
+
+        chunk_size = chunk_size or self.write_chunk_size
         write_counter = 0
         while write_counter < len(data):
             write_size = min(chunk_size, len(data) - write_counter)
             write_data = data[write_counter:write_counter + write_size]
-            self.write_memory(address + write_counter, write_data)
+            yield from self.write_memory_steps(address + write_counter, write_data)
+
+            if progress is not None:
+                progress.advance(address + write_counter, write_size)
 
             write_counter += write_size
 
-    def query_firmware_variant(self) -> str:
+    @staticmethod
+    def get_dirty_ranges(
+        current: bytes,
+        data: bytes,
+        diff_size: int = 0x10
+    ) -> t.List[t.Tuple[int, int]]:
+        """
+        Compare two buffers in `diff_size` chunks and return the (offset,
+        size) ranges of chunks that differ with adjacent chunks merged.
+        """
+
+        if len(current) != len(data):
+            raise RuntimeError("Memory diff with mismatched sizes")
+
+        ranges: t.List[t.Tuple[int, int]] = []
+        for offset in range(0, len(data), diff_size):
+            size = min(diff_size, len(data) - offset)
+            if current[offset:offset + size] == data[offset:offset + size]:
+                continue
+
+            if ranges and sum(ranges[-1]) == offset:
+                ranges[-1] = (ranges[-1][0], ranges[-1][1] + size)
+
+            else:
+                ranges.append((offset, size))
+
+        return ranges
+
+    def write_memory_range_diff_steps(
+        self,
+        address: int,
+        data: bytes,
+        current: t.Optional[bytes] = None,
+        diff_size: int = 0x10,
+        progress: t.Optional[Progress] = None
+    ) -> Steps:
+        """
+        Write only the chunks of a memory range that differ from its current
+        contents. The current contents are read back from the radio unless
+        given. Returns the number of bytes written. Progress of the writes
+        is reported to a callback or tracker after every chunk.
+        """
+
+        # sanity check
+        if not data:
+            raise RuntimeError("Memory write with non-positive size")
+
+        if current is None:
+            current = yield from self.read_memory_range_steps(address, len(data))
+
+        ranges = self.get_dirty_ranges(current, data, diff_size)
+        progress = ProgressTracker.for_transfer(
+            progress, sum(size for _, size in ranges))
+
+        written = 0
+        for offset, size in ranges:
+            yield from self.write_memory_range_steps(
+                address + offset,
+                data[offset:offset + size],
+                progress=progress)
+
+            written += size
+
+        return written
+
+    def query_firmware_variant_steps(self) -> Steps:
         # Request
-        self._fixed_write(b'PSEARCH')
-        self.receive_ack()
+        yield from self._fixed_write(b'PSEARCH')
+        yield from self.receive_ack_steps()
 
         # Response: firmware variant name
         # Known variants: P13GMRS
-        response = self._variable_read(16)
+        response = yield from self._variable_read(16)
         if not response:
-            self._reset()
+            yield from self._reset()
             raise RuntimeError(
                 "Firmware variant query did not receive a response")
 
         return response.decode()
 
+    def _probe_read_chunk_size(self, address: int) -> Steps:
+        # single attempts, a rejected size should not be retried
+        for size in self.CHUNK_SIZE_CANDIDATES:
+            try:
+                yield from self._read_memory(address, size)
+                return size
+
+            except RuntimeError:
+                self._record_retry('read_memory')
+                yield from self._resync()
+
+        raise RuntimeError("Failed to find a working read chunk size")
+
+    def _probe_write_chunk_size(self, address: int) -> Steps:
+        for size in self.CHUNK_SIZE_CANDIDATES:
+            # write back the existing contents so probing never changes the
+            # radio memory and verify the radio stored them correctly
+            data = yield from self.read_memory_range_steps(address, size)
+
+            try:
+                yield from self._write_memory(address, data)
+                if (yield from self.read_memory_range_steps(address, size)) == data:
+                    return size
+
+            except RuntimeError:
+                self._record_retry('write_memory')
+                yield from self._resync()
+
+        raise RuntimeError("Failed to find a working write chunk size")
+
+    def probe_chunk_sizes_steps(
+        self,
+        write_address: t.Optional[int] = None,
+        cache: t.Optional[ImageCache] = None
+    ) -> Steps:
+        """
+        Find the largest read chunk size (and write chunk size if a
+        `write_address` to probe with is given) the connected firmware
+        variant accepts and use them as the defaults for memory range
+        transfers. Results are cached per firmware variant for the process
+        and in the image `cache` if given. Requires the radio to be in
+        programming mode.
+
+        Write probing writes back the existing contents at `write_address`
+        but a rejected chunk may still leave it partially written so only
+        probe memory that is about to be rewritten anyway.
+        """
+
+        read_size, write_size = self._chunk_size_cache.get(
+            self.firmware_variant, (None, None))
+
+        if cache is not None and self.firmware_variant is not None:
+            cached_read_size, cached_write_size = cache.load_chunk_sizes(
+                self.firmware_variant)
+
+            read_size = read_size or cached_read_size
+            write_size = write_size or cached_write_size
+
+        known_sizes = (read_size, write_size)
+
+        if read_size is None:
+            read_size = yield from self._probe_read_chunk_size(
+                write_address if write_address is not None else 0x1000)
+
+        self.read_chunk_size = read_size
+
+        if write_address is not None and write_size is None:
+            write_size = yield from self._probe_write_chunk_size(write_address)
+
+        if write_size is not None:
+            self.write_chunk_size = write_size
+
+        if self.firmware_variant is not None:
+            self._chunk_size_cache[self.firmware_variant] = (
+                read_size, write_size)
+
+            if cache is not None and (read_size, write_size) != known_sizes:
+                cache.store_chunk_sizes(
+                    self.firmware_variant, read_size, write_size)
+
     # Not yet understood parts of the protocol.
 
-    def unknown_passsta(self):
-        self._fixed_write(b'PASSSTA')
-        response = self._fixed_read(3)
+    def unknown_passsta_steps(self) -> Steps:
+        yield from self._fixed_write(b'PASSSTA')
+        response = yield from self._fixed_read(3)
         assert response[:1].decode() == 'P'
         assert response[1] == 0x00
         assert response[2] == 0x00
 
-    def unknown_sysinfo(self):
-        self._fixed_write(b'SYSINFO')
-        self.receive_ack()
+    def unknown_sysinfo_steps(self) -> Steps:
+        yield from self._fixed_write(b'SYSINFO')
+        yield from self.receive_ack_steps()
 
-    def unknown_init(
+    def _unknown_query(
+        self,
+        request: bytes,
+        expected_header: bytes,
+        response_size: int
+    ) -> Steps:
+        yield from self._fixed_write(request)
+        response = yield from self._fixed_read(5)
+        assert response == expected_header
+
+        response = yield from self._fixed_read(response_size)
+
+        yield from self.send_ack_steps()
+        yield from self.receive_ack_steps()
+
+        return response
+
+    @measured('handshake')
+    def unknown_init_steps(
         self,
         query_unknown_passsta: bool = True,
         query_unknown_sysinfo: bool = True
-    ):
+    ) -> Steps:
+        """
+        Enter programming mode. Returns the memory fingerprint made up of
+        the sysinfo query values (also kept as `sysinfo_fingerprint`) or
+        None if those are not queried.
+        """
+
+        # the steps assert on unexpected responses, e.g. after a dropped byte
+        return (yield from self._retry(
+            'handshake',
+            None,
+            lambda: self._unknown_init(query_unknown_passsta, query_unknown_sysinfo),
+            errors=(RuntimeError, AssertionError)))
+
+    def _unknown_init(
+        self,
+        query_unknown_passsta: bool,
+        query_unknown_sysinfo: bool
+    ) -> Steps:
         # querying for use later on when entering programming mode
         # XXX not required to enter read/write mode
-        fw_variant = self.query_firmware_variant()
+        fw_variant = yield from self.query_firmware_variant_steps()
         assert fw_variant == 'P13GMRS'
+        self.firmware_variant = fw_variant
+        self.sysinfo_fingerprint = None
 
         # XXX checking whether a password is set?
         # XXX not required to enter programming mode
         if query_unknown_passsta:
-            self.unknown_passsta()
+            yield from self.unknown_passsta_steps()
 
         # XXX required to enter programming mode
-        self.unknown_sysinfo()
+        yield from self.unknown_sysinfo_steps()
 
         # XXX some kind of timestamp query or checksum calculation?
         # XXX seems to change based on the contents of radio memory
@@ -243,62 +761,116 @@ class Protocol:
         # XXX requires sysinfo command to be sent first
         # XXX not required to enter programming mode
         if query_unknown_sysinfo:
-            # XXX
-            self._fixed_write(bytes([0x56, 0x00, 0x00, 0x0A, 0x0D]))
-            response = self._fixed_read(5)
-            assert response == bytes([0x56, 0x0D, 0x0A, 0x0A, 0x0D])
+            # three 8 byte values that are combined into a fingerprint of
+            # the radio memory contents
+            values = []
+            for request in self.SYSINFO_QUERIES:
+                values.append((yield from self._unknown_query(
+                    request,
+                    bytes([0x56, 0x0D, 0x0A, 0x0A, 0x0D]),
+                    self.SYSINFO_VALUE_SIZE)))
 
-            response = self._fixed_read(8)
-            print(response.hex(' '))
+            self.sysinfo_fingerprint = b''.join(values)
 
-            self.send_ack()
-            self.receive_ack()
+            # XXX seems to be different variant then three queries above?
+            response = yield from self._unknown_query(
+                bytes([0x56, 0x00, 0x00, 0x00, 0x0A]),
+                bytes([0x56, 0x0A, 0x08, 0x00, 0x10]),
+                6)
 
-            # XXX
-            self._fixed_write(bytes([0x56, 0x00, 0x10, 0x0A, 0x0D]))
-            response = self._fixed_read(5)
-            assert response == bytes([0x56, 0x0D, 0x0A, 0x0A, 0x0D])
+            assert response == bytes([0x00, 0x00, 0xFF, 0xFF, 0x00, 0x00])
 
-            response = self._fixed_read(8)
-            print(response.hex(' '))
+        # XXX: this seems to set a timeout where if no further commands are
+        # received within a certain window the radio will reset
+        # required to enter programming mode
+        yield from self._fixed_write(bytes([0xFF, 0xFF, 0xFF, 0xFF, 0x0C]))
+        yield from self._fixed_write(fw_variant.encode())  # XXX: b'P13GMRS'
+        yield from self.receive_ack_steps()
 
-            self.send_ack()
-            self.receive_ack()
+        # XXX required to enter programming mode
+        yield from self._fixed_write(bytes([0x02]))
+        response = yield from self._fixed_read(8)
+        assert response == bytes([0xFF] * 8)
 
-            # XXX
-            self._fixed_write(bytes([0x56, 0x00, 0x20, 0x0A, 0x0D]))
-            response = self._fixed_read(5)
-            assert response == bytes([0x56, 0x0D, 0x0A, 0x0A, 0x0D])
+        yield from self.send_ack_steps()
+        yield from self.receive_ack_steps()
 
-            response = self._fixed_read(8)
-            print(response.hex(' '))
+        return self.sysinfo_fingerprint
 
-            self.send_ack()
-            self.receive_ack()
 
-            # XXX seems to be different variant then three queries above?
-            self._fixed_write(bytes([0x56, 0x00, 0x00, 0x00, 0x0A]))
-            response = self._fixed_read(5)
-            assert response == bytes([0x56, 0x0A, 0x08, 0x00, 0x10])
+def _blocking(steps: t.Callable[..., Steps]) -> t.Callable:
+    # run a command of the protocol core to completion on a blocking port
+    def command(self, *args, **kwargs):
+        return self._run(steps(self, *args, **kwargs))
 
-            response = self._fixed_read(6)
-            print(response.hex(' '))
-            assert response == bytes([0x00, 0x00, 0xFF, 0xFF, 0x00, 0x00])
+    command.__doc__ = steps.__doc__
+    return command
 
-            self.send_ack()
-            self.receive_ack()
 
-        # XXX: this seems to set a timeout where if no further commands are
-        # received within a certain window the radio will reset
-        # required to enter programming mode
-        self._fixed_write(bytes([0xFF, 0xFF, 0xFF, 0xFF, 0x0C]))
-        self._fixed_write(fw_variant.encode())  # XXX: b'P13GMRS'
-        self.receive_ack()
+class Protocol(ProtocolCore):
+    """
+    Serial programming protocol (see ProtocolCore) on a blocking serial
+    port.
+    """
 
-        # XXX required to enter programming mode
-        self._fixed_write(bytes([0x02]))
-        response = self._fixed_read(8)
-        assert response == bytes([0xFF] * 8)
+    def __init__(
+        self,
+        port: serial.Serial,
+        timeout: timedelta = timedelta(seconds=1),
+        max_retries: int = ProtocolCore.MAX_RETRIES
+    ):
+        super().__init__(timeout, max_retries)
+        self.port = port
 
-        self.send_ack()
-        self.receive_ack()
+    def _perform(self, request: t.Tuple) -> t.Optional[bytes]:
+        if request[0] == 'write':
+            self.port.write(request[1])
+            self.port.flush()
+
+        elif request[0] == 'read':
+            self.port.timeout = self.timeout.total_seconds()
+            return self.port.read(request[1])
+
+        elif request[0] == 'reset':
+            self.port.reset_input_buffer()
+            self.port.reset_output_buffer()
+
+        elif request[0] == 'sleep':
+            time.sleep(request[1])
+
+        else:
+            raise RuntimeError(f"Unknown I/O request: {request[0]}")
+
+        return None
+
+    def _run(self, steps: Steps) -> t.Any:
+        # answer the I/O requests of the steps until they return, passing
+        # port errors back in so they unwind like protocol errors
+        send, value = steps.send, None
+        while True:
+            try:
+                request = send(value)
+
+            except StopIteration as stop:
+                return stop.value
+
+            try:
+                send, value = steps.send, self._perform(request)
+
+            except Exception as error:
+                send, value = steps.throw, error
+
+    send_ack = _blocking(ProtocolCore.send_ack_steps)
+    receive_ack = _blocking(ProtocolCore.receive_ack_steps)
+    keepalive = _blocking(ProtocolCore.keepalive_steps)
+    read_memory = _blocking(ProtocolCore.read_memory_steps)
+    write_memory = _blocking(ProtocolCore.write_memory_steps)
+    read_memory_chunks = _blocking(ProtocolCore.read_memory_chunks_steps)
+    read_memory_range = _blocking(ProtocolCore.read_memory_range_steps)
+    write_memory_range = _blocking(ProtocolCore.write_memory_range_steps)
+    write_memory_range_diff = _blocking(ProtocolCore.write_memory_range_diff_steps)
+    query_firmware_variant = _blocking(ProtocolCore.query_firmware_variant_steps)
+    probe_chunk_sizes = _blocking(ProtocolCore.probe_chunk_sizes_steps)
+    unknown_passsta = _blocking(ProtocolCore.unknown_passsta_steps)
+    unknown_sysinfo = _blocking(ProtocolCore.unknown_sysinfo_steps)
+    unknown_init = _blocking(ProtocolCore.unknown_init_steps)
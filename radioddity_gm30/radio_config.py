@@ -1,9 +1,22 @@
+import mmap
 import enum
 import typing as t
 from pathlib import Path
 
+from mrcrowbar import models as mrc
+
 from .protocol import Protocol
+from .profiling import phase
+from .progress import ProgressCallback, ProgressTracker
+from .journal import TransferJournal
+from .image_cache import ImageCache
 from .memory import (
+    get_field_range,
+    get_modeled_ranges,
+    import_view,
+    CompiledBlock,
+    LazyEntries,
+    LazyEntriesBlock,
     UnknownMemory,
     FrequencyMemory,
     ChannelMemory,
@@ -29,17 +42,36 @@ class RadioMemoryState(int, enum.Enum):
     UNKNOWN_F = 0x26    # seems to contain repeating test pattern
 
 
+class ConfigField(t.NamedTuple):
+    """
+    Public attribute of a memory block proxied by RadioConfig. Offset and
+    size are only known for fields with a static location in the block.
+    """
+
+    name: str
+    state: RadioMemoryState
+    block_klass: t.Type[mrc.Block]
+    offset: t.Optional[int]
+    size: t.Optional[int]
+    field: t.Any
+
+
 class RadioConfig:
     """
     Radio configuration.
 
     This class wraps memory segments that store the radio configuration data.
-    It proxies public member attributes to the first matching field in memory
+    It proxies public member attributes to the matching field in memory
     segment blocks to make it easy to change relevant settings without knowing
     which segment they are contained in ahead of time.
     """
 
     MEMORY_SEGMENT_COUNT = 15
+    # XXX: pipelined reads are only verified against the emulator so far,
+    # detect segments in lock-step unless a larger `detect_window` is passed
+    # (gm30 --detect-window)
+    MEMORY_SEGMENT_DETECT_WINDOW = 1
+    CONFIG_FILE_SIZE = 0x7000
     CONFIG_FILE_ADDRESS = {
         RadioMemoryState.UNKNOWN_DATA: 0x2000,
         RadioMemoryState.FREQUENCY_DATA: 0x3000,
@@ -47,43 +79,144 @@ class RadioConfig:
         RadioMemoryState.GENERAL_DATA: 0x5000,
         RadioMemoryState.PHONE_DATA: 0x6000}
 
+    MEMORY_BLOCKS = {
+        RadioMemoryState.UNKNOWN_DATA: UnknownMemory,
+        RadioMemoryState.FREQUENCY_DATA: FrequencyMemory,
+        RadioMemoryState.CHANNEL_DATA: ChannelMemory,
+        RadioMemoryState.GENERAL_DATA: GeneralMemory,
+        RadioMemoryState.PHONE_DATA: PhoneMemory}
+
+    # attribute name -> ConfigField, see get_field_registry()
+    _field_registry: t.Optional[t.Dict[str, ConfigField]] = None
+
     def __init__(self):
         self._memory_states = [None] * self.MEMORY_SEGMENT_COUNT
+        self._memory_segments = {}  # state -> [index, ...]
         self._memory_data = {
-            RadioMemoryState.UNKNOWN_DATA: UnknownMemory(),
-            RadioMemoryState.FREQUENCY_DATA: FrequencyMemory(),
-            RadioMemoryState.CHANNEL_DATA: ChannelMemory(),
-            RadioMemoryState.GENERAL_DATA: GeneralMemory(),
-            RadioMemoryState.PHONE_DATA: PhoneMemory()}
+            state: block_klass()
+            for state, block_klass in self.MEMORY_BLOCKS.items()}
+
+        # (offset, size) ranges per memory segment that were not read from
+        # the radio and hold default values instead
+        self._unread_ranges = {}
+
+        # last known radio contents per memory segment, used to only write
+        # the parts that changed
+        self._radio_data = {}
+
+        # shared config file buffer and the memoryview window of each
+        # memory segment within it, see read_buffer()
+        self._buffer = None
+        self._buffer_views = {}
+
+    @classmethod
+    def get_field_registry(cls) -> t.Dict[str, ConfigField]:
+        """
+        Map every public memory block attribute proxied by this class to the
+        block it belongs to. Built once per class and fails if a name is
+        defined by more than one block or shadowed by this class.
+        """
+
+        # look in the class dict to not pick up the registry of a base class
+        registry = cls.__dict__.get('_field_registry')
+        if registry is not None:
+            return registry
+
+        registry = {}
+        for state, block_klass in cls.MEMORY_BLOCKS.items():
+            for klass in reversed(block_klass.__mro__):
+                if not issubclass(klass, mrc.Block) \
+                        or klass in (mrc.Block, CompiledBlock, LazyEntriesBlock):
+                    continue
+
+                for name, value in vars(klass).items():
+                    field = block_klass._fields.get(name)
+                    if name.startswith('_') or (field is None and not isinstance(
+                            value, (property, LazyEntries))):
+                        continue
+
+                    shadowed = hasattr(cls, name)
+                    if shadowed or (
+                            name in registry and registry[name].state != state):
+                        raise RuntimeError(f"Ambiguous config field name: {name}")
+
+                    offset, size = None, None
+                    if field is not None:
+                        offset, size = get_field_range(field)
+
+                    elif isinstance(value, LazyEntries):
+                        offset, size = get_field_range(
+                            block_klass._fields[value.data_field])
+
+                    registry[name] = ConfigField(
+                        name=name,
+                        state=state,
+                        block_klass=block_klass,
+                        offset=offset,
+                        size=size,
+                        field=field if field is not None else value)
+
+        cls._field_registry = registry
+        return registry
+
+    def _get_field(self, key: str) -> ConfigField:
+        config_field = self.get_field_registry().get(key)
+        if config_field is None:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{key}'")
+
+        return config_field
 
     def __getattr__(self, key):
-        try:
-            # check if the attribute exists in this class and use the default
-            # bahevior if it does
-            return self.__getattribute__(key)
-
-        except AttributeError as e:
-            # ignore private attributes to prevent recursion
-            if not key.startswith('_'):
-                # proxy to memory data block field
-                for memory in self._memory_data.values():
-                    if hasattr(memory, key):
-                        return getattr(memory, key)
-
-            # re-raise original error
-            raise e
+        # only called when regular lookup fails, ignore private attributes
+        # to prevent recursion before __init__ sets them up
+        if key.startswith('_'):
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{key}'")
+
+        # proxy to memory data block field
+        config_field = self._get_field(key)
+        return getattr(self._memory_data[config_field.state], key)
 
     def __setattr__(self, key, value):
         # ignore private attributes to prevent recursion
         if not key.startswith('_'):
             # proxy to memory data block field
-            for memory in self._memory_data.values():
-                if hasattr(memory, key):
-                    return setattr(memory, key, value)
+            config_field = self.get_field_registry().get(key)
+            if config_field is not None:
+                setattr(self._memory_data[config_field.state], key, value)
+                self._write_through(config_field.state, key)
+                return
 
         # fall back to default behavior
         return super().__setattr__(key, value)
 
+    def get_many(self, names: t.Iterable[str]) -> t.Dict[str, t.Any]:
+        """
+        Retrieve several memory block attributes at once by name.
+        """
+
+        config_fields = [self._get_field(name) for name in names]
+        return {
+            config_field.name: getattr(
+                self._memory_data[config_field.state], config_field.name)
+            for config_field in config_fields}
+
+    def set_many(self, values: t.Mapping[str, t.Any]):
+        """
+        Set several memory block attributes at once by name. All names are
+        checked before any value is changed.
+        """
+
+        config_fields = [self._get_field(name) for name in values]
+        for config_field in config_fields:
+            setattr(
+                self._memory_data[config_field.state],
+                config_field.name,
+                values[config_field.name])
+
+            self._write_through(config_field.state, config_field.name)
+
     def _get_segment_base_address(self, index: int) -> int:
         # 0x1000 through 0xF000
         return (index + 1) * 0x1000
@@ -92,19 +225,41 @@ class RadioConfig:
         # last byte in each segment stores it's state
         return self._get_segment_base_address(index) + 0x0FFF
 
-    def _detect_memory_segments(self, protocol: Protocol):
-        for i in range(self.MEMORY_SEGMENT_COUNT):
-            raw_data = protocol.read_memory(
-                address=self._get_segment_state_address(i),
-                size=0x01)
-
-            self._memory_states[i] = RadioMemoryState(raw_data[0])
+    def _detect_memory_segments(
+        self,
+        protocol: Protocol,
+        window: int = MEMORY_SEGMENT_DETECT_WINDOW
+    ):
+        # read all state bytes, optionally with up to `window` requests
+        # pipelined instead of paying a full round trip for each one
+        raw_data = protocol.read_memory_chunks(
+            [
+                (self._get_segment_state_address(i), 0x01)
+                for i in range(self.MEMORY_SEGMENT_COUNT)],
+            window=window)
+
+        self._memory_segments = {}
+        for i, state_data in enumerate(raw_data):
+            state = RadioMemoryState(state_data[0])
+            self._memory_states[i] = state
+            self._memory_segments.setdefault(state, []).append(i)
+
+    def detect_memory_segments(
+        self,
+        protocol: Protocol,
+        window: int = MEMORY_SEGMENT_DETECT_WINDOW
+    ) -> t.List[RadioMemoryState]:
+        """
+        Detect the state of every memory segment on the radio, keeping up to
+        `window` state reads in flight. Requires the radio to be in
+        programming mode.
+        """
+
+        self._detect_memory_segments(protocol, window)
+        return list(self._memory_states)
 
     def _locate_memory_segment(self, state: RadioMemoryState) -> int:
-        matching_segments = [
-            i for i in range(self.MEMORY_SEGMENT_COUNT)
-            if self._memory_states[i] == state]
-
+        matching_segments = self._memory_segments.get(state, [])
         if len(matching_segments) == 0:
             raise RuntimeError(
                 f"Memory segment not found: {state.name}")
@@ -115,87 +270,604 @@ class RadioConfig:
 
         return matching_segments[0]
 
+    def _write_through(self, state: RadioMemoryState, key: str):
+        view = self._buffer_views.get(state)
+        if view is None:
+            return
+
+        memory = self._memory_data[state]
+        field = type(memory)._fields.get(key)
+
+        if field is not None:
+            memory.scrub_field(key)
+            memory.validate_field(key)
+            field.update_buffer_with_value(
+                getattr(memory, key), view, parent=memory)
+
+        elif isinstance(memory, LazyEntriesBlock):
+            memory.sync_lazy_entries()
+
+    def read_buffer(self, buffer: t.Union[bytearray, mmap.mmap]):
+        """
+        Use a config file buffer as the backing store of this configuration.
+
+        Memory blocks are imported from memoryview windows over the buffer
+        instead of copies. Raw byte fields and entry lists reference it
+        directly and field assignments through this class are written to it
+        in place. Changes made through properties, nested blocks and entry
+        lists are written back by flush(). Use a bytearray or a writable mmap
+        to allow changes.
+        """
+
+        if len(buffer) != self.CONFIG_FILE_SIZE:
+            raise RuntimeError("Unexpected config file length")
+
+        view = memoryview(buffer)
+        buffer_views = {}
+
+        for state, base_address in self.CONFIG_FILE_ADDRESS.items():
+            memory = self._memory_data[state]
+            end_address = base_address + memory.get_size()
+            buffer_views[state] = view[base_address:end_address]
+            import_view(memory, buffer_views[state])
+            memory.mark_clean(buffer_views[state])
+
+        self._buffer = buffer
+        self._buffer_views = buffer_views
+
+    def map_file(self, config_path: Path, writable: bool = True) -> mmap.mmap:
+        """
+        Memory map a config file and use it as the backing store (see
+        read_buffer()). Changes are saved to the file by flush().
+        """
+
+        with open(config_path, 'r+b' if writable else 'rb') as config_file:
+            buffer = mmap.mmap(
+                config_file.fileno(),
+                0,
+                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+
+        self.read_buffer(buffer)
+        return buffer
+
+    def flush(self):
+        """
+        Write pending changes to the backing store buffer and flush it to
+        disk if it is a memory mapped file.
+
+        Properties and nested blocks change fields without passing through
+        the attribute assignments written in place, so the ranges changed
+        since the file was clean are exported to the buffer here.
+        """
+
+        if self._buffer is None:
+            raise RuntimeError("Config is not backed by a buffer")
+
+        is_mapped = isinstance(self._buffer, mmap.mmap)
+
+        for state, memory in self._memory_data.items():
+            view = self._buffer_views[state]
+            data, ranges = memory.export_patch('file')
+            if ranges and view.readonly:
+                raise RuntimeError("Config buffer is read-only")
+
+            for offset, size in ranges:
+                view[offset:offset + size] = data[offset:offset + size]
+
+            if is_mapped:
+                memory.mark_clean(view, 'file')
+
+        if is_mapped and not memoryview(self._buffer).readonly:
+            self._buffer.flush()
+
     def read_file(self, config_file: t.BinaryIO):
         config_file.seek(0)
         data = config_file.read()
 
-        if len(data) != 0x7000:
+        if len(data) != self.CONFIG_FILE_SIZE:
             raise RuntimeError("Unexpected config file length")
 
+        self._buffer = None
+        self._buffer_views = {}
+
         for state, base_address in self.CONFIG_FILE_ADDRESS.items():
             memory = self._memory_data[state]
             end_address = base_address + memory.get_size()
-            memory.import_data(data[base_address:end_address])
 
-    def write_file(self, config_file: t.BinaryIO):
+            memory_name = state.name.lower().rstrip('_data')
+            with phase(f'import_data:{memory_name}'):
+                memory.import_data(data[base_address:end_address])
+
+    def get_dirty_ranges(
+        self,
+        state: RadioMemoryState,
+        target: str = 'radio'
+    ) -> t.List[t.Tuple[int, int]]:
+        """
+        Retrieve the (offset, size) ranges of a memory segment changed since
+        it was last read or written, from or to the radio by default or the
+        config file with target 'file'.
+        """
+
+        return self._memory_data[state].get_dirty_ranges(target)
+
+    def get_frequencies(self) -> t.List[t.Tuple[int, int]]:
+        """
+        Decode the (receive, transmit) frequencies of both VFOs followed by
+        all frequency entries in one pass, see FrequencyMemory.
+        """
+
+        return self._memory_data[RadioMemoryState.FREQUENCY_DATA].get_frequencies()
+
+    def write_file(self, config_file: t.BinaryIO, patch: bool = False):
+        """
+        Write the configuration to a config file. In patch mode only the
+        ranges changed since the config was last read or written are written
+        to the file in place, which requires the file to hold that config.
+
+        Writing a file does not change what patch writes to the radio
+        consider clean.
+        """
+
+        if self._buffer is not None:
+            # the buffer already holds the complete file
+            self.flush()
+            config_file.truncate(0)
+            config_file.seek(0)
+            config_file.write(self._buffer)
+
+            for state, memory in self._memory_data.items():
+                memory.mark_clean(self._buffer_views[state], 'file')
+
+            return
+
+        if patch:
+            for state, base_address in self.CONFIG_FILE_ADDRESS.items():
+                memory = self._memory_data[state]
+                memory_name = state.name.lower().rstrip('_data')
+                with phase(f'export_data:{memory_name}'):
+                    data, ranges = memory.export_patch('file')
+
+                for offset, size in ranges:
+                    config_file.seek(base_address + offset)
+                    config_file.write(data[offset:offset + size])
+
+                memory.mark_clean(data, 'file')
+
+            return
+
         config_file.truncate(0)
         config_file.write(bytes([0x00] * 0x7000))
         config_file.seek(0)
 
         for state, base_address in self.CONFIG_FILE_ADDRESS.items():
             memory = self._memory_data[state]
+            memory_name = state.name.lower().rstrip('_data')
+            with phase(f'export_data:{memory_name}'):
+                data = memory.export_data()
+
             config_file.seek(base_address)
-            config_file.write(memory.export_data())
+            config_file.write(data)
+            memory.mark_clean(data, 'file')
+
+    def _read_memory_minimal(
+        self,
+        protocol: Protocol,
+        state: RadioMemoryState,
+        base_address: int,
+        progress: t.Optional[ProgressTracker] = None
+    ) -> bytes:
+        memory = self._memory_data[state]
+
+        # unread space keeps the default trailing space content (zeroes)
+        data = bytearray(memory.get_size())
+        unread_ranges = []
+        unread_offset = 0
+
+        for offset, size in get_modeled_ranges(type(memory)):
+            data[offset:offset + size] = protocol.read_memory_range(
+                address=base_address + offset,
+                size=size,
+                progress=progress)
+
+            if offset > unread_offset:
+                unread_ranges.append((unread_offset, offset - unread_offset))
+
+            unread_offset = offset + size
+
+        if unread_offset < len(data):
+            unread_ranges.append((unread_offset, len(data) - unread_offset))
+
+        self._unread_ranges[state] = unread_ranges
+        return bytes(data)
+
+    def get_unread_ranges(
+        self,
+        state: RadioMemoryState
+    ) -> t.List[t.Tuple[int, int]]:
+        """
+        Retrieve the (offset, size) ranges of a memory segment that were not
+        read from the radio by a minimal read and hold default values.
+        """
+
+        return self._unread_ranges.get(state, [])
+
+    def _import_radio_data(self, state: RadioMemoryState, data: bytes):
+        memory = self._memory_data[state]
+        memory_name = state.name.lower().rstrip('_data')
+
+        with phase(f'import_data:{memory_name}'):
+            view = self._buffer_views.get(state)
+            if view is not None:
+                # keep using the shared buffer
+                view[:] = data
+                import_view(memory, view)
+                memory.mark_clean(view)
+
+            else:
+                memory.import_data(data)
+
+    def _get_radio_image(self) -> bytes:
+        # radio contents in the config file format
+        image = bytearray(self.CONFIG_FILE_SIZE)
+        for state, base_address in self.CONFIG_FILE_ADDRESS.items():
+            data = self._radio_data[state]
+            image[base_address:base_address + len(data)] = data
+
+        return bytes(image)
+
+    def _load_cached_image(
+        self,
+        protocol: Protocol,
+        cache: ImageCache
+    ) -> bool:
+        if protocol.sysinfo_fingerprint is None:
+            return False
 
-    def read_radio(self, device_path: Path):
-        with Protocol.open_port(device_path) as serial_port:
+        image = cache.load(
+            protocol.firmware_variant,
+            protocol.sysinfo_fingerprint,
+            self.CONFIG_FILE_SIZE)
+
+        if image is None:
+            return False
+
+        for state, base_address in self.CONFIG_FILE_ADDRESS.items():
+            end_address = base_address + self._memory_data[state].get_size()
+            self._radio_data[state] = image[base_address:end_address]
+            self._import_radio_data(state, self._radio_data[state])
+
+        return True
+
+    def read_radio(
+        self,
+        device_path: Path,
+        minimal: bool = False,
+        cache: t.Optional[ImageCache] = None,
+        progress: t.Optional[ProgressCallback] = None,
+        detect_window: int = MEMORY_SEGMENT_DETECT_WINDOW
+    ):
+        """
+        Read the configuration from the radio. In minimal mode only the byte
+        ranges covered by the memory models are read and unread trailing
+        space keeps its default value (see get_unread_ranges()).
+
+        With an image cache the memory transfer is skipped when the radio
+        reports the same sysinfo fingerprint as a cached image, otherwise
+        the image is added to the cache after a full read.
+
+        Progress of the reads from all memory segments is reported to the
+        `progress` callback after every chunk.
+
+        Up to `detect_window` memory segment state reads are kept in flight
+        while detecting the memory segments, see detect_memory_segments().
+        """
+
+        with phase('open_port'):
+            serial_port = Protocol.open_port(device_path)
+
+        with serial_port:
             protocol = Protocol(serial_port)
 
             print("Entering programming mode")
-            protocol.unknown_init()
+            with phase('unknown_init'):
+                protocol.unknown_init()
+
+            self.read_session(
+                protocol,
+                minimal=minimal,
+                cache=cache,
+                progress=progress,
+                detect_window=detect_window)
+
+    def read_session(
+        self,
+        protocol: Protocol,
+        minimal: bool = False,
+        cache: t.Optional[ImageCache] = None,
+        progress: t.Optional[ProgressCallback] = None,
+        states: t.Optional[t.Collection[RadioMemoryState]] = None,
+        detect_window: int = MEMORY_SEGMENT_DETECT_WINDOW
+    ):
+        """
+        Read the configuration like read_radio() through a protocol that
+        already entered programming mode, e.g. one kept open by gm30d.
+
+        Only the memory segments of the given `states` are read if any,
+        the others keep their default values.
+        """
+
+        read_memory = {
+            state: memory for state, memory in self._memory_data.items()
+            if states is None or state in states}
+
+        self._unread_ranges = {}
+        self._radio_data = {}
+
+        if cache is not None and self._load_cached_image(protocol, cache):
+            print("Using cached image of unchanged radio memory")
+            return
+
+        print("Detecting transfer chunk sizes")
+        with phase('probe_chunk_sizes'):
+            protocol.probe_chunk_sizes(cache=cache)
+
+        print("Detecting memory segments")
+        with phase('detect_memory_segments'):
+            self._detect_memory_segments(protocol, detect_window)
+
+        progress = ProgressTracker.for_transfer(progress, sum(
+            sum(size for _, size in get_modeled_ranges(type(memory)))
+            if minimal else memory.get_size()
+            for memory in read_memory.values()))
+
+        # read memory segments
+        for state, memory in read_memory.items():
+            index = self._locate_memory_segment(state)
+            base_address = self._get_segment_base_address(index)
 
-            print("Detecting memory segments")
-            self._detect_memory_segments(protocol)
+            memory_name = state.name.lower().rstrip('_data')
+            print(
+                f"Reading {memory_name} memory from segment "
+                f"{hex(index)} @ {hex(base_address)}")
+
+            with phase(f'read_segment:{memory_name}'):
+                if minimal:
+                    data = self._read_memory_minimal(
+                        protocol, state, base_address, progress)
+
+                else:
+                    data = protocol.read_memory_range(
+                        address=base_address,
+                        size=memory.get_size(),
+                        progress=progress)
+
+                    self._radio_data[state] = data
+
+            self._import_radio_data(state, data)
+
+        # partial and minimal reads do not have the complete image to cache
+        if cache is not None and not minimal and states is None \
+                and protocol.sysinfo_fingerprint is not None:
+            cache.store(
+                protocol.firmware_variant,
+                protocol.sysinfo_fingerprint,
+                self._get_radio_image())
+
+    def _check_patchable(
+        self,
+        states: t.Optional[t.Collection[RadioMemoryState]] = None
+    ):
+        for state, memory in self._memory_data.items():
+            if state == RadioMemoryState.UNKNOWN_DATA:
+                continue
+
+            if states is not None and state not in states:
+                continue
+
+            radio_data = self._radio_data.get(state)
+            if radio_data is None or memory.get_clean_data('radio') != radio_data:
+                raise RuntimeError(
+                    "Patch writes require a full radio read or write first")
+
+    def write_radio(
+        self,
+        device_path: Path,
+        diff: bool = False,
+        patch: bool = False,
+        progress: t.Optional[ProgressCallback] = None,
+        journal: t.Optional[TransferJournal] = None,
+        verify: bool = False,
+        cache: t.Optional[ImageCache] = None,
+        detect_window: int = MEMORY_SEGMENT_DETECT_WINDOW
+    ):
+        """
+        Write the configuration to the radio. In diff mode only the chunks
+        that differ from the radio's current contents are written. Those are
+        taken from the last full read_radio() or write_radio() call on this
+        instance or read back from the radio otherwise.
+
+        In patch mode only the ranges changed by field assignments since the
+        last full read_radio() or write_radio() call are written, without
+        comparing or reading anything. The config must not have been read or
+        written elsewhere in between.
+
+        Progress of the writes to all memory segments is reported to the
+        `progress` callback after every chunk.
+
+        With a journal the writes are checkpointed so an interrupted write of
+        the same data can be resumed with a journal opened for resuming. It
+        is removed once all memory segments were written.
+
+        With `verify` the written ranges are read back and compared.
+
+        Detected transfer chunk sizes are kept in the image `cache` if given.
+
+        Up to `detect_window` memory segment state reads are kept in flight
+        while detecting the memory segments, see detect_memory_segments().
+        """
+
+        if patch:
+            self._check_patchable()
+
+        with phase('open_port'):
+            serial_port = Protocol.open_port(device_path)
+
+        with serial_port:
+            protocol = Protocol(serial_port)
 
-            # read memory segments
-            for state, memory in self._memory_data.items():
-                index = self._locate_memory_segment(state)
-                base_address = self._get_segment_base_address(index)
+            print("Entering programming mode")
+            with phase('unknown_init'):
+                protocol.unknown_init()
+
+            self.write_session(
+                protocol,
+                diff=diff,
+                patch=patch,
+                progress=progress,
+                journal=journal,
+                verify=verify,
+                cache=cache,
+                detect_window=detect_window)
+
+    def write_session(
+        self,
+        protocol: Protocol,
+        diff: bool = False,
+        patch: bool = False,
+        progress: t.Optional[ProgressCallback] = None,
+        journal: t.Optional[TransferJournal] = None,
+        verify: bool = False,
+        states: t.Optional[t.Collection[RadioMemoryState]] = None,
+        cache: t.Optional[ImageCache] = None,
+        detect_window: int = MEMORY_SEGMENT_DETECT_WINDOW
+    ):
+        """
+        Write the configuration like write_radio() through a protocol that
+        already entered programming mode, e.g. one kept open by gm30d.
+
+        Only the memory segments of the given `states` are written if any,
+        which in patch mode only need to have been read before.
+        """
+
+        if patch:
+            self._check_patchable(states)
+
+        print("Detecting memory segments")
+        with phase('detect_memory_segments'):
+            self._detect_memory_segments(protocol, detect_window)
+
+        # probe writes against the general memory segment only if it is
+        # rewritten in full below, a partially written probe chunk is not
+        # repaired by diff or patch writes
+        probe_address = None
+        if not diff and not patch:
+            probe_address = self._get_segment_base_address(
+                self._locate_memory_segment(RadioMemoryState.GENERAL_DATA))
+
+        print("Detecting transfer chunk sizes")
+        with phase('probe_chunk_sizes'):
+            protocol.probe_chunk_sizes(write_address=probe_address, cache=cache)
+
+        # determine the (offset, size) ranges to write to each memory
+        # segment up front to know the total size of the transfer
+        writes = []
+        for state, memory in self._memory_data.items():
+            if states is not None and state not in states:
+                continue
 
-                memory_name = state.name.lower().rstrip('_data')
+            memory_name = state.name.lower().rstrip('_data')
+            index = self._locate_memory_segment(state)
+            base_address = self._get_segment_base_address(index)
+
+            # TODO: do not write the unknown data segment until we know
+            # more about what is in there or we risk breaking the radio
+            if state == RadioMemoryState.UNKNOWN_DATA:
                 print(
-                    f"Reading {memory_name} memory from segment "
+                    f"Skipping {memory_name} memory at segment "
                     f"{hex(index)} @ {hex(base_address)}")
 
-                data = protocol.read_memory_range(
-                    address=base_address,
-                    size=memory.get_size())
+                continue
 
-                memory.import_data(data)
+            if patch:
+                with phase(f'export_data:{memory_name}'):
+                    data, ranges = memory.export_patch('radio')
 
-    def write_radio(self, device_path: Path):
-        with Protocol.open_port(device_path) as serial_port:
-            protocol = Protocol(serial_port)
+            else:
+                with phase(f'export_data:{memory_name}'):
+                    data = bytes(memory.export_data())
 
-            print("Entering programming mode")
-            protocol.unknown_init()
+                ranges = [(0, len(data))]
+                if diff:
+                    current = self._radio_data.get(state)
+                    if current is None:
+                        with phase(f'read_segment:{memory_name}'):
+                            current = protocol.read_memory_range(
+                                address=base_address,
+                                size=len(data))
 
-            print("Detecting memory segments")
-            self._detect_memory_segments(protocol)
+                    ranges = protocol.get_dirty_ranges(current, data)
 
-            # write memory segments
-            for state, memory in self._memory_data.items():
-                memory_name = state.name.lower().rstrip('_data')
-                index = self._locate_memory_segment(state)
-                base_address = self._get_segment_base_address(index)
+            # skip what an interrupted write of the same data confirmed
+            if journal is not None and journal.check_digest(base_address, data):
+                resume_offset = journal.get_confirmed(base_address) - base_address
+                ranges = [
+                    (max(offset, resume_offset), offset + size - max(offset, resume_offset))
+                    for offset, size in ranges
+                    if offset + size > resume_offset]
 
-                # TODO: do not write the unknown data segment until we know
-                # more about what is in there or we risk breaking the radio
-                if state == RadioMemoryState.UNKNOWN_DATA:
-                    print(
-                        f"Skipping {memory_name} memory at segment "
-                        f"{hex(index)} @ {hex(base_address)}")
+            writes.append((state, index, base_address, data, ranges))
 
-                    continue
+        progress = ProgressTracker.for_transfer(
+            progress,
+            sum(size for *_, ranges in writes for _, size in ranges))
 
-                # write memory segment
-                print(
-                    f"Writing {memory_name} memory to segment "
-                    f"{hex(index)} @ {hex(base_address)}")
-
-                protocol.write_memory_range(
-                    address=base_address,
-                    data=memory.export_data())
+        # write memory segments
+        for state, index, base_address, data, ranges in writes:
+            memory_name = state.name.lower().rstrip('_data')
+            print(
+                f"Writing {memory_name} memory to segment "
+                f"{hex(index)} @ {hex(base_address)}")
+
+            with phase(f'write_segment:{memory_name}'):
+                for offset, size in ranges:
+                    step = journal.CHECKPOINT_SIZE if journal is not None else size
+                    for block_offset in range(offset, offset + size, step):
+                        block_end = min(block_offset + step, offset + size)
+                        protocol.write_memory_range(
+                            address=base_address + block_offset,
+                            data=data[block_offset:block_end],
+                            progress=progress)
+
+                        if journal is not None:
+                            journal.confirm(
+                                base_address, base_address + block_end, data)
+
+            if diff or patch:
+                written = sum(size for _, size in ranges)
+                print(f"Wrote {hex(written)} of {hex(len(data))} bytes")
+
+            if verify:
+                with phase(f'verify_segment:{memory_name}'):
+                    for offset, size in ranges:
+                        written_data = protocol.read_memory_range(
+                            address=base_address + offset,
+                            size=size)
+
+                        if written_data != data[offset:offset + size]:
+                            raise RuntimeError(
+                                f"Verifying {memory_name} memory failed at "
+                                f"{hex(base_address + offset)}")
+
+            self._radio_data[state] = data
+            self._memory_data[state].mark_clean(data, 'radio')
+
+        # the fingerprint reported when entering programming mode no longer
+        # matches the radio memory
+        protocol.sysinfo_fingerprint = None
+
+        if journal is not None:
+            journal.remove()
 
     def hexdump(self):
         for state, memory in self._memory_data.items():
@@ -0,0 +1,138 @@
+import pytest
+from mrcrowbar import models as mrc
+
+from radioddity_gm30.benchmark import build_sample_image, check_codecs
+from radioddity_gm30.radio_config import RadioConfig, RadioMemoryState
+from radioddity_gm30.memory import (
+    get_block_size,
+    get_field_range,
+    get_codec,
+    compare_codec,
+    LazyEntriesBlock)
+from radioddity_gm30.memory.codec import _field_values
+from radioddity_gm30.memory.frequency import UNDEFINED_FREQUENCY, encode_frequencies
+
+
+def build_populated_image() -> bytes:
+    # the sample image with used frequency and channel entries, which are
+    # empty in the stock configuration
+    image = bytearray(build_sample_image())
+
+    frequency_base = 0x2000 + 0x30
+    for index, entry in enumerate([
+        bytes.fromhex('5062254650622546 00ffffffff061100'.replace(' ', '')),
+        bytes.fromhex('5062754650627546 00ffffffff001100'.replace(' ', '')),
+        bytes.fromhex('0050254600507546 ff70067006061000'.replace(' ', '')),
+        bytes.fromhex('0075254600757546 ff35103510761800'.replace(' ', ''))
+    ]):
+        offset = frequency_base + index * 0x10
+        image[offset:offset + 0x10] = entry
+
+    channel_base = 0x3000
+    for index in range(4):
+        offset = channel_base + index * 11
+        image[offset:offset + 11] = b'CH%d' % (index + 1) + bytes(11 - 3)
+
+    return bytes(image)
+
+
+SAMPLE_IMAGES = {
+    'stock': build_sample_image(),
+    'populated': build_populated_image()}
+
+
+def get_segment_data(image: bytes, state: RadioMemoryState) -> bytes:
+    for index in range(RadioConfig.MEMORY_SEGMENT_COUNT):
+        base = index * 0x1000
+        if image[base + 0xFFF] == state:
+            return image[base:base + get_block_size(RadioConfig.MEMORY_BLOCKS[state])]
+
+    raise AssertionError(f"No {state.name} segment in sample image")
+
+
+@pytest.fixture(params=list(SAMPLE_IMAGES), ids=list(SAMPLE_IMAGES))
+def image(request) -> bytes:
+    return SAMPLE_IMAGES[request.param]
+
+
+@pytest.mark.parametrize('state', list(RadioConfig.MEMORY_BLOCKS), ids=lambda state: state.name)
+def test_segment_roundtrip(image: bytes, state: RadioMemoryState):
+    block_klass = RadioConfig.MEMORY_BLOCKS[state]
+    data = get_segment_data(image, state)
+
+    compiled_block = block_klass()
+    compiled_block.import_data(data)
+    compiled_data = bytes(compiled_block.export_data())
+
+    generic_block = block_klass()
+    mrc.Block.import_data(generic_block, data)
+    generic_data = bytes(mrc.Block.export_data(generic_block))
+
+    assert compiled_data == generic_data
+
+    # bytes between modeled fields are not kept
+    for field in block_klass._fields.values():
+        offset, size = get_field_range(field)
+        assert compiled_data[offset:offset + size] == data[offset:offset + size]
+
+    assert _field_values(compiled_block) == _field_values(generic_block)
+
+
+@pytest.mark.parametrize('state', list(RadioConfig.MEMORY_BLOCKS), ids=lambda state: state.name)
+def test_segment_codec(image: bytes, state: RadioMemoryState):
+    block_klass = RadioConfig.MEMORY_BLOCKS[state]
+    if get_codec(block_klass) is None:
+        pytest.skip(f"{block_klass.__name__} has no compiled codec")
+
+    assert compare_codec(block_klass, get_segment_data(image, state)) == []
+
+
+def test_entry_roundtrip():
+    image = SAMPLE_IMAGES['populated']
+
+    used_entries = 0
+    for state, block_klass in RadioConfig.MEMORY_BLOCKS.items():
+        if not issubclass(block_klass, LazyEntriesBlock):
+            continue
+
+        block = block_klass(source_data=get_segment_data(image, state))
+        for lazy_entries in block._lazy_entries():
+            entries = lazy_entries.get_list(block)
+            for index in range(len(entries)):
+                entry = entries[index]
+                if entry is None:
+                    continue
+
+                data = entries._raw(index)
+                assert compare_codec(entries.block_klass, data) == []
+
+                generic_entry = entries.block_klass()
+                mrc.Block.import_data(generic_entry, data)
+                assert bytes(entry.export_data()) == bytes(mrc.Block.export_data(generic_entry))
+
+                used_entries += 1
+
+    # both VFOs, the frequency and channel entries above and the sample's
+    # own channel entry
+    assert used_entries >= 2 + 4 + 4
+
+
+def test_check_codecs(image: bytes):
+    assert check_codecs(image) == []
+
+
+def test_batch_frequencies(image: bytes):
+    state = RadioMemoryState.FREQUENCY_DATA
+    memory = RadioConfig.MEMORY_BLOCKS[state](source_data=get_segment_data(image, state))
+
+    expected = [
+        (entry.receive_frequency.value, entry.transmit_frequency.value)
+        if entry is not None else (UNDEFINED_FREQUENCY, UNDEFINED_FREQUENCY)
+        for entry in [memory.vfo_a, memory.vfo_b, *memory.frequency_entries]]
+
+    frequencies = memory.get_frequencies()
+    assert frequencies == expected
+
+    data = bytearray(memory.export_data())
+    encode_frequencies(data, frequencies)
+    assert data == memory.export_data()
@@ -0,0 +1,122 @@
+import asyncio
+from datetime import timedelta
+
+import pytest
+
+from radioddity_gm30.async_protocol import AsyncProtocol
+from radioddity_gm30.benchmark import build_sample_image
+from radioddity_gm30.emulator import RadioEmulator
+from radioddity_gm30.metrics import ProtocolMetrics
+from radioddity_gm30.protocol import Protocol
+from radioddity_gm30.radio_config import RadioConfig, RadioMemoryState
+
+
+# a range crossing segment boundaries and several chunks
+READ_ADDRESS = 0x1F80
+READ_SIZE = 0x300
+
+
+def run_blocking(emulator: RadioEmulator, metrics: ProtocolMetrics) -> bytes:
+    with Protocol.open_port(emulator.device_path) as serial_port:
+        protocol = Protocol(serial_port)
+        protocol.metrics = metrics
+        protocol.unknown_init()
+        return protocol.read_memory_range(READ_ADDRESS, READ_SIZE, window=4)
+
+
+async def run_async(emulator: RadioEmulator, metrics: ProtocolMetrics) -> bytes:
+    async with AsyncProtocol.open_port(emulator.device_path) as port:
+        protocol = AsyncProtocol(port)
+        protocol.metrics = metrics
+        await protocol.unknown_init()
+        return await protocol.read_memory_range(READ_ADDRESS, READ_SIZE, window=4)
+
+
+def get_counts(metrics: ProtocolMetrics) -> dict:
+    return {
+        command: (values['count'], values['bytes'])
+        for command, values in metrics.as_dict().items()}
+
+
+def test_async_matches_blocking():
+    image = build_sample_image()
+
+    blocking_metrics = ProtocolMetrics()
+    with RadioEmulator(image) as emulator:
+        blocking_data = run_blocking(emulator, blocking_metrics)
+
+    async_metrics = ProtocolMetrics()
+    with RadioEmulator(image) as emulator:
+        async_data = asyncio.run(run_async(emulator, async_metrics))
+
+    assert blocking_data == async_data == emulator.read_memory(READ_ADDRESS, READ_SIZE)
+
+    # both drivers send the same requests
+    assert get_counts(blocking_metrics) == get_counts(async_metrics)
+
+
+def test_async_concurrent_radios():
+    images = [build_sample_image(), bytes(range(0x100)) * 0xF0]
+    emulators = [RadioEmulator(image) for image in images]
+
+    async def run_all():
+        return await asyncio.gather(*(
+            run_async(emulator, ProtocolMetrics())
+            for emulator in emulators))
+
+    for emulator in emulators:
+        emulator.start()
+
+    try:
+        results = asyncio.run(run_all())
+
+    finally:
+        for emulator in emulators:
+            emulator.stop()
+
+    assert results == [
+        emulator.read_memory(READ_ADDRESS, READ_SIZE)
+        for emulator in emulators]
+
+
+@pytest.mark.parametrize('fault', ['drop_rate', 'bad_header_rate', 'missing_ack_rate'])
+def test_async_retries(fault: str):
+    with RadioEmulator(build_sample_image(), seed=1, **{fault: 0.05}) as emulator:
+        async def run():
+            async with AsyncProtocol.open_port(emulator.device_path) as port:
+                protocol = AsyncProtocol(
+                    port, timeout=timedelta(milliseconds=250), max_retries=10)
+                await protocol.unknown_init()
+
+                data = await protocol.read_memory_range(READ_ADDRESS, READ_SIZE)
+                await protocol.write_memory_range(READ_ADDRESS, bytes(reversed(data)))
+                return data, protocol.retries
+
+        data, retries = asyncio.run(run())
+        assert data == bytes(reversed(emulator.read_memory(READ_ADDRESS, READ_SIZE)))
+        assert retries > 0
+
+
+@pytest.mark.parametrize('window', [1, RadioConfig.MEMORY_SEGMENT_COUNT])
+def test_detect_window(window: int):
+    metrics = ProtocolMetrics()
+
+    with RadioEmulator(build_sample_image()) as emulator:
+        with Protocol.open_port(emulator.device_path) as serial_port:
+            protocol = Protocol(serial_port)
+            protocol.unknown_init()
+
+            protocol.metrics = metrics
+            states = RadioConfig().detect_memory_segments(protocol, window=window)
+
+    assert RadioMemoryState.FREQUENCY_DATA in states
+
+    # state reads are only pipelined if asked to
+    commands = metrics.as_dict()
+    if window == 1:
+        assert commands['read_memory']['count'] == RadioConfig.MEMORY_SEGMENT_COUNT
+        assert 'read_memory_pipelined' not in commands
+
+    else:
+        assert 'read_memory' not in commands
+        assert commands['read_memory_pipelined']['count'] == 1
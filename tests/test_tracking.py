@@ -0,0 +1,148 @@
+import io
+import contextlib
+
+import pytest
+
+from radioddity_gm30.benchmark import build_sample_image
+from radioddity_gm30.emulator import RadioEmulator
+from radioddity_gm30.radio_config import RadioConfig, RadioMemoryState
+from radioddity_gm30.memory.frequency import Power
+from radioddity_gm30.memory.phone import DtmfCode
+
+
+@pytest.fixture
+def emulator():
+    with RadioEmulator(build_sample_image()) as emulator:
+        yield emulator
+
+
+@pytest.fixture(scope='module')
+def config_data() -> bytes:
+    with RadioEmulator(build_sample_image()) as emulator:
+        radio_config = read_radio(emulator)
+
+    config_file = io.BytesIO()
+    radio_config.write_file(config_file)
+    return config_file.getvalue()
+
+
+def read_radio(emulator: RadioEmulator) -> RadioConfig:
+    radio_config = RadioConfig()
+    with contextlib.redirect_stdout(io.StringIO()):
+        radio_config.read_radio(emulator.device_path)
+
+    return radio_config
+
+
+def write_radio(radio_config: RadioConfig, emulator: RadioEmulator, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        radio_config.write_radio(emulator.device_path, **kwargs)
+
+
+def get_changes(before: bytes, after: bytes) -> list:
+    return [
+        (hex(0x1000 + address), before[address], after[address])
+        for address in range(len(before))
+        if before[address] != after[address]]
+
+
+def get_all_dirty_ranges(radio_config: RadioConfig, target: str) -> dict:
+    return {
+        state: radio_config.get_dirty_ranges(state, target)
+        for state in RadioConfig.CONFIG_FILE_ADDRESS}
+
+
+def test_reading_entries_is_clean(config_data: bytes):
+    radio_config = RadioConfig()
+    radio_config.read_file(io.BytesIO(config_data))
+
+    assert radio_config.vfo_a.receive_frequency is not None
+    assert radio_config.vfo_b.power is not None
+    assert len([entry for entry in radio_config.frequency_entries if entry]) == 0
+    assert radio_config.channel_entries[0] is None
+
+    for target in ('file', 'radio'):
+        assert all(
+            ranges == [] for ranges in get_all_dirty_ranges(radio_config, target).values())
+
+
+def test_entry_change_keeps_unmodeled_bits(config_data: bytes):
+    radio_config = RadioConfig()
+    radio_config.read_file(io.BytesIO(config_data))
+    radio_config.vfo_b.power = Power.LOW
+
+    memory = radio_config._memory_data[RadioMemoryState.FREQUENCY_DATA]
+    clean_data = memory.get_clean_data('radio')
+    data, ranges = memory.export_patch('radio')
+
+    assert ranges == [(0x20, 0x10)]
+    assert get_changes(clean_data, data) == [(hex(0x1000 + 0x2D), 0x06, 0x04)]
+
+
+def test_file_write_keeps_radio_dirty(config_data: bytes):
+    radio_config = RadioConfig()
+    radio_config.read_file(io.BytesIO(config_data))
+    radio_config.squelch_level = (radio_config.squelch_level + 1) % 10
+
+    radio_config.write_file(io.BytesIO())
+
+    assert radio_config.get_dirty_ranges(RadioMemoryState.GENERAL_DATA, 'file') == []
+    assert radio_config.get_dirty_ranges(RadioMemoryState.GENERAL_DATA, 'radio') != []
+
+
+def test_mapped_file_flush_keeps_changes_dirty(config_data: bytes, tmp_path):
+    config_path = tmp_path / 'config.bin'
+    config_path.write_bytes(config_data)
+
+    radio_config = RadioConfig()
+    radio_config.map_file(config_path)
+    radio_config.vfo_b.power = Power.LOW
+    radio_config.flush()
+
+    assert radio_config.get_dirty_ranges(
+        RadioMemoryState.FREQUENCY_DATA, 'radio') == [(0x20, 0x10)]
+
+
+def test_patch_write_after_read_only_access(emulator: RadioEmulator):
+    radio_config = read_radio(emulator)
+    before = bytes(emulator.memory)
+
+    str(radio_config.vfo_a.receive_frequency)
+    radio_config.frequency_entries[0]
+    write_radio(radio_config, emulator, patch=True)
+
+    assert get_changes(before, emulator.memory) == []
+
+
+def test_patch_write_after_file_write(emulator: RadioEmulator):
+    radio_config = read_radio(emulator)
+    before = bytes(emulator.memory)
+
+    radio_config.vfo_b.power = Power.LOW
+    radio_config.write_file(io.BytesIO())
+    write_radio(radio_config, emulator, patch=True)
+
+    assert get_changes(before, emulator.memory) == [(hex(0x302D), 0x06, 0x04)]
+
+
+def test_mapped_file_flush_writes_properties(config_data: bytes, tmp_path):
+    config_path = tmp_path / 'config.bin'
+    config_path.write_bytes(config_data)
+
+    radio_config = RadioConfig()
+    radio_config.map_file(config_path)
+    radio_config.transmit_timeout_seconds = 60
+    radio_config.dtmf_codes[0] = DtmfCode(source_data=bytes([0x01, 0x02, 0x03, 0xFF, 0xFF]))
+    radio_config.flush()
+
+    assert radio_config.get_dirty_ranges(RadioMemoryState.GENERAL_DATA, 'file') == []
+    assert radio_config.get_dirty_ranges(RadioMemoryState.PHONE_DATA, 'file') == []
+
+    file_config = RadioConfig()
+    file_config.read_file(io.BytesIO(config_path.read_bytes()))
+    assert file_config.transmit_timeout_seconds == 60
+    assert file_config.dtmf_codes[0].value == bytes([0x01, 0x02, 0x03, 0xFF, 0xFF])
+
+    config_file = io.BytesIO()
+    radio_config.write_file(config_file)
+    assert config_file.getvalue() == config_path.read_bytes()